@@ -1,109 +1,259 @@
 #!/usr/local/bin/python
 from sdk_release_tools import log
-from sdk_release_tools.aws import (get_routing_rules, load_routing_rules,
-                                   update_routing_rules)
 from sdk_release_tools.cli import parse_args
-from sdk_release_tools.util import (delete, download, get_cors, get_pinned_by,
-                                    get_versions, load_schema,
-                                    pin, pin_latest, unpin, unpin_latest,
-                                    upload, version_exists)
-from sdk_release_tools.versions import parse_major_minor, parse_version
+from sdk_release_tools.errors import ReleaseError
 
 
 import sys
+import time
 
 
-def main():
+def main(argv=None):
     sys.argv[0] = 'sdk-release-tool'
-    args = parse_args()
+    run(parse_args(argv))
+
+
+def run(args):
+    """
+    Run the action described by parsed command-line arguments, logging JSON
+    lines with --output json and profiling it with --profile. A ReleaseError
+    is logged, and exits non-zero; either way, a final "done" event is
+    written, with the error if any.
+    """
+    stream = log.output()
+    if getattr(args, 'output', 'text') == 'json':
+        stream = log.JsonLines(stream)
+    with log.redirect(stream):
+        if getattr(args, 'assumed_realm', False):
+            log.warn('  No realm specified, assuming dev')
+        start = time.time()
+        error = None
+        try:
+            if getattr(args, 'profile', None) is None:
+                run_action(args)
+            else:
+                from sdk_release_tools.profiling import profiled
+                with profiled(args.profile or 'sdk-release-tool-{}-{}'.format(
+                        args.action, time.strftime('%Y%m%d%H%M%S'))):
+                    run_action(args)
+        except ReleaseError as e:
+            error = str(e)
+        try:
+            if error is not None:
+                log.error(error)
+        finally:
+            fields = {} if error is None else {'error': error}
+            log.event('done', action=args.action,
+                      seconds=round(time.time() - start, 3), **fields)
+
+
+def load_release(args):
+    """
+    Load the product's schema and parse the version, rendering the version's
+    artifacts so that artifacts which overlap only for this version fail
+    before anything is read from S3.
+    """
+    from sdk_release_tools.schema import load_schema
+    from sdk_release_tools.versions import parse_version
+    schema = load_schema(args.product)
+    version = parse_version(args.version)
+    schema.render('artifacts', version)
+    return schema, version
+
+
+def run_action(args):
+    # Each action imports only what it needs, so that starting up, e.g. for
+    # --help or to hand the action to a server, stays fast.
     action = args.action
     realm = args.realm
 
     if action == 'delete':
-        schema = load_schema(args.product)
-        version = parse_version(args.version)
+        from sdk_release_tools.util import (delete, get_pinned_by,
+                                            version_exists)
+        schema, version = load_release(args)
         if not version_exists(realm, schema, version):
-            raise Exception('Version {} does not exist'.format(version))
+            raise ReleaseError('Version {} does not exist'.format(version))
         elif get_pinned_by(realm, schema, version) and not args.force:
-            raise Exception(('Cannot delete a pinned version; '
-                             'use -f or --force to override'))
-        delete(realm, schema, version, args.dry_run, args.silent)
+            raise ReleaseError(('Cannot delete a pinned version; '
+                                'use -f or --force to override'))
+        delete(realm, schema, version, args.dry_run, args.silent,
+               args.backend, args.max_bandwidth, args.max_request_rate,
+               args.verbose)
 
     elif action == 'download':
-        schema = load_schema(args.product)
-        version = parse_version(args.version)
+        from sdk_release_tools.util import download, version_exists
+        schema, version = load_release(args)
         if not version_exists(realm, schema, args.version):
-            raise Exception('Version {} does not exist'.format(version))
-        download(realm, schema, version, args.destination, args.dry_run)
+            raise ReleaseError('Version {} does not exist'.format(version))
+        download(realm, schema, version, args.destination, args.dry_run,
+                 args.backend, args.max_bandwidth, args.max_request_rate,
+                 args.verbose, args.bundle, args.paths)
 
     elif action == 'list':
+        from sdk_release_tools.util import get_versions, load_schema
         schema = load_schema(args.product)
-        ordered_versions, _, latest = get_versions(realm, schema)
+        ordered_versions, _, latest = get_versions(realm, schema,
+                                                   args.inventory)
         for version, major_minor in ordered_versions.items():
             line = version
             if major_minor:
                 line += ' <- {}'.format(major_minor)
             if str(version) == str(latest):
                 line += ' (latest)'
-            log.log(line)
+            if log.json_output():
+                log.event('version', version=version, pinned_by=major_minor,
+                          latest=str(version) == str(latest))
+            else:
+                log.log(line)
 
     elif action == 'list-routing-rules':
+        from sdk_release_tools.aws import get_routing_rules
         get_routing_rules(realm)
         return
 
+    elif action == 'migrate-routing-rules':
+        from sdk_release_tools.util import load_schema, migrate_routing_rules
+        schema = load_schema(args.product)
+        migrate_routing_rules(realm, schema, args.dry_run)
+
     elif action == 'pin':
+        from sdk_release_tools.util import (get_versions, load_schema, pin_release,
+                                            prewarm)
+        from sdk_release_tools.versions import parse_version
         schema = load_schema(args.product)
         version = parse_version(args.version)
-        if not version_exists(realm, schema, version):
-            raise Exception('Version {} does not exist'.format(version))
+        ordered_versions, _, latest_version = get_versions(realm, schema)
+        if str(version) not in ordered_versions:
+            raise ReleaseError('Version {} does not exist'.format(version))
         elif (hasattr(version, 'pre_release') and version.pre_release and
               not args.force):
-            raise Exception(('Cannot pin a pre-release version; '
-                             'use -f or --force to override'))
-        pin(realm, schema, version, args.dry_run)
+            raise ReleaseError(('Cannot pin a pre-release version; '
+                                'use -f or --force to override'))
+        elif (args.latest and latest_version and version < latest_version and
+              not args.force):
+            raise ReleaseError(('Cannot pin version earlier than latest as next latest; '
+                                'use -f or --force to override'))
+        pin_release(realm, schema, version, args.latest, args.dry_run,
+                    args.verbose, args.backend, args.max_bandwidth,
+                    args.max_request_rate)
+        if args.prewarm:
+            prewarm(realm, schema, version,
+                    ['pin', 'latest'] if args.latest else ['pin'],
+                    args.base_url, args.dry_run, args.backend,
+                    verbose=args.verbose)
 
     elif action == 'pin-latest':
+        from sdk_release_tools.util import (get_versions, load_schema, pin_latest,
+                                            prewarm, version_exists)
+        from sdk_release_tools.versions import parse_version
         schema = load_schema(args.product)
         version = parse_version(args.version)
         _, _, latest_version = get_versions(realm, schema)
         if not version_exists(realm, schema, version):
-            raise Exception('Version {} does not exist'.format(version))
+            raise ReleaseError('Version {} does not exist'.format(version))
         elif (hasattr(version, 'pre_release') and version.pre_release and
               not args.force):
-            raise Exception(('Cannot pin a pre-release version; '
-                             'use -f or --force to override'))
+            raise ReleaseError(('Cannot pin a pre-release version; '
+                                'use -f or --force to override'))
         elif (latest_version and version < latest_version and not args.force):
-            raise Exception(('Cannot pin version earlier than latest as next latest; '
-                             'use -f or --force to override'))
-        pin_latest(realm, schema, version, args.dry_run)
+            raise ReleaseError(('Cannot pin version earlier than latest as next latest; '
+                                'use -f or --force to override'))
+        pin_latest(realm, schema, version, args.dry_run,
+                   verbose=args.verbose, backend=args.backend,
+                   bandwidth=args.max_bandwidth,
+                   request_rate=args.max_request_rate)
+        if args.prewarm:
+            prewarm(realm, schema, version, ['latest'], args.base_url,
+                    args.dry_run, args.backend, verbose=args.verbose)
+
+    elif action == 'prewarm':
+        from sdk_release_tools.util import load_schema, prewarm, version_exists
+        from sdk_release_tools.versions import parse_version
+        schema = load_schema(args.product)
+        version = parse_version(args.version)
+        if not version_exists(realm, schema, version):
+            raise ReleaseError('Version {} does not exist'.format(version))
+        prewarm(realm, schema, version,
+                ['pin', 'latest'] if args.latest else ['pin'], args.base_url,
+                args.dry_run, args.backend, args.max_request_rate,
+                args.verbose)
+
+    elif action == 'rebuild-index':
+        from sdk_release_tools.util import load_schema, rebuild_index
+        schema = load_schema(args.product)
+        rebuild_index(realm, schema, args.dry_run, args.inventory)
+
+    elif action == 'sync':
+        from sdk_release_tools.util import sync, version_exists
+        schema, version = load_release(args)
+        if not version_exists(realm, schema, version):
+            raise ReleaseError(('Version {} does not exist; use upload to '
+                                'create it').format(version))
+        sync(realm, schema, version, args.source, args.delete, args.dry_run,
+             args.backend, args.max_bandwidth, args.max_request_rate,
+             args.verbose, args.hash_cache, args.bundle)
 
     elif action == 'unpin':
+        from sdk_release_tools.util import load_schema, unpin
+        from sdk_release_tools.versions import parse_major_minor
         schema = load_schema(args.product)
         major_minor = parse_major_minor(args.version)
-        unpin(realm, schema, major_minor, args.dry_run)
+        unpin(realm, schema, major_minor, args.dry_run, backend=args.backend,
+              bandwidth=args.max_bandwidth,
+              request_rate=args.max_request_rate)
 
     elif action == 'unpin-latest':
+        from sdk_release_tools.util import load_schema, unpin_latest
+        from sdk_release_tools.versions import parse_version
         schema = load_schema(args.product)
         version = parse_version(args.version)
-        unpin_latest(realm, schema, version, args.dry_run)
+        unpin_latest(realm, schema, version, args.dry_run,
+                     backend=args.backend, bandwidth=args.max_bandwidth,
+                     request_rate=args.max_request_rate)
 
     elif action == 'update-routing-rules':
+        from sdk_release_tools.aws import (load_routing_rules,
+                                           update_routing_rules)
         routing_rules_xml_file = args.xml
         routing_rules = load_routing_rules(routing_rules_xml_file)
         update_routing_rules(realm, routing_rules, args.dry_run)
         return
 
     elif action == 'get-cors':
+        from sdk_release_tools.util import get_cors
         get_cors(realm)
         return
 
+    elif action == 'serve':
+        from sdk_release_tools.server import serve
+        serve(args.socket)
+
     elif action == 'upload':
-        schema = load_schema(args.product)
-        version = parse_version(args.version)
+        from sdk_release_tools.util import upload, version_exists
+        schema, version = load_release(args)
         if version_exists(realm, schema, version) and not args.force:
-            raise Exception(('Cannot overwrite an existing version; '
-                             'use -f or --force to override'))
-        upload(realm, schema, version, args.source, args.dry_run)
+            raise ReleaseError(('Cannot overwrite an existing version; '
+                                'use -f or --force to override'))
+        upload(realm, schema, version, args.source, args.dry_run,
+               args.backend, args.max_bandwidth, args.max_request_rate,
+               args.verbose, args.hash_cache, args.bundle)
+
+    elif action == 'verify':
+        from sdk_release_tools.util import verify, version_exists
+        schema, version = load_release(args)
+        if not version_exists(realm, schema, version):
+            raise ReleaseError('Version {} does not exist'.format(version))
+        report = verify(realm, schema, version, args.source, args.backend,
+                        args.hash_cache)
+        summary = ('{} verified, {} missing, {} extra, {} mismatched'.format(
+            len(report.verified), len(report.missing), len(report.extra),
+            len(report.mismatched)))
+        log.event('result', verified=len(report.verified),
+                  missing=report.missing, extra=report.extra,
+                  mismatched=report.mismatched)
+        if not report.ok:
+            raise ReleaseError(summary)
+        log.info(summary)
 
 
 if __name__ == '__main__':
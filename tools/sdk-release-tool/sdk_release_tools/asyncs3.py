@@ -0,0 +1,475 @@
+"""
+An asyncio implementation of Backend. Every request is a coroutine on a
+single event loop, running in a background thread, over a pool of keep-alive
+HTTP/1.1 connections; requests are signed with AWS Signature Version 4. This
+lets thousands of small requests be in flight at once without a thread each.
+"""
+from sdk_release_tools.backend import (Backend, Object, conditional_headers,
+                                       replacing)
+from sdk_release_tools.errors import ConflictError
+from sdk_release_tools.profiling import in_flight
+from sdk_release_tools.verify import mapped
+from urllib.parse import quote, urlparse
+
+import asyncio
+import base64
+import datetime
+import hashlib
+import hmac
+import mimetypes
+import ssl
+import threading
+import xml.etree.ElementTree as ElementTree
+
+__all__ = ['AsyncS3Backend', 'S3Error', 'sign']
+
+S3_NS = '{http://s3.amazonaws.com/doc/2006-03-01/}'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+CHUNK_SIZE = 1024 * 1024
+ATTEMPTS = 3
+
+
+class S3Error(Exception):
+    def __init__(self, status, reason, body=b''):
+        self.status = status
+        self.reason = reason
+        self.code = None
+        self.message = None
+        try:
+            error = ElementTree.fromstring(body)
+            self.code = error.findtext('Code')
+            self.message = error.findtext('Message')
+        except ElementTree.ParseError:
+            pass
+        super(S3Error, self).__init__('{} {}: {}'.format(
+            status, reason, self.message or self.code or ''))
+
+
+def uri_encode(string, safe='/'):
+    return quote(string, safe=safe + '-_.~')
+
+
+def hmac_sha256(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def sign(method, path, query, headers, payload_hash, access_key, secret_key,
+         region, now, service='s3'):
+    """
+    Compute the Authorization header for a request per AWS Signature Version
+    4. headers must already include host, x-amz-date and x-amz-content-sha256.
+    """
+    date = now.strftime('%Y%m%d')
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    scope = '/'.join([date, region, service, 'aws4_request'])
+
+    canonical_headers = sorted(
+        (name.lower(), ' '.join(str(value).split()))
+        for name, value in headers.items())
+    signed_headers = ';'.join(name for name, _ in canonical_headers)
+    canonical_query = '&'.join(
+        '{}={}'.format(uri_encode(name, ''), uri_encode(value, ''))
+        for name, value in sorted(query))
+    canonical_request = '\n'.join([
+        method,
+        uri_encode(path),
+        canonical_query,
+        ''.join('{}:{}\n'.format(name, value)
+                for name, value in canonical_headers),
+        signed_headers,
+        payload_hash,
+    ])
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256',
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+    ])
+
+    key = ('AWS4' + secret_key).encode('utf-8')
+    for part in [date, region, service, 'aws4_request']:
+        key = hmac_sha256(key, part)
+    signature = hmac.new(key, string_to_sign.encode('utf-8'),
+                         hashlib.sha256).hexdigest()
+
+    return ('AWS4-HMAC-SHA256 Credential={}/{}, SignedHeaders={}, '
+            'Signature={}').format(access_key, scope, signed_headers,
+                                   signature)
+
+
+class Response(object):
+    def __init__(self, status, reason, headers, body, keep_alive):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive connections to one host, at most max_connections at a time.
+    Must be created on the event loop it is used from.
+    """
+    def __init__(self, host, port, ssl_context, max_connections):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def request(self, method, path, headers, body=None, sink=None):
+        async with self._slots:
+            # Counted for profiling once it has a connection, not before.
+            with in_flight:
+                return await self._exchange(method, path, headers, body, sink)
+
+    async def _exchange(self, method, path, headers, body, sink):
+        # Connections get reset, e.g. pooled ones the server closed while
+        # they were idle; retry those requests on a fresh connection,
+        # unless part of a response was already written out.
+        for attempt in range(ATTEMPTS):
+            writer = None
+            try:
+                if self._idle:
+                    reader, writer = self._idle.pop()
+                else:
+                    reader, writer = await asyncio.open_connection(
+                        self.host, self.port, ssl=self.ssl_context)
+                await self._send(writer, method, path, headers, body)
+                response = await self._receive(reader, method, sink,
+                                               'Range' in headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if writer:
+                    writer.close()
+                if attempt + 1 < ATTEMPTS and not sink:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+                    continue
+                raise
+            except BaseException:
+                # E.g. cancelled, or the sink failed: the connection is
+                # mid-response, so it cannot be reused.
+                if writer:
+                    writer.close()
+                raise
+            if response.keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def _send(self, writer, method, path, headers, body):
+        lines = ['{} {} HTTP/1.1'.format(method, path)]
+        lines.extend('{}: {}'.format(name, value)
+                     for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8'))
+        # Send views of the body, which may be a memory-mapped file, a chunk
+        # at a time, so that the transport never buffers a copy of it all.
+        if body:
+            view = memoryview(body)
+            try:
+                for start in range(0, len(view), CHUNK_SIZE):
+                    writer.write(view[start:start + CHUNK_SIZE])
+                    await writer.drain()
+            finally:
+                view.release()
+        await writer.drain()
+
+    async def _receive(self, reader, method, sink, ranged=False):
+        status_line = (await reader.readuntil(b'\r\n')).decode('latin-1')
+        _, status, reason = (status_line.strip().split(' ', 2) + [''])[:3]
+        status = int(status)
+
+        headers = {}
+        while True:
+            line = (await reader.readuntil(b'\r\n')).decode('latin-1')
+            if line == '\r\n':
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if ranged and status == 200:
+            # The Range was ignored, and the body is the whole object: read
+            # none of it, into the sink or memory, and drop the connection.
+            return Response(status, reason, headers, b'', False)
+        chunks = []
+        loop = asyncio.get_event_loop()
+
+        async def write(chunk):
+            if sink and status < 300:
+                await loop.run_in_executor(None, sink, chunk)
+            else:
+                chunks.append(chunk)
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            pass
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0],
+                           16)
+                if not size:
+                    await reader.readuntil(b'\r\n')
+                    break
+                await self._read(reader, size, write)
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            await self._read(reader, int(headers['content-length']), write)
+        else:
+            keep_alive = False
+            while True:
+                chunk = await reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                await write(chunk)
+
+        return Response(status, reason, headers, b''.join(chunks), keep_alive)
+
+    async def _read(self, reader, size, write):
+        while size:
+            chunk = await reader.readexactly(min(size, CHUNK_SIZE))
+            size -= len(chunk)
+            await write(chunk)
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle = []
+
+
+class AsyncS3Backend(Backend):
+    """
+    A Backend issuing S3 REST requests from an asyncio event loop. Buckets are
+    addressed path-style, like boto's OrdinaryCallingFormat, since our bucket
+    names contain dots.
+    """
+    def __init__(self, bucket_name, access_key, secret_key, region='us-east-1',
+                 endpoint=None, max_in_flight=512, max_connections=64):
+        super(AsyncS3Backend, self).__init__(max_in_flight)
+        self.bucket_name = bucket_name
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+
+        endpoint = urlparse(endpoint or (
+            'https://s3.amazonaws.com' if region == 'us-east-1' else
+            'https://s3.{}.amazonaws.com'.format(region)))
+        secure = endpoint.scheme == 'https'
+        self.host = endpoint.hostname
+        self.port = endpoint.port or (443 if secure else 80)
+        self.netloc = endpoint.netloc
+        ssl_context = ssl.create_default_context() if secure else None
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+        async def create_pool():
+            return ConnectionPool(self.host, self.port, ssl_context,
+                                  max_connections)
+        self.pool = self._run(create_pool()).result()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def _submit(self, method, *args, **kwargs):
+        return self._run(getattr(self, '_' + method)(*args, **kwargs))
+
+    async def _request(self, method, name='', query=None, headers=None,
+                       body=None, unsigned=False, sink=None):
+        query = list(query or [])
+        path = '/' + self.bucket_name + '/' + name
+        headers = dict(headers or {})
+        now = datetime.datetime.utcnow()
+        headers['Host'] = self.netloc
+        headers['x-amz-date'] = now.strftime('%Y%m%dT%H%M%SZ')
+        if unsigned:
+            # Uploads are protected by their Content-MD5 instead, which
+            # costs no extra pass over the body.
+            headers['x-amz-content-sha256'] = UNSIGNED_PAYLOAD
+            headers['Content-Length'] = str(len(body))
+        else:
+            body = body or b''
+            headers['x-amz-content-sha256'] = (
+                hashlib.sha256(body).hexdigest() if body else EMPTY_SHA256)
+            if body or method in ('PUT', 'POST'):
+                headers['Content-Length'] = str(len(body))
+        headers['Authorization'] = sign(
+            method, path, query, headers, headers['x-amz-content-sha256'],
+            self.access_key, self.secret_key, self.region, now)
+
+        target = uri_encode(path)
+        if query:
+            target += '?' + '&'.join(
+                '{}={}'.format(uri_encode(k, ''), uri_encode(v, ''))
+                for k, v in query)
+        return await self.pool.request(method, target, headers, body, sink)
+
+    def _check(self, response):
+        if response.status >= 300:
+            raise S3Error(response.status, response.reason, response.body)
+        return response
+
+    async def _list_page(self, prefix, delimiter, token):
+        query = [('list-type', '2'), ('prefix', prefix)]
+        if delimiter:
+            query.append(('delimiter', delimiter))
+        if token:
+            query.append(('continuation-token', token))
+        response = self._check(await self._request('GET', query=query))
+        result = ElementTree.fromstring(response.body)
+        objects = [Object(contents.findtext(S3_NS + 'Key'),
+                          int(contents.findtext(S3_NS + 'Size')),
+                          contents.findtext(S3_NS + 'ETag'))
+                   for contents in result.iter(S3_NS + 'Contents')]
+        objects.extend(Object(common.findtext(S3_NS + 'Prefix'))
+                       for common in result.iter(S3_NS + 'CommonPrefixes'))
+        token = None
+        if result.findtext(S3_NS + 'IsTruncated') == 'true':
+            token = result.findtext(S3_NS + 'NextContinuationToken')
+        return objects, token
+
+    async def _head(self, name):
+        response = await self._request('HEAD', name)
+        if response.status == 404:
+            return None
+        self._check(response)
+        return Object(name, int(response.headers.get('content-length', 0)),
+                      response.headers.get('etag'))
+
+    async def _get_redirect(self, name):
+        response = await self._request('HEAD', name)
+        if response.status == 404:
+            return None
+        self._check(response)
+        return response.headers.get('x-amz-website-redirect-location')
+
+    async def _get_file(self, name, filename):
+        with replacing(filename) as partial:
+            with open(partial, 'wb') as f:
+                self._check(await self._request('GET', name, sink=f.write))
+
+    async def _get_range(self, name, filename, start, end, position=None):
+        with open(filename, 'r+b') as f:
+            f.seek(start if position is None else position)
+            response = self._check(await self._request(
+                'GET', name, headers={'Range': 'bytes={}-{}'.format(start,
+                                                                    end)},
+                sink=f.write))
+            if response.status != 206:
+                raise S3Error(response.status, 'Expected a partial response '
+                              'for a Range', response.body)
+
+    async def _get_bytes(self, name):
+        response = await self._request('GET', name)
+        if response.status == 404:
+            return None
+        self._check(response)
+        return response.body, response.headers.get('etag', '').strip('"')
+
+    async def _put_bytes(self, name, data, headers=None, etag=None):
+        headers = dict(headers or {})
+        headers.update(conditional_headers(etag))
+        response = await self._request('PUT', name, headers=headers,
+                                       body=data)
+        if response.status in (409, 412):
+            raise ConflictError('{} changed while it was updated'.format(
+                name))
+        self._check(response)
+
+    async def _put_file(self, name, filename, headers=None):
+        headers = dict(headers or {})
+        if not any(header.lower() == 'content-type' for header in headers):
+            headers['Content-Type'] = (mimetypes.guess_type(filename)[0] or
+                                       'application/octet-stream')
+        # Hash and send the file from one buffer, so it is read once.
+        loop = asyncio.get_event_loop()
+        with mapped(filename) as data:
+            digest = await loop.run_in_executor(None, hashlib.md5, data)
+            headers['Content-MD5'] = base64.b64encode(
+                digest.digest()).decode('ascii')
+            self._check(await self._request('PUT', name, headers=headers,
+                                            body=data, unsigned=True))
+            return Object(name, len(data), digest.hexdigest())
+
+    async def _set_redirect(self, name, target, headers=None):
+        headers = dict(headers or {})
+        headers['x-amz-website-redirect-location'] = target
+        self._check(await self._request('PUT', name, headers=headers))
+
+    async def _delete(self, name):
+        self._check(await self._request('DELETE', name))
+
+    async def _delete_many(self, names):
+        root = ElementTree.Element('Delete')
+        ElementTree.SubElement(root, 'Quiet').text = 'true'
+        for name in names:
+            obj = ElementTree.SubElement(root, 'Object')
+            ElementTree.SubElement(obj, 'Key').text = name
+        body = ElementTree.tostring(root, encoding='utf-8')
+        headers = {'Content-MD5': base64.b64encode(
+            hashlib.md5(body).digest()).decode('ascii')}
+        response = self._check(await self._request(
+            'POST', query=[('delete', '')], headers=headers, body=body))
+        # A multi-object delete succeeds even if some of its keys fail.
+        errors = list(ElementTree.fromstring(response.body).iter(
+            S3_NS + 'Error'))
+        if errors:
+            raise S3Error(200, 'Could not delete {} keys, e.g. {}'.format(
+                len(errors), errors[0].findtext(S3_NS + 'Key')),
+                response.body)
+
+    def list(self, prefix, delimiter=''):
+        # Fetch the next page while the caller works through this one.
+        page = self._run(self._list_page(prefix, delimiter, None))
+        while page:
+            objects, token = page.result()
+            page = (self._run(self._list_page(prefix, delimiter, token))
+                    if token else None)
+            for obj in objects:
+                yield obj
+
+    def head(self, name):
+        return self._run(self._head(name)).result()
+
+    def get_redirect(self, name):
+        return self._run(self._get_redirect(name)).result()
+
+    def get_file(self, name, filename):
+        return self._run(self._get_file(name, filename)).result()
+
+    def get_range(self, name, filename, start, end, position=None):
+        return self._run(self._get_range(name, filename, start, end,
+                                         position)).result()
+
+    def get_bytes(self, name):
+        return self._run(self._get_bytes(name)).result()
+
+    def put_bytes(self, name, data, headers=None, etag=None):
+        return self._run(self._put_bytes(name, data, headers, etag)).result()
+
+    def put_file(self, name, filename, headers=None):
+        return self._run(self._put_file(name, filename, headers)).result()
+
+    def set_redirect(self, name, target, headers=None):
+        return self._run(self._set_redirect(name, target, headers)).result()
+
+    def delete(self, name):
+        return self._run(self._delete(name)).result()
+
+    def delete_many(self, names):
+        return self._run(self._delete_many(names)).result()
+
+    def close(self):
+        async def close_pool():
+            self.pool.close()
+            # Fail anything still waiting on the loop rather than leave its
+            # caller blocked once the loop stops.
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+        self._run(close_pool()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
@@ -1,53 +1,91 @@
-from boto.s3.connection import S3Connection, OrdinaryCallingFormat
+from sdk_release_tools import cache
+from sdk_release_tools import log
+from sdk_release_tools.errors import ReleaseError
 
 import json
 import os
 
 
-__all__ = ['get_bucket', 'get_routing_rules', 'update_routing_rules']
+__all__ = ['get_backend', 'get_bucket', 'get_routing_rules',
+           'update_routing_rules']
 
 
-def get_bucket(environment):
+def get_bucket(environment, name=None):
     """
     Get the SDK S3 bucket for the given realm, e.g. media.twiliocdn.com. This
     requires AWS credentials for AWS user cdn-sdki in either a JSON file at the
-    root of this project or in environment variables.
+    root of this project or in environment variables. With a name, get that
+    bucket with the same credentials instead, e.g. where S3 Inventory reports
+    are delivered.
     """
-    def get_aws_creds(environment, aws_user):
-        if (os.getenv('AWS_' + environment.upper() + '_ACCESS_KEY_ID') and
-                os.getenv('AWS_' + environment.upper() + '_SECRET_ACCESS_KEY')):
-            return (os.getenv('AWS_' + environment.upper() + '_ACCESS_KEY_ID'),
-                    os.getenv('AWS_' + environment.upper() + '_SECRET_ACCESS_KEY'))
-        aws_user_json_path = os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            '../{}.{}.json'.format(aws_user, environment))
-        with open(aws_user_json_path) as aws_user_json_file:
-            aws_user_json = json.loads(aws_user_json_file.read())
-            return (aws_user_json['AccessKeyId'],
-                    aws_user_json['SecretAccessKey'])
-        raise (Exception(
-            'Unable to find AWS credentials for user {} in realm {}'.format(
-                aws_user, environment)))
+    return cache.buckets.get((environment, name) if name else environment,
+                             lambda: connect_bucket(environment, name))
 
+
+def get_aws_creds(environment, aws_user='cdn-sdki'):
+    if (os.getenv('AWS_' + environment.upper() + '_ACCESS_KEY_ID') and
+            os.getenv('AWS_' + environment.upper() + '_SECRET_ACCESS_KEY')):
+        return (os.getenv('AWS_' + environment.upper() + '_ACCESS_KEY_ID'),
+                os.getenv('AWS_' + environment.upper() + '_SECRET_ACCESS_KEY'))
+    aws_user_json_path = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        '../{}.{}.json'.format(aws_user, environment))
+    with open(aws_user_json_path) as aws_user_json_file:
+        aws_user_json = json.loads(aws_user_json_file.read())
+        return (aws_user_json['AccessKeyId'],
+                aws_user_json['SecretAccessKey'])
+    raise (Exception(
+        'Unable to find AWS credentials for user {} in realm {}'.format(
+            aws_user, environment)))
+
+
+def get_bucket_name(environment):
+    bucket_name_prefix = environment
+    if environment == 'prod':
+        bucket_name_prefix = 'media'
+    return bucket_name_prefix + '.twiliocdn.com'
+
+
+def connect_bucket(environment, name=None):
     def create_s3_conn(environment, aws_user):
+        from boto.s3.connection import S3Connection, OrdinaryCallingFormat
         key_id, secret_key = get_aws_creds(environment, aws_user)
         return S3Connection(aws_access_key_id=key_id,
                             aws_secret_access_key=secret_key,
                             calling_format=OrdinaryCallingFormat())
 
     conn = create_s3_conn(environment, 'cdn-sdki')
-    bucket_name_prefix = environment
-    if environment == 'prod':
-        bucket_name_prefix = 'media'
-    bucket_name = bucket_name_prefix + '.twiliocdn.com'
-    bucket = conn.get_bucket(bucket_name)
+    bucket = conn.get_bucket(name or get_bucket_name(environment))
     return bucket
 
 
+def get_backend(environment, name='boto', bucket_name=None):
+    """
+    Get a Backend for the objects in the SDK S3 bucket of the given realm, or
+    in the named bucket: either "boto", which makes blocking requests from a
+    pool of threads, or "asyncio", which multiplexes requests on a single
+    event loop. The asyncio backend signs requests for the region in
+    AWS_{REALM}_REGION (us-east-1 by default) and may be pointed at another
+    endpoint with AWS_{REALM}_S3_ENDPOINT.
+    """
+    if name == 'boto':
+        from sdk_release_tools.backend import BotoBackend
+        return BotoBackend(get_bucket(environment, bucket_name))
+    elif name == 'asyncio':
+        from sdk_release_tools.asyncs3 import AsyncS3Backend
+        key_id, secret_key = get_aws_creds(environment)
+        return AsyncS3Backend(
+            bucket_name or get_bucket_name(environment), key_id, secret_key,
+            region=os.getenv('AWS_' + environment.upper() + '_REGION',
+                             'us-east-1'),
+            endpoint=os.getenv('AWS_' + environment.upper() + '_S3_ENDPOINT'))
+    raise ReleaseError('Unknown backend ' + name)
+
+
 def get_routing_rules(realm):
     bucket = get_bucket(realm)
     config = bucket.get_website_configuration_obj()
-    print(config.routing_rules.to_xml())
+    log.log(config.routing_rules.to_xml())
 
 
 def load_routing_rules(routing_rules_xml_file_path):
@@ -68,3 +106,4 @@ def update_routing_rules(realm, routing_rules, dry_run=True):
         bucket.configure_website(suffix=config.suffix,
                                  error_key=config.error_key,
                                  routing_rules=routing_rules)
+        cache.catalogs.discard_if(lambda key: key[0] == realm)
@@ -0,0 +1,258 @@
+from contextlib import contextmanager
+from sdk_release_tools.errors import ConflictError, ReleaseError
+from sdk_release_tools.parallel import DEFAULT_WORKERS
+
+import os
+import threading
+
+__all__ = ['Backend', 'BotoBackend', 'DELETE_BATCH_SIZE', 'Object']
+
+# The most keys S3 deletes in one request.
+DELETE_BATCH_SIZE = 1000
+
+
+class Object(object):
+    """
+    An S3 object as returned by a Backend: its key name, size, ETag (without
+    quotes) and, where known, Content-Type. Listings with a delimiter also
+    return common prefixes as Objects whose name ends with the delimiter and
+    whose size is None.
+    """
+    def __init__(self, name, size=None, etag=None, content_type=None):
+        self.name = name
+        self.size = size
+        self.etag = etag.strip('"') if etag else etag
+        self.content_type = content_type
+
+    def __repr__(self):
+        return 'Object({!r}, {!r}, {!r})'.format(self.name, self.size,
+                                                 self.etag)
+
+
+@contextmanager
+def replacing(filename):
+    """
+    Yield the name of a scratch file next to filename, and replace filename
+    with it only if the block succeeds, so that a failed download never
+    truncates a good local file.
+    """
+    import tempfile
+    fd, partial = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(filename)),
+        prefix='.' + os.path.basename(filename) + '.')
+    os.close(fd)
+    try:
+        yield partial
+        os.replace(partial, filename)
+    except BaseException:
+        os.remove(partial)
+        raise
+
+
+def conditional_headers(etag=None):
+    """
+    Get the headers that make a PUT succeed only if the object's ETag is
+    still etag or, without one, only if it does not exist.
+    """
+    if etag:
+        return {'If-Match': '"{}"'.format(etag)}
+    return {'If-None-Match': '*'}
+
+
+class Backend(object):
+    """
+    The S3 operations ops perform on the objects in a bucket. Each operation
+    is available as a blocking method, and can be started without blocking
+    through submit, which returns a concurrent.futures.Future. At most
+    max_in_flight submitted operations run at once; submit blocks until one
+    finishes beyond that, so callers never queue unbounded work.
+    """
+    def __init__(self, max_in_flight=DEFAULT_WORKERS):
+        self.max_in_flight = max_in_flight
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def list(self, prefix, delimiter=''):
+        """
+        Iterate over the Objects under a prefix.
+        """
+        raise NotImplementedError
+
+    def head(self, name):
+        """
+        Get an Object, or None if it does not exist.
+        """
+        raise NotImplementedError
+
+    def get_redirect(self, name):
+        """
+        Get an object's website redirect location, or None.
+        """
+        raise NotImplementedError
+
+    def get_file(self, name, filename):
+        """
+        Download an object to a file, which is only replaced once the whole
+        object has arrived.
+        """
+        raise NotImplementedError
+
+    def get_range(self, name, filename, start, end, position=None):
+        """
+        Write bytes start through end of an object into an existing file, at
+        position, or else at the same offset.
+        """
+        raise NotImplementedError
+
+    def get_bytes(self, name):
+        """
+        Get a small object's contents and ETag, or None if it does not
+        exist.
+        """
+        raise NotImplementedError
+
+    def put_bytes(self, name, data, headers=None, etag=None):
+        """
+        Write a small object, only if its ETag is still etag or, without one,
+        only if it does not exist yet; raise a ConflictError otherwise.
+        """
+        raise NotImplementedError
+
+    def put_file(self, name, filename, headers=None):
+        """
+        Upload a file, and return the Object it was uploaded as, including
+        its ETag, if known.
+        """
+        raise NotImplementedError
+
+    def set_redirect(self, name, target, headers=None):
+        """
+        Make an object redirect to target, creating it if necessary.
+        """
+        raise NotImplementedError
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    def delete_many(self, names):
+        """
+        Delete up to DELETE_BATCH_SIZE objects, in one request where the
+        Backend supports it.
+        """
+        for name in names:
+            self.delete(name)
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Start the named operation and return a Future for its result.
+        """
+        self._in_flight.acquire()
+        try:
+            future = self._submit(method, *args, **kwargs)
+        except BaseException:
+            self._in_flight.release()
+            raise
+        future.add_done_callback(lambda _: self._in_flight.release())
+        return future
+
+    def _submit(self, method, *args, **kwargs):
+        return self._executor().submit(getattr(self, method), *args, **kwargs)
+
+    def _executor(self):
+        if not hasattr(self, '_pool'):
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        return self._pool
+
+    def close(self):
+        if hasattr(self, '_pool'):
+            self._pool.shutdown()
+
+
+class BotoBackend(Backend):
+    """
+    A Backend on top of a boto S3 Bucket. Submitted operations run on a pool of
+    threads, one blocking request each.
+    """
+    def __init__(self, bucket, max_in_flight=DEFAULT_WORKERS):
+        super(BotoBackend, self).__init__(max_in_flight)
+        self.bucket = bucket
+
+    def list(self, prefix, delimiter=''):
+        for key in self.bucket.list(prefix, delimiter):
+            yield Object(key.name, getattr(key, 'size', None),
+                         getattr(key, 'etag', None))
+
+    def head(self, name):
+        key = self.bucket.get_key(name)
+        if not key:
+            return None
+        return Object(key.name, key.size, key.etag)
+
+    def get_redirect(self, name):
+        key = self.bucket.get_key(name)
+        return key.get_redirect() if key else None
+
+    def get_file(self, name, filename):
+        with replacing(filename) as partial:
+            self.bucket.get_key(name).get_contents_to_filename(partial)
+
+    def get_range(self, name, filename, start, end, position=None):
+        with open(filename, 'r+b') as f:
+            f.seek(start if position is None else position)
+            self._key(name).get_contents_to_file(
+                f, headers={'Range': 'bytes={}-{}'.format(start, end)})
+
+    def get_bytes(self, name):
+        key = self.bucket.get_key(name)
+        if not key:
+            return None
+        # Reading the contents updates the ETag from the GET response.
+        data = key.get_contents_as_string()
+        return data, key.etag.strip('"')
+
+    def put_bytes(self, name, data, headers=None, etag=None):
+        from boto.exception import S3ResponseError
+        headers = dict(headers or {})
+        headers.update(conditional_headers(etag))
+        try:
+            self._key(name).set_contents_from_string(data, headers=headers)
+        except S3ResponseError as e:
+            if e.status in (409, 412):
+                raise ConflictError('{} changed while it was updated'.format(
+                    name))
+            raise
+
+    def put_file(self, name, filename, headers=None):
+        # boto would read the file once for its Content-MD5 and again to send
+        # it; hash it and send it from one buffer instead.
+        import base64
+        import hashlib
+        import io
+        from sdk_release_tools.verify import mapped
+        with mapped(filename) as data:
+            digest = hashlib.md5(data)
+            etag = digest.hexdigest()
+            fp = io.BytesIO(data) if isinstance(data, bytes) else data
+            self._key(name).set_contents_from_file(
+                fp, headers=headers, rewind=True,
+                md5=(etag, base64.b64encode(digest.digest()).decode('ascii')))
+            return Object(name, len(data), etag)
+
+    def set_redirect(self, name, target, headers=None):
+        self._key(name).set_redirect(target, headers=headers)
+
+    def delete(self, name):
+        self.bucket.delete_key(name)
+
+    def delete_many(self, names):
+        result = self.bucket.delete_keys(names, quiet=True)
+        if result.errors:
+            raise ReleaseError('Could not delete {} keys, e.g. {}: {}'.format(
+                len(result.errors), result.errors[0].key,
+                result.errors[0].message))
+
+    def _key(self, name):
+        from boto.s3.key import Key
+        key = Key(self.bucket)
+        key.key = name
+        return key
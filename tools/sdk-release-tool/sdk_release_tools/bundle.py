@@ -0,0 +1,296 @@
+"""
+Release bundles: one zip archive of a release's artifacts, stored next to the
+release with an index of where each artifact's bytes start in it. Downloading
+a whole release then takes a few ranged GETs of the archive instead of one GET
+per object, and any one artifact takes one ranged GET. Artifacts are bundled
+as they are on disk, before any pre-compression, under their S3 keys.
+"""
+from sdk_release_tools.errors import ReleaseError
+from sdk_release_tools.manifest import MANIFEST_HEADERS, release_prefix
+from sdk_release_tools.parallel import DEFAULT_WORKERS
+
+import json
+import os
+import struct
+import zlib
+
+__all__ = ['BUNDLE_FILES', 'BUNDLE_HEADERS', 'BUNDLE_NAME', 'Entry',
+           'INDEX_HEADERS', 'INDEX_NAME', 'Index',
+           'MIN_PART_SIZE', 'Writer', 'build', 'bundle_key', 'destination',
+           'extract', 'fetch', 'index_key', 'parts', 'targets']
+
+BUNDLE_NAME = '.bundle.zip'
+
+INDEX_NAME = '.bundle.json'
+
+# Files describing a release rather than belonging to it.
+BUNDLE_FILES = (BUNDLE_NAME, INDEX_NAME)
+
+# Like the manifest, a bundle changes whenever its release does.
+BUNDLE_HEADERS = dict(MANIFEST_HEADERS, **{'Content-Type': 'application/zip'})
+
+INDEX_HEADERS = dict(MANIFEST_HEADERS,
+                     **{'Content-Type': 'application/json'})
+
+# The smallest range of a bundle worth a GET of its own.
+MIN_PART_SIZE = 8 * 1024 * 1024
+
+# A zip's local file header: its signature, versions, flags, method, times,
+# CRC-32, sizes, and then the lengths of the name and extra field.
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def bundle_key(schema, variables):
+    return release_prefix(schema, variables) + BUNDLE_NAME
+
+
+def index_key(schema, variables):
+    return release_prefix(schema, variables) + INDEX_NAME
+
+
+class Entry(object):
+    """
+    Where an artifact is in a bundle: the offset and size of its (possibly
+    deflated) data, and its size and CRC-32 once inflated.
+    """
+    __slots__ = ['name', 'offset', 'compressed_size', 'size', 'method', 'crc']
+
+    def __init__(self, name, offset, compressed_size, size, method, crc):
+        self.name = name
+        self.offset = offset
+        self.compressed_size = compressed_size
+        self.size = size
+        self.method = method
+        self.crc = crc
+
+    @property
+    def end(self):
+        return self.offset + self.compressed_size
+
+
+class Index(object):
+    """
+    The Entries of a bundle by S3 key, and the bundle's size.
+    """
+    def __init__(self, size, entries=None):
+        self.size = size
+        self.entries = dict((entry.name, entry) for entry in entries or [])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def list(self, prefix=''):
+        for name in sorted(self.entries):
+            if name.startswith(prefix):
+                yield self.entries[name]
+
+    def dumps(self):
+        return json.dumps({
+            'size': self.size,
+            'entries': [[entry.name, entry.offset, entry.compressed_size,
+                         entry.size, entry.method, entry.crc]
+                        for entry in self.list()]
+        }, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def loads(cls, data):
+        index = json.loads(data.decode('utf-8'))
+        return cls(index['size'], [Entry(*entry)
+                                   for entry in index['entries']])
+
+    @classmethod
+    def load(cls, backend, key):
+        """
+        Fetch an Index through a Backend, or return None if there is none.
+        """
+        found = backend.get_bytes(key)
+        return cls.loads(found[0]) if found is not None else None
+
+    def save(self, backend, key):
+        import shutil
+        import tempfile
+        scratch = tempfile.mkdtemp(prefix='sdk-release-tool-')
+        try:
+            filename = os.path.join(scratch, INDEX_NAME)
+            with open(filename, 'wb') as f:
+                f.write(self.dumps())
+            backend.put_file(key, filename, INDEX_HEADERS)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+class Writer(object):
+    """
+    A bundle written a file at a time, e.g. as an upload reads each artifact,
+    rather than in a pass of its own over the release. Files may be added
+    from any thread; they are deflated and written on a thread of the
+    Writer's own, so that adding one never waits for another. Without a
+    filename, the bundle is written to a scratch directory that remove
+    deletes.
+    """
+    def __init__(self, filename=None):
+        from concurrent.futures import ThreadPoolExecutor
+        import tempfile
+        import zipfile
+        self.scratch = None
+        if filename is None:
+            self.scratch = tempfile.mkdtemp(prefix='sdk-release-tool-')
+            filename = os.path.join(self.scratch, BUNDLE_NAME)
+        self.filename = filename
+        self._archive = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED)
+        # A zip is written one entry at a time; zlib releases the GIL, so
+        # deflating here overlaps with the threads adding files.
+        self._thread = ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+
+    def add(self, path, name):
+        self._futures.append(self._thread.submit(self._archive.write, path,
+                                                 name))
+
+    def _finish(self):
+        self._thread.shutdown()
+        self._archive.close()
+
+    def close(self):
+        """
+        Finish the bundle, and return its Index.
+        """
+        self._finish()
+        for future in self._futures:
+            future.result()
+        infos = self._archive.infolist()
+        entries = []
+        with open(self.filename, 'rb') as f:
+            for info in infos:
+                # The local header's extra field may differ from the central
+                # directory's, so read it for where the data starts.
+                f.seek(info.header_offset)
+                header = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+                offset = (info.header_offset + LOCAL_HEADER.size +
+                          header[-2] + header[-1])
+                entries.append(Entry(info.filename, offset,
+                                     info.compress_size, info.file_size,
+                                     info.compress_type, info.CRC))
+        return Index(os.path.getsize(self.filename), entries)
+
+    def remove(self):
+        import shutil
+        self._finish()
+        if self.scratch is not None:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+def build(files, filename):
+    """
+    Write a bundle of (local filename, S3 key) pairs, and return its Index.
+    """
+    writer = Writer(filename)
+    for path, name in files:
+        writer.add(path, name)
+    return writer.close()
+
+
+def targets(artifacts, root, index, prefixes=None):
+    """
+    Pair the Entries of a bundle with the local paths a download writes them
+    to, like ops.Download does for objects; with prefixes, only the Entries
+    under them.
+    """
+    pairs = []
+    for key, value in artifacts.items():
+        dst = os.path.join(root, key)
+        if not key.endswith('/'):
+            entry = index.get(value)
+            pairs.extend([(entry, dst)] if entry is not None else [])
+            continue
+        pairs.extend((entry, destination(dst, entry.name[len(value):]))
+                     for entry in index.list(value))
+    if prefixes is not None:
+        prefixes = tuple(prefixes)
+        pairs = [(entry, path) for entry, path in pairs
+                 if entry.name.startswith(prefixes)]
+    return pairs
+
+
+def destination(directory, name):
+    """
+    Get where a bundled artifact, named relative to a directory, is extracted
+    to. Bundles come from the bucket, so a name that is absolute, has ".."
+    components or resolves outside the directory, e.g. through a symlink, is
+    refused.
+    """
+    path = os.path.join(directory, name)
+    real = os.path.realpath(directory)
+    if (os.path.isabs(name) or '..' in name.replace('\\', '/').split('/') or
+            os.path.commonpath([real, os.path.realpath(path)]) != real):
+        raise ReleaseError('Refusing to extract {} outside {}'.format(
+            name, directory))
+    return path
+
+
+def parts(start, end, workers=DEFAULT_WORKERS):
+    """
+    Split the bytes start through end into up to workers ranges of at least
+    MIN_PART_SIZE.
+    """
+    size = end - start + 1
+    count = max(min(workers, size // MIN_PART_SIZE), 1)
+    part_size = -(-size // count)
+    return [(offset, min(offset + part_size, end + 1) - 1)
+            for offset in range(start, end + 1, part_size)]
+
+
+def fetch(backend, key, filename, start, end, limits=None, position=0,
+          progress=None):
+    """
+    Fetch bytes start through end of a bundle into a new file, starting at
+    position, with concurrent ranged GETs.
+    """
+    with open(filename, 'wb') as f:
+        f.truncate(position + end - start + 1)
+    futures = []
+    for part_start, part_end in parts(start, end):
+        if limits:
+            limits.acquire(part_end - part_start + 1)
+        futures.append((part_end - part_start + 1, backend.submit(
+            'get_range', key, filename, part_start, part_end,
+            position + part_start - start)))
+    for size, future in futures:
+        future.result()
+        if progress is not None:
+            progress.update(0, size)
+
+
+def extract(f, entry, path, base=0):
+    """
+    Inflate an Entry from a file holding its bundle from offset base into a
+    local path, and check its CRC-32.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    f.seek(entry.offset - base)
+    remaining = entry.compressed_size
+    inflate = zlib.decompressobj(-zlib.MAX_WBITS) if entry.method else None
+    crc = 0
+    with open(path, 'wb') as out:
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if inflate is not None:
+                chunk = inflate.decompress(chunk)
+            crc = zlib.crc32(chunk, crc)
+            out.write(chunk)
+        if inflate is not None:
+            chunk = inflate.flush()
+            crc = zlib.crc32(chunk, crc)
+            out.write(chunk)
+    if remaining or crc != entry.crc:
+        raise ReleaseError('{} is corrupt in the bundle'.format(entry.name))
@@ -0,0 +1,71 @@
+import threading
+
+__all__ = ['Cache', 'buckets', 'catalogs', 'inventories', 'limits',
+           'schemas']
+
+
+class Cache(object):
+    """
+    A thread-safe map of values that are expensive to compute. A Cache starts
+    disabled, so that one-shot invocations always see fresh data; long-running
+    processes (see sdk_release_tools.server) enable it.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._values = {}
+        # Counts discards, so that a value computed while its key was
+        # discarded is not stored.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def get(self, key, compute):
+        """
+        Get the value for a key, computing and storing it if it is missing.
+        A value whose computation overlapped a discard may already be stale,
+        so it is returned but not stored.
+        """
+        if not self.enabled:
+            return compute()
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            generation = self._generation
+        value = compute()
+        with self._lock:
+            if self._generation == generation:
+                self._values[key] = value
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            self._generation += 1
+            self._values.pop(key, None)
+
+    def discard_if(self, predicate):
+        """
+        Discard every value whose key satisfies the predicate.
+        """
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._values if predicate(key)]:
+                del self._values[key]
+
+
+# S3 buckets by realm.
+buckets = Cache()
+
+# Results of util.get_versions by util.catalog_key.
+catalogs = Cache()
+
+# What S3 Inventory reports hold under a product's major/minor prefixes, by
+# report and prefix; a report never changes once delivered.
+inventories = Cache()
+
+# ratelimit.RateLimits by realm and limits, shared by concurrent requests.
+limits = Cache()
+
+# schema.Schemas by path and modification time.
+schemas = Cache()
@@ -0,0 +1,151 @@
+"""
+A product's catalog: its version numbers, which major/minor pairs pin which
+of them, and which is "latest", stored as one small JSON object next to the
+major/minor prefixes, e.g. "sdk/js/video/index.json". Actions that change a
+product update the catalog with conditional writes, so that concurrent
+updates are retried rather than lost, and listing versions takes one GET
+instead of a scan of the bucket. rebuild-index writes it from a scan.
+"""
+from collections import OrderedDict
+from sdk_release_tools import log
+from sdk_release_tools.errors import ConflictError
+from sdk_release_tools.versions import parse_major_minor, parse_version
+
+import json
+import os
+
+__all__ = ['Catalog', 'INDEX_HEADERS', 'INDEX_NAME', 'index_key', 'update']
+
+INDEX_NAME = 'index.json'
+
+INDEX_HEADERS = {
+    'Cache-Control': 'max-age=0, no-cache, no-store',
+    'Content-Type': 'application/json'
+}
+
+# How many times to re-read and re-apply a change whose write conflicted.
+ATTEMPTS = 5
+
+
+def index_key(schema):
+    return os.path.join(schema.major_minor_versions_dir, INDEX_NAME)
+
+
+class Catalog(object):
+    """
+    Version numbers, pins from major/minor pairs to version numbers, and the
+    latest version number, all as strings.
+    """
+    def __init__(self, versions=None, pins=None, latest=None):
+        self.versions = set(versions or [])
+        self.pins = dict(pins or {})
+        self.latest = latest
+
+    @classmethod
+    def from_versions(cls, ordered_versions, ordered_major_minors, latest):
+        """
+        Make a Catalog from what util.scan_versions returns.
+        """
+        return cls(ordered_versions,
+                   dict((major_minor, str(version)) for major_minor, version
+                        in ordered_major_minors.items()
+                        if major_minor != 'None'),
+                   str(latest) if latest else None)
+
+    def to_versions(self):
+        """
+        Get the versions, major/minor pairs and latest version in the form
+        util.scan_versions returns them.
+        """
+        pins = sorted((parse_major_minor(major_minor), version)
+                      for major_minor, version in self.pins.items())
+        pinned_by = dict((version, major_minor)
+                         for major_minor, version in pins)
+        ordered_versions = OrderedDict(
+            (str(version), pinned_by.get(str(version)))
+            for version in sorted(parse_version(version)
+                                  for version in self.versions))
+        ordered_major_minors = OrderedDict(
+            (str(major_minor), parse_version(version))
+            for major_minor, version in pins)
+        latest = parse_version(self.latest) if self.latest else None
+        if latest:
+            ordered_major_minors['None'] = latest
+        return ordered_versions, ordered_major_minors, latest
+
+    def add(self, version):
+        self.versions.add(str(version))
+
+    def remove(self, version):
+        self.versions.discard(str(version))
+
+    def pin(self, major_minor, version):
+        self.pins[str(major_minor)] = str(version)
+
+    def unpin(self, major_minor):
+        self.pins.pop(str(major_minor), None)
+
+    def pin_latest(self, version):
+        self.latest = str(version) if version else None
+
+    def dumps(self):
+        return json.dumps({
+            'versions': sorted(self.versions),
+            'pins': self.pins,
+            'latest': self.latest
+        }, indent=2, sort_keys=True).encode('utf-8')
+
+    @classmethod
+    def loads(cls, data):
+        catalog = json.loads(data.decode('utf-8'))
+        return cls(catalog['versions'], catalog['pins'], catalog['latest'])
+
+    @classmethod
+    def load(cls, backend, key):
+        """
+        Fetch a Catalog and its ETag through a Backend, or (None, None) if
+        there is none.
+        """
+        found = backend.get_bytes(key)
+        if found is None:
+            return None, None
+        data, etag = found
+        return cls.loads(data), etag
+
+    def save(self, backend, key, etag=None):
+        """
+        Write this Catalog, unless the one at key is no longer the one with
+        the given ETag (or, without one, if there is one at all).
+        """
+        backend.put_bytes(key, self.dumps(), INDEX_HEADERS, etag)
+
+    def replace(self, backend, key):
+        """
+        Write this Catalog in place of the one at key, if any; still fail if
+        that one changes in between.
+        """
+        existing = backend.head(key)
+        self.save(backend, key, existing.etag if existing else None)
+
+
+def update(backend, key, change):
+    """
+    Apply a change, a function of a Catalog, to the Catalog at key, retrying
+    if it is updated concurrently. A product without a Catalog keeps scanning
+    until rebuild-index writes one. A Catalog that cannot be updated is
+    deleted, so that it is never stale.
+    """
+    for _ in range(ATTEMPTS):
+        catalog, etag = Catalog.load(backend, key)
+        if catalog is None:
+            return None
+        change(catalog)
+        try:
+            catalog.save(backend, key, etag)
+            return catalog
+        except ConflictError:
+            continue
+    backend.delete(key)
+    log.warn('  Deleted {} after {} conflicting updates; run rebuild-index '
+             'to recreate it'.format(key, ATTEMPTS))
+    return None
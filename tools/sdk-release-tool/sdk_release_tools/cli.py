@@ -1,5 +1,6 @@
 from argparse import ArgumentParser
 from sdk_release_tools import log
+from sdk_release_tools.ratelimit import parse_rate
 
 __all__ = ['parse_args']
 
@@ -19,6 +20,86 @@ def parse_dry_run(parser):
     return parser
 
 
+def parse_backend(parser):
+    parser.add_argument('--backend', choices=['boto', 'asyncio'],
+                        default='boto',
+                        help=('how to make S3 requests: "boto" uses a pool '
+                              'of threads, "asyncio" a single event loop'))
+    return parser
+
+
+def parse_output(parser):
+    parser.add_argument('--output', choices=['text', 'json'],
+                        default='text',
+                        help=('"json" writes JSON lines of log messages and '
+                              'events, for other tools to consume'))
+    return parser
+
+
+def parse_profile(parser):
+    parser.add_argument('--profile', nargs='?', const='', default=None,
+                        metavar='PREFIX',
+                        help=('profile the action, writing PREFIX.prof '
+                              '(cProfile), PREFIX.collapsed (flamegraph '
+                              'stacks) and PREFIX.txt (where the time went)'))
+    return parser
+
+
+def parse_verbose(parser):
+    parser.add_argument('-v', '--verbose', action='store_true', default=False,
+                        help=('log every file instead of reporting '
+                              'progress'))
+    return parser
+
+
+def parse_hash_cache(parser):
+    parser.add_argument('--no-hash-cache', action='store_false', default=True,
+                        dest='hash_cache',
+                        help=('hash every local file instead of reusing '
+                              'hashes cached since it last changed'))
+    return parser
+
+
+def parse_limits(parser):
+    parser.add_argument('--max-bandwidth', type=parse_rate, default=None,
+                        dest='max_bandwidth',
+                        help=('limit transfers to this many bytes per '
+                              'second, e.g. "10M"; defaults to '
+                              '$AWS_{REALM}_MAX_BANDWIDTH'))
+    parser.add_argument('--max-request-rate', type=parse_rate, default=None,
+                        dest='max_request_rate',
+                        help=('limit transfers to this many requests per '
+                              'second; defaults to '
+                              '$AWS_{REALM}_MAX_REQUEST_RATE'))
+    return parser
+
+
+def parse_prewarm(parser):
+    parser.add_argument('--prewarm', action='store_true', default=False,
+                        help=('then fetch the pinned keys and the release\'s '
+                              'objects from the CDN'))
+    parse_base_url(parser)
+    return parser
+
+
+def parse_base_url(parser):
+    parser.add_argument('--base-url', type=str, default=None,
+                        dest='base_url',
+                        help=('the URL the bucket is served from; defaults to '
+                              '$CDN_{REALM}_BASE_URL or the bucket\'s name'))
+    return parser
+
+
+def parse_inventory(parser):
+    parser.add_argument('--inventory', type=str, default=None,
+                        metavar='MANIFEST',
+                        help=('find pins with the S3 Inventory report whose '
+                              'manifest.json is at this path, bucket key or '
+                              's3://bucket/key; '
+                              'defaults to $AWS_{REALM}_INVENTORY'))
+    return parser
+
+
 def parse_delete_action(parser):
     parser = parser.add_parser('delete', help=('delete product artifacts at a '
                                                'version number'))
@@ -32,10 +113,21 @@ def parse_delete_action(parser):
                               'the artifact is pinned by a major/minor '
                               'version'))
     parser.add_argument('-s', '--silent', action='store_true', default=False, help=('skip user confirmation of files to be deleted'))
+    parse_backend(parser)
+    parse_limits(parser)
+    parse_verbose(parser)
     parse_dry_run(parser)
     return parser
 
 
+def parse_bundle(parser):
+    parser.add_argument('--bundle', action='store_true', default=False,
+                        help=('also upload a bundle of the artifacts, which '
+                              'download fetches with a few ranged GETs '
+                              'instead of one GET per artifact'))
+    return parser
+
+
 def parse_download_action(parser):
     parser = parser.add_parser('download', help=('download product artifacts '
                                                  'from a version number'))
@@ -48,6 +140,18 @@ def parse_download_action(parser):
                               '"v1.0"'))
     parser.add_argument('destination', type=str,
                         help=('the directory to download to'))
+    parser.add_argument('--path', action='append', default=None,
+                        dest='paths', metavar='PATH',
+                        help=('download just the artifacts at or under a path '
+                              'relative to the release, e.g. "twilio.js" or '
+                              '"docs/", from its bundle; may be repeated'))
+    parser.add_argument('--no-bundle', action='store_false', default=True,
+                        dest='bundle',
+                        help=('download each artifact instead of the '
+                              "release's bundle"))
+    parse_backend(parser)
+    parse_limits(parser)
+    parse_verbose(parser)
     parse_dry_run(parser)
     return parser
 
@@ -58,6 +162,7 @@ def parse_list_action(parser):
                                              'any pinned major/minor pairs'))
     parse_realms(parser)
     parser.add_argument('product', type=str, help='the product to list')
+    parse_inventory(parser)
     return parser
 
 
@@ -68,6 +173,16 @@ def parse_list_routing_rules_action(parser):
     return parser
 
 
+def parse_migrate_routing_rules_action(parser):
+    parser = parser.add_parser('migrate-routing-rules',
+                               help=('replace legacy Routing Rules with S3 Key '
+                                     'redirects'))
+    parse_realms(parser)
+    parser.add_argument('product', type=str, help='the product to migrate')
+    parse_dry_run(parser)
+    return parser
+
+
 def parse_pin_action(parser):
     parser = parser.add_parser('pin', help=('pin a major/minor pair to a '
                                             'version number'))
@@ -78,6 +193,13 @@ def parse_pin_action(parser):
     parser.add_argument('-f', '--force', action='store_true', default=False,
                         help=('force a pin regardless of whether or not the '
                               'version is a pre-release version'))
+    parser.add_argument('--latest', action='store_true', default=False,
+                        help=('also pin "latest" to the version number, '
+                              'updating the website configuration once'))
+    parse_prewarm(parser)
+    parse_limits(parser)
+    parse_backend(parser)
+    parse_verbose(parser)
     parse_dry_run(parser)
     return parser
 
@@ -92,6 +214,42 @@ def parse_pin_latest_action(parser):
     parser.add_argument('-f', '--force', action='store_true', default=False,
                         help=('force a pin regardless of whether or not the '
                               'version is a pre-release version'))
+    parse_prewarm(parser)
+    parse_limits(parser)
+    parse_backend(parser)
+    parse_verbose(parser)
+    parse_dry_run(parser)
+    return parser
+
+
+def parse_prewarm_action(parser):
+    parser = parser.add_parser('prewarm',
+                               help=('fetch a pinned version\'s keys and '
+                                     'objects from the CDN'))
+    parse_realms(parser)
+    parser.add_argument('product', type=str, help='the product to prewarm')
+    parser.add_argument('version', type=str,
+                        help='the pinned version number, e.g. "1.2.3"')
+    parser.add_argument('--latest', action='store_true', default=False,
+                        help='also fetch the keys "latest" pins')
+    parse_base_url(parser)
+    parser.add_argument('--max-request-rate', type=parse_rate, default=None,
+                        dest='max_request_rate',
+                        help=('fetch at most this many URLs per second; '
+                              'defaults to 50'))
+    parse_backend(parser)
+    parse_verbose(parser)
+    parse_dry_run(parser)
+    return parser
+
+
+def parse_rebuild_index_action(parser):
+    parser = parser.add_parser('rebuild-index',
+                               help=('write the index of a product\'s versions '
+                                     'and pins from a scan of the bucket'))
+    parse_realms(parser)
+    parser.add_argument('product', type=str, help='the product to index')
+    parse_inventory(parser)
     parse_dry_run(parser)
     return parser
 
@@ -103,6 +261,8 @@ def parse_unpin_action(parser):
     parser.add_argument('product', type=str, help='the product to unpin')
     parser.add_argument('version', type=str,
                         help='the major/minor pair to unpin, e.g. "v1.2"')
+    parse_limits(parser)
+    parse_backend(parser)
     parse_dry_run(parser)
     return parser
 
@@ -114,6 +274,30 @@ def parse_unpin_latest_action(parser):
     parser.add_argument('product', type=str, help='the product to unpin')
     parser.add_argument('version', type=str,
                         help='the version number to unpin, e.g. "1.2.3"')
+    parse_limits(parser)
+    parse_backend(parser)
+    parse_dry_run(parser)
+    return parser
+
+
+def parse_sync_action(parser):
+    parser = parser.add_parser('sync', help=('upload the product artifacts '
+                                             'that changed since a version '
+                                             'number was uploaded'))
+    parse_realms(parser)
+    parser.add_argument('product', type=str, help='the product to sync')
+    parser.add_argument('version', type=str,
+                        help='the version number to sync, e.g. "1.2.3"')
+    parser.add_argument('source', type=str,
+                        help='a directory or RPM containing the artifacts')
+    parser.add_argument('--delete', action='store_true', default=False,
+                        help=('also delete uploaded artifacts that are no '
+                              'longer in the source'))
+    parse_bundle(parser)
+    parse_backend(parser)
+    parse_hash_cache(parser)
+    parse_limits(parser)
+    parse_verbose(parser)
     parse_dry_run(parser)
     return parser
 
@@ -130,9 +314,29 @@ def parse_upload_action(parser):
     parser.add_argument('-f', '--force', action='store_true', default=False,
                         help=('force an upload regardless of whether or not '
                               'the artifact already exists'))
+    parse_bundle(parser)
+    parse_backend(parser)
+    parse_hash_cache(parser)
+    parse_limits(parser)
+    parse_verbose(parser)
     parse_dry_run(parser)
     return parser
 
+def parse_verify_action(parser):
+    parser = parser.add_parser('verify', help=('verify uploaded product '
+                                               'artifacts against local ones'))
+    parse_realms(parser)
+    parser.add_argument('product', type=str, help='the product to verify')
+    parser.add_argument('version', type=str,
+                        help='the version number to verify, e.g. "1.2.3"')
+    parser.add_argument('source', type=str, nargs='?', default=None,
+                        help=('a directory or RPM containing the artifacts; '
+                              'defaults to the manifest written on upload'))
+    parse_backend(parser)
+    parse_hash_cache(parser)
+    return parser
+
+
 def parse_get_cors_action(parser):
     parser = parser.add_parser('get-cors',
                                help=('Get the cors settings for the realm'))
@@ -140,6 +344,17 @@ def parse_get_cors_action(parser):
     return parser
 
 
+def parse_serve_action(parser):
+    parser = parser.add_parser('serve',
+                               help=('serve actions from a long-running '
+                                     'process on a Unix socket'))
+    parser.add_argument('--socket', type=str, default=None,
+                        help=('the Unix socket to listen on; defaults to '
+                              '$SDK_RELEASE_TOOL_SOCKET or '
+                              'tmp/sdk-release-tool.sock'))
+    return parser
+
+
 def parse_update_routing_rules_action(parser):
     parser = parser.add_parser('update-routing-rules',
                                help=('manually update Routing Rules '
@@ -151,7 +366,7 @@ def parse_update_routing_rules_action(parser):
     return parser
 
 
-def parse_args():
+def parse_args(argv=None):
     parser = ArgumentParser(description=('Manage Twilio SDK releases on the '
                                          'CDN'))
 
@@ -161,20 +376,34 @@ def parse_args():
     parse_download_action(action_parser)
     parse_list_action(action_parser)
     parse_list_routing_rules_action(action_parser)
+    parse_migrate_routing_rules_action(action_parser)
     parse_pin_action(action_parser)
     parse_pin_latest_action(action_parser)
+    parse_prewarm_action(action_parser)
+    parse_rebuild_index_action(action_parser)
+    parse_sync_action(action_parser)
     parse_unpin_action(action_parser)
     parse_unpin_latest_action(action_parser)
     parse_upload_action(action_parser)
+    parse_verify_action(action_parser)
     parse_get_cors_action(action_parser)
+    parse_serve_action(action_parser)
     parse_update_routing_rules_action(action_parser)
 
-    args = parser.parse_args()
+    for subparser in action_parser.choices.values():
+        parse_output(subparser)
+        parse_profile(subparser)
+
+    args = parser.parse_args(argv)
     # if parser.has_errors:
     #     parser.handle_error()
-    if not hasattr(args, 'realm') or not args.realm:
+    if args.action == 'serve':
+        return args
+    # The warning is left to whatever runs the action, once it has chosen
+    # text or JSON output.
+    args.assumed_realm = not getattr(args, 'realm', None)
+    if args.assumed_realm:
         args.realm = 'dev'
-        log.warn('  No realm specified, assuming dev')
     if not args.action:
         args.action = 'list'
 
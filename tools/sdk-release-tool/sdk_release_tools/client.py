@@ -0,0 +1,88 @@
+"""
+A thin client for `sdk-release-tool serve`. Arguments are parsed and validated
+locally; the action is then sent to the server if one is listening, and run in
+this process otherwise.
+"""
+from sdk_release_tools.cli import parse_args
+from sdk_release_tools.paths import TMP
+
+import json
+import os
+import socket
+import sys
+
+__all__ = ['main', 'request', 'socket_path']
+
+# Arguments naming local files, which the server resolves against its own
+# working directory unless we make them absolute.
+PATH_ARGS = ['product', 'source', 'destination', 'xml']
+
+
+def socket_path(path=None):
+    return (path or os.getenv('SDK_RELEASE_TOOL_SOCKET') or
+            os.path.join(TMP, 'sdk-release-tool.sock'))
+
+
+def connect(path=None):
+    """
+    Connect to a running server, or return None if there is none.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path(path))
+    except (IOError, OSError):
+        sock.close()
+        return None
+    return sock
+
+
+def request(args, path=None):
+    """
+    Run parsed arguments on a running server, copying its output to stdout,
+    and return the exit code; or return None if no server is listening.
+    """
+    sock = connect(path)
+    if not sock:
+        return None
+    with sock:
+        # The server draws progress as a single line only for a terminal.
+        sock.sendall(json.dumps({'args': vars(args),
+                                 'tty': sys.stdout.isatty()}).encode('utf-8')
+                     + b'\n')
+        for line in sock.makefile('rb'):
+            message = json.loads(line.decode('utf-8'))
+            if 'output' in message:
+                sys.stdout.write(message['output'])
+                sys.stdout.flush()
+            elif 'exit' in message:
+                if message.get('error'):
+                    sys.stderr.write(message['error'] + '\n')
+                return message['exit']
+    sys.stderr.write('Lost connection to sdk-release-tool server\n')
+    return 1
+
+
+def main(argv=None):
+    sys.argv[0] = 'sdk-release-tool'
+    args = parse_args(argv)
+    for name in PATH_ARGS:
+        if getattr(args, name, None):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    # Deleting without --silent asks for confirmation, and profiling must
+    # see only this action, so they run locally.
+    remote = (args.action != 'serve' and
+              (args.action != 'delete' or args.silent) and
+              getattr(args, 'profile', None) is None)
+    if remote:
+        code = request(args)
+        if code is not None:
+            return code
+
+    from sdk_release_tools.__main__ import run
+    run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
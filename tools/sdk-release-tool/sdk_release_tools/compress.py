@@ -0,0 +1,148 @@
+from contextlib import contextmanager
+from sdk_release_tools.errors import ReleaseError
+from sdk_release_tools.headers import content_type
+from sdk_release_tools.schema import COMPRESS_SETTINGS
+import os
+import shutil
+import tempfile
+
+__all__ = ['DEFAULT_CONTENT_TYPES', 'DEFAULT_EXTENSIONS', 'ENCODINGS',
+           'Compression', 'compress_file']
+
+# Text artifacts worth compressing; images, archives and fonts like .woff2 are
+# compressed already.
+DEFAULT_EXTENSIONS = ['.css', '.csv', '.htm', '.html', '.js', '.json', '.map',
+                      '.md', '.svg', '.txt', '.xml']
+
+# The same by the Content-Type uploads get, for extensions not listed above;
+# "type/*" matches any subtype.
+DEFAULT_CONTENT_TYPES = ['application/javascript', 'application/json',
+                         'application/xml', 'image/svg+xml', 'text/*']
+
+# Content-Encodings we can produce, keyed by their schema name.
+ENCODINGS = ['br', 'gzip']
+
+# Below this size, compression saves less than it costs.
+DEFAULT_MIN_SIZE = 1024
+
+
+def compress_file(encoding, src, dst):
+    """
+    Compress src into dst with the given Content-Encoding. This runs in a
+    worker process, so it must stay a module-level function.
+    """
+    if encoding == 'gzip':
+        import gzip
+        # Leaving out the file name and mtime keeps the output, and so its
+        # ETag, reproducible.
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            with gzip.GzipFile('', 'wb', compresslevel=9, fileobj=dst_file,
+                               mtime=0) as gzip_file:
+                shutil.copyfileobj(src_file, gzip_file)
+    elif encoding == 'br':
+        import brotli
+        with open(src, 'rb') as src_file:
+            data = brotli.compress(src_file.read())
+        with open(dst, 'wb') as dst_file:
+            dst_file.write(data)
+    else:
+        raise ValueError('Unsupported encoding {}'.format(encoding))
+    return dst
+
+
+class Compression(object):
+    """
+    How Upload pre-compresses text artifacts, as configured by the schema's
+    "compress" setting: either the name of an encoding, or an object with
+    "encoding", "extensions", "content_types" and "min_size". A file matches
+    by its extension or its Content-Type; given neither, the defaults for
+    both apply. Compression runs on a pool of processes for the duration of
+    a session.
+    """
+    def __init__(self, encoding='gzip', extensions=None,
+                 min_size=DEFAULT_MIN_SIZE, workers=None, content_types=None):
+        if encoding not in ENCODINGS:
+            raise ReleaseError('Unsupported compression encoding {}'.format(
+                encoding))
+        if encoding == 'br':
+            try:
+                import brotli
+            except ImportError:
+                raise ReleaseError('Compressing with br requires the brotli '
+                                   'package')
+        self.encoding = encoding
+        if extensions is None and content_types is None:
+            extensions = DEFAULT_EXTENSIONS
+            content_types = DEFAULT_CONTENT_TYPES
+        self.extensions = set(extension.lower() for extension in
+                              (extensions or []))
+        self.content_types = [pattern.lower() for pattern in
+                              (content_types or [])]
+        self.min_size = min_size
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._scratch = None
+
+    @classmethod
+    def from_schema(cls, schema):
+        setting = schema.get('compress')
+        if not setting:
+            return None
+        if isinstance(setting, dict):
+            unknown = sorted(set(setting) - set(COMPRESS_SETTINGS))
+            if unknown:
+                raise ReleaseError('Unknown compress setting(s) {}'.format(
+                    ', '.join(unknown)))
+            return cls(**setting)
+        return cls(encoding=setting)
+
+    def matches(self, filename):
+        extension = os.path.splitext(filename)[1].lower()
+        return ((extension in self.extensions or
+                 self.matches_content_type(content_type(filename))) and
+                os.path.getsize(filename) >= self.min_size)
+
+    def matches_content_type(self, value):
+        value = value.split(';')[0].strip().lower()
+        for pattern in self.content_types:
+            if pattern.endswith('/*'):
+                if value.startswith(pattern[:-1]):
+                    return True
+            elif value == pattern:
+                return True
+        return False
+
+    @contextmanager
+    def session(self):
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+        self._scratch = tempfile.mkdtemp(prefix='sdk-release-tool-')
+        # Other threads, e.g. the event loop of an AsyncS3Backend or the
+        # server's handlers, are running by now, and forking while they hold
+        # a lock can leave a worker deadlocked; start workers afresh instead.
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'))
+        try:
+            yield self
+        finally:
+            self._pool.shutdown()
+            shutil.rmtree(self._scratch, ignore_errors=True)
+            self._pool = None
+            self._scratch = None
+
+    def owns(self, filename):
+        """
+        Check whether a file is a compressed copy made in this session.
+        """
+        return (self._scratch is not None and
+                os.path.dirname(filename) == self._scratch)
+
+    def submit(self, filename):
+        """
+        Start compressing a file and return a Future for the compressed file's
+        path. Only valid within a session.
+        """
+        fd, dst = tempfile.mkstemp(dir=self._scratch)
+        os.close(fd)
+        return self._pool.submit(compress_file, self.encoding, filename, dst)
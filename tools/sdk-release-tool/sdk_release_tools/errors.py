@@ -0,0 +1,16 @@
+__all__ = ['ConflictError', 'ReleaseError']
+
+
+class ReleaseError(Exception):
+    """
+    An error that stops an action, e.g. a missing version or Key. It is raised
+    rather than exiting, so that workers in flight can drain; the entry point
+    reports it and exits non-zero.
+    """
+
+
+class ConflictError(ReleaseError):
+    """
+    A conditional write failed because the object changed, or came to exist,
+    since it was read.
+    """
@@ -0,0 +1,151 @@
+"""
+A cache of local files' hashes in SQLite, so that comparing artifacts with
+their ETags does not re-read files that have not changed since they were last
+hashed. Entries are keyed by absolute path and what was hashed (e.g. "md5",
+or "md5-8388608" for a multipart ETag), and only hold while the file's size,
+mtime and inode are unchanged. The least recently used entries are evicted
+beyond max_entries.
+"""
+from sdk_release_tools.paths import TMP, private_dir
+
+import os
+import threading
+import time
+
+__all__ = ['DEFAULT_MAX_ENTRIES', 'HashCache', 'RACY_SECONDS', 'cache_path',
+           'open_cache']
+
+DEFAULT_MAX_ENTRIES = 200000
+
+# A file modified this recently may be modified again without its mtime
+# changing, so its hashes are not cached.
+RACY_SECONDS = 2
+
+# How many writes to batch into one transaction.
+FLUSH_EVERY = 1000
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS hashes (
+           path TEXT NOT NULL,
+           kind TEXT NOT NULL,
+           size INTEGER NOT NULL,
+           mtime_ns INTEGER NOT NULL,
+           inode INTEGER NOT NULL,
+           value TEXT NOT NULL,
+           used REAL NOT NULL,
+           PRIMARY KEY (path, kind))''',
+    'CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used)',
+]
+
+
+def cache_path():
+    """
+    Get where the cache lives: $SDK_RELEASE_TOOL_HASH_CACHE, or next to the
+    server's socket in the tool's tmp directory.
+    """
+    return (os.getenv('SDK_RELEASE_TOOL_HASH_CACHE') or
+            os.path.join(TMP, 'hashes.sqlite3'))
+
+
+class HashCache(object):
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        import sqlite3
+        private_dir(os.path.dirname(path))
+        self.path = path
+        self.max_entries = max_entries
+        # Files are hashed on pools of threads; a lock serializes them here.
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        for statement in SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+        self._lock = threading.Lock()
+        # Writes not yet flushed, by path and kind.
+        self._writes = {}
+        self._used = {}
+
+    def identity(self, filename):
+        """
+        Get what identifies a file's contents to the cache, or None if it was
+        modified too recently to trust. Take it before reading the file.
+        """
+        stat = os.stat(filename)
+        if time.time() - stat.st_mtime < RACY_SECONDS:
+            return None
+        return (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns,
+                stat.st_ino)
+
+    def get(self, identity, kind):
+        if identity is None:
+            return None
+        path, size, mtime_ns, inode = identity
+        with self._lock:
+            written = self._writes.get((path, kind))
+            if written is not None:
+                if written[2:5] != identity[1:]:
+                    return None
+                self._writes[(path, kind)] = written[:6] + (time.time(),)
+                return written[5]
+            row = self._db.execute(
+                'SELECT value FROM hashes WHERE path = ? AND kind = ? AND '
+                'size = ? AND mtime_ns = ? AND inode = ?',
+                (path, kind, size, mtime_ns, inode)).fetchone()
+            if row is None:
+                return None
+            self._used[(path, kind)] = time.time()
+        return row[0]
+
+    def put(self, identity, kind, value):
+        if identity is None:
+            return
+        path, size, mtime_ns, inode = identity
+        with self._lock:
+            self._writes[(path, kind)] = (path, kind, size, mtime_ns, inode,
+                                          value, time.time())
+            if len(self._writes) >= FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)',
+            list(self._writes.values()))
+        self._db.executemany(
+            'UPDATE hashes SET used = ? WHERE path = ? AND kind = ?',
+            [(used, path, kind) for (path, kind), used in self._used.items()])
+        self._db.commit()
+        self._writes = {}
+        self._used = {}
+
+    def evict(self):
+        """
+        Delete the least recently used entries beyond max_entries.
+        """
+        with self._lock:
+            self._flush()
+            count = self._db.execute('SELECT COUNT(*) FROM hashes').fetchone()
+            excess = count[0] - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    'DELETE FROM hashes WHERE rowid IN (SELECT rowid FROM '
+                    'hashes ORDER BY used LIMIT ?)', (excess,))
+                self._db.commit()
+            return max(excess, 0)
+
+    def close(self):
+        self.evict()
+        self._db.close()
+
+
+def open_cache(enabled=True):
+    """
+    Open the HashCache, or return None if it is disabled or unusable, e.g. on
+    a read-only file system; hashing then just reads every file.
+    """
+    if not enabled:
+        return None
+    import sqlite3
+    try:
+        return HashCache(cache_path())
+    except (OSError, sqlite3.Error) as e:
+        from sdk_release_tools import log
+        log.warn('Not caching hashes: {}'.format(e))
+        return None
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+import mimetypes
+import os
+import re
+
+__all__ = ['CONTENT_TYPES', 'HeaderRules', 'content_type', 'translate']
+
+# Content-Types that mimetypes gets wrong or does not know on some platforms.
+# CDNs only compress and cache by type, so these matter.
+CONTENT_TYPES = {
+    '.css': 'text/css',
+    '.html': 'text/html',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.map': 'application/json',
+    '.md': 'text/markdown',
+    '.mjs': 'application/javascript',
+    '.svg': 'image/svg+xml',
+    '.txt': 'text/plain',
+    '.wasm': 'application/wasm',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.xml': 'application/xml',
+}
+
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+def content_type(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return (CONTENT_TYPES.get(extension) or mimetypes.guess_type(filename)[0]
+            or DEFAULT_CONTENT_TYPE)
+
+
+def translate(pattern):
+    """
+    Translate a glob into a regular expression. "*" and "?" do not match "/",
+    "**" matches across directories, and a pattern without "/" matches the
+    last path component only.
+    """
+    if '/' not in pattern:
+        pattern = '**/' + pattern
+    regex = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            regex.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            regex.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            regex.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            j = pattern.index(']', i + 1)
+            regex.append('[' + pattern[i + 1:j].replace('\\', '\\\\') + ']')
+            i = j + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+    return '(?s:' + ''.join(regex) + r')\Z'
+
+
+EXTENSION_PATTERN = re.compile(r'^\*(\.[^*?\[/.]+)$')
+
+
+def canonical(name):
+    """
+    Spell a header name the way uploads do, e.g. "cache-control" as
+    "Cache-Control", so that names differing only in case are one header.
+    x-amz-* headers are lowercase.
+    """
+    name = name.strip()
+    if name.lower().startswith('x-amz-'):
+        return name.lower()
+    return '-'.join(part.capitalize() for part in name.split('-'))
+
+
+class HeaderRules(object):
+    """
+    The schema's "headers": an object mapping globs to the headers (e.g.
+    Cache-Control, Content-Type, Content-Encoding or x-amz-meta-*) to store
+    objects whose keys match with. When several globs match, later ones win.
+    The globs are compiled once; the common "*.ext" form is looked up by
+    extension, and only the rest are matched one by one. Header names are
+    made canonical, since HTTP compares them regardless of case.
+    """
+    def __init__(self, rules=None):
+        self.by_extension = {}
+        self.patterns = []
+        for index, (pattern, headers) in enumerate((rules or {}).items()):
+            headers = OrderedDict((canonical(name), value)
+                                  for name, value in headers.items())
+            match = EXTENSION_PATTERN.match(pattern)
+            if match:
+                self.by_extension.setdefault(match.group(1), []).append(
+                    (index, headers))
+            else:
+                self.patterns.append(
+                    (index, re.compile(translate(pattern)).match, headers))
+
+    @classmethod
+    def from_schema(cls, schema, variables=None):
+        rules = schema.get('headers', {})
+        return cls(OrderedDict((pattern.format(**(variables or {})), headers)
+                               for pattern, headers in rules.items()))
+
+    def __len__(self):
+        return (sum(len(rules) for rules in self.by_extension.values()) +
+                len(self.patterns))
+
+    def match(self, key):
+        """
+        Get the headers for a key, merged from every matching rule.
+        """
+        matches = list(self.by_extension.get(os.path.splitext(key)[1], []))
+        matches.extend((index, headers) for index, match, headers in
+                       self.patterns if match(key))
+        if not matches:
+            return {}
+        merged = {}
+        for _, headers in sorted(matches, key=lambda match: match[0]):
+            merged.update(headers)
+        return merged
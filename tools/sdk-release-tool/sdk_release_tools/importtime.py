@@ -0,0 +1,125 @@
+"""
+Measure how long each sdk-release-tool action spends importing modules before
+it gets to do any work, and fail if any of them exceeds its budget:
+
+    python3 -m sdk_release_tools.importtime [--budget MS]
+
+Every action is started with --help through sdk_release_tools.client, the
+entry point the wrapper scripts use, so that only startup and argument parsing
+are measured. Modules the bare interpreter imports anyway are not counted.
+"""
+from argparse import ArgumentParser
+from sdk_release_tools.paths import ROOT
+
+import os
+import subprocess
+import sys
+
+__all__ = ['ACTIONS', 'DEFAULT_BUDGET_MS', 'EAGER_FORBIDDEN', 'ENTRY_POINT',
+           'STARTUP_FORBIDDEN', 'forbidden', 'import_times', 'measure']
+
+ACTIONS = [
+    None,
+    'delete',
+    'download',
+    'list',
+    'list-routing-rules',
+    'migrate-routing-rules',
+    'pin',
+    'pin-latest',
+    'prewarm',
+    'rebuild-index',
+    'sync',
+    'unpin',
+    'unpin-latest',
+    'upload',
+    'verify',
+    'get-cors',
+    'serve',
+    'update-routing-rules',
+]
+
+# Milliseconds of import time, beyond the bare interpreter's, that an action
+# may spend before parsing its arguments.
+DEFAULT_BUDGET_MS = 50
+
+# The module the wrapper scripts run.
+ENTRY_POINT = 'sdk_release_tools.client'
+
+# Third-party packages that must only be imported once an action needs them.
+EAGER_FORBIDDEN = ['boto', 'clint']
+
+# Our own modules that import what the actions do the work with (hashlib,
+# gzip, tempfile and the like) at module level, and so must stay off the
+# startup path.
+STARTUP_FORBIDDEN = ['sdk_release_tools.compress', 'sdk_release_tools.headers',
+                     'sdk_release_tools.manifest', 'sdk_release_tools.ops',
+                     'sdk_release_tools.util', 'sdk_release_tools.verify']
+
+
+def forbidden(modules):
+    """
+    Get those of the modules that startup must not import, sorted.
+    """
+    return sorted(module for module in modules
+                  if module.split('.')[0] in EAGER_FORBIDDEN or
+                  module in STARTUP_FORBIDDEN)
+
+
+def import_times(args):
+    """
+    Run the interpreter with -X importtime and return a dict mapping each
+    imported module to its own import time in microseconds.
+    """
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime'] + args,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=ROOT)
+    _, stderr = process.communicate()
+    times = {}
+    for line in stderr.decode('utf-8', 'replace').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        times[fields[2].strip()] = int(fields[0])
+    return times
+
+
+def measure(action):
+    """
+    Get the modules an action imports on startup beyond those of the bare
+    interpreter, with their import times in microseconds.
+    """
+    baseline = import_times(['-c', 'pass'])
+    args = ['-m', ENTRY_POINT]
+    if action:
+        args.append(action)
+    times = import_times(args + ['--help'])
+    return dict((module, time) for module, time in times.items()
+                if module not in baseline)
+
+
+def main():
+    parser = ArgumentParser(description='Check sdk-release-tool import times')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS,
+                        help='the import time budget per action, in ms')
+    args = parser.parse_args()
+
+    failed = False
+    for action in ACTIONS:
+        times = measure(action)
+        total = sum(times.values()) / 1000.0
+        imported = forbidden(times)
+        status = 'ok'
+        if total > args.budget or imported:
+            status = 'FAIL'
+            failed = True
+        print('{:<24} {:>8.1f} ms  {}{}'.format(
+            action or '(none)', total, status,
+            ' (imports {})'.format(', '.join(imported)) if imported else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
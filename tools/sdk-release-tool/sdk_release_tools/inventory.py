@@ -0,0 +1,208 @@
+"""
+Reading S3 Inventory reports, so that scanning a product for its versions and
+pins does not have to list every major/minor prefix of a large bucket. A report
+is its manifest.json plus the data files it names, in CSV (gzipped), ORC or
+Parquet; ORC and Parquet need pyarrow. Rows are streamed a file at a time and
+only keys under the prefixes asked for are kept. A report is a day or so old,
+so what it says is only a starting point for the live bucket; see
+util.scan_versions.
+"""
+from contextlib import contextmanager
+from sdk_release_tools.errors import ReleaseError
+
+import csv
+import gzip
+import json
+import os
+
+__all__ = ['FORMATS', 'Inventory', 'split_location']
+
+FORMATS = ['CSV', 'ORC', 'Parquet']
+
+
+def split_location(location):
+    """
+    Split where a report's manifest.json is into the bucket it is in and its
+    key, for "s3://bucket/key", or else None and the path or key as given,
+    which is looked for locally and then in the release bucket.
+    """
+    if not location.startswith('s3://'):
+        return None, location
+    bucket, _, key = location[len('s3://'):].partition('/')
+    if not bucket or not key:
+        raise ReleaseError('Invalid S3 Inventory location {}'.format(
+            location))
+    return bucket, key
+
+
+class Inventory(object):
+    """
+    An S3 Inventory report. open_file is a context manager factory that
+    yields a local filename for a data file's key.
+    """
+    def __init__(self, manifest, open_file, location='inventory'):
+        self.location = location
+        try:
+            self.format = manifest['fileFormat']
+            self.files = [data['key'] for data in manifest['files']]
+            # Milliseconds since the epoch, as a string.
+            self.created = int(manifest['creationTimestamp']) / 1000.0
+            self.schema = manifest.get('fileSchema', '')
+        except (KeyError, TypeError, ValueError) as e:
+            raise ReleaseError('{}: not an S3 Inventory manifest ({})'.format(
+                location, e))
+        if self.format.lower() not in [f.lower() for f in FORMATS]:
+            raise ReleaseError('{}: unsupported S3 Inventory format {}'.format(
+                location, self.format))
+        self._open_file = open_file
+
+    @classmethod
+    def load(cls, location, backend=None):
+        """
+        Load a report's manifest.json from a local path or, if there is no
+        such file, from a key through the Backend. A local manifest's data
+        files are looked for by name next to it, or in the "data" directory
+        where "aws s3 sync" of the inventory's prefix leaves them.
+        """
+        if os.path.exists(location):
+            with open(location, 'rb') as f:
+                manifest = parse(f.read(), location)
+            root = os.path.dirname(os.path.abspath(location))
+            return cls(manifest, lambda key: local_file(root, key), location)
+        if backend is None:
+            raise ReleaseError('No S3 Inventory manifest at {}'.format(
+                location))
+        found = backend.get_bytes(location)
+        if found is None:
+            raise ReleaseError('No S3 Inventory manifest at {}'.format(
+                location))
+        return cls(parse(found[0], location),
+                   lambda key: downloaded_file(backend, key), location)
+
+    def keys(self, prefixes):
+        """
+        Iterate over the current keys under any of the prefixes, in no
+        particular order.
+        """
+        prefixes = tuple(prefixes)
+        read = getattr(self, '_read_' + self.format.lower())
+        for name in self.files:
+            with self._open_file(name) as filename:
+                for key in read(filename):
+                    if key.startswith(prefixes):
+                        yield key
+
+    def children(self, prefix):
+        """
+        Group the keys directly under each subprefix of a prefix, e.g.
+        "sdk/js/video/v1.0/video.js" under "sdk/js/video/v1.0/", sorted. A
+        subprefix with only deeper keys, e.g. "sdk/js/video/v1.0/docs/", maps
+        to none, so that every subprefix in the report is present.
+        """
+        children = {}
+        for key in self.keys([prefix]):
+            parts = key[len(prefix):].split('/')
+            if len(parts) < 2 or not parts[0]:
+                continue
+            keys = children.setdefault(prefix + parts[0] + '/', [])
+            if len(parts) == 2 and parts[1]:
+                keys.append(key)
+        for keys in children.values():
+            keys.sort()
+        return children
+
+    def _read_csv(self, filename):
+        # CSV reports have no header; the manifest names the columns, and
+        # keys are URL-encoded.
+        from urllib.parse import unquote
+        columns = [column.strip().lower()
+                   for column in self.schema.split(',')]
+        key, latest, deleted = (index(columns, 'key'),
+                                index(columns, 'islatest'),
+                                index(columns, 'isdeletemarker'))
+        if key is None:
+            raise ReleaseError('{}: no Key in {}'.format(self.location,
+                                                         self.schema))
+        with gzip.open(filename, 'rt', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if latest is not None and row[latest] != 'true':
+                    continue
+                if deleted is not None and row[deleted] == 'true':
+                    continue
+                yield unquote(row[key])
+
+    def _read_orc(self, filename):
+        orc = import_pyarrow('orc')
+        reader = orc.ORCFile(filename)
+        for stripe in range(reader.nstripes):
+            for key in current_keys(reader.read_stripe(stripe)):
+                yield key
+
+    def _read_parquet(self, filename):
+        parquet = import_pyarrow('parquet')
+        for batch in parquet.ParquetFile(filename).iter_batches():
+            for key in current_keys(batch):
+                yield key
+
+
+def parse(data, location):
+    try:
+        return json.loads(data.decode('utf-8'))
+    except ValueError as e:
+        raise ReleaseError('{}: invalid JSON: {}'.format(location, e))
+
+
+def index(columns, name):
+    return columns.index(name) if name in columns else None
+
+
+def current_keys(batch):
+    """
+    Get the keys of a pyarrow RecordBatch's rows that are neither old
+    versions nor delete markers.
+    """
+    columns = dict((name.lower(), column.to_pylist()) for name, column
+                   in zip(batch.schema.names, batch.columns))
+    latest = columns.get('is_latest')
+    deleted = columns.get('is_delete_marker')
+    for i, key in enumerate(columns['key']):
+        if latest is not None and not latest[i]:
+            continue
+        if deleted is not None and deleted[i]:
+            continue
+        yield key
+
+
+def import_pyarrow(module):
+    import importlib
+    try:
+        return importlib.import_module('pyarrow.' + module)
+    except ImportError:
+        raise ReleaseError('Reading {} S3 Inventory reports requires '
+                           'pyarrow'.format(module))
+
+
+@contextmanager
+def local_file(root, key):
+    name = os.path.basename(key)
+    for filename in [os.path.join(root, name),
+                     os.path.join(root, 'data', name),
+                     os.path.join(os.path.dirname(root), 'data', name)]:
+        if os.path.exists(filename):
+            yield filename
+            return
+    raise ReleaseError('S3 Inventory data file {} not found in {}'.format(
+        name, root))
+
+
+@contextmanager
+def downloaded_file(backend, key):
+    import shutil
+    import tempfile
+    scratch = tempfile.mkdtemp(prefix='sdk-release-tool-')
+    try:
+        filename = os.path.join(scratch, os.path.basename(key))
+        backend.get_file(key, filename)
+        yield filename
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
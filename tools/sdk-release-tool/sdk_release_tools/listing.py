@@ -0,0 +1,86 @@
+"""
+Listing a large prefix shard by shard. S3 lists at most 1000 keys a page, and
+each page needs the previous one's continuation token, so one listing of a
+product's millions of keys is bound by round trips. A delimited listing finds
+the prefix's subprefixes (e.g. one per release); those are listed
+concurrently, and their Objects merged back into the order S3 lists them in.
+"""
+from collections import deque
+from sdk_release_tools.backend import Object
+from sdk_release_tools.parallel import DEFAULT_WORKERS
+
+import threading
+
+__all__ = ['MAX_DEPTH', 'list_sharded', 'shards']
+
+# How many levels of lone subprefixes, e.g. "sdk/js/video/releases/", to
+# descend through looking for shards.
+MAX_DEPTH = 4
+
+
+def shards(backend, prefix):
+    """
+    Split a prefix into the Objects directly under it and the subprefixes
+    that hold the rest, in the order S3 lists them. A subprefix's keys all
+    sort between it and the next entry, so listing each subprefix in its
+    place preserves the order.
+    """
+    for depth in range(MAX_DEPTH):
+        entries = sorted(backend.list(prefix, '/'), key=lambda obj: obj.name)
+        if (depth == MAX_DEPTH - 1 or len(entries) != 1 or
+                not is_shard(entries[0])):
+            return entries
+        prefix = entries[0].name
+
+
+def list_sharded(backend, prefix, workers=DEFAULT_WORKERS):
+    """
+    Iterate over the Objects under a prefix, like Backend.list, listing up to
+    workers of its subprefixes at once. A prefix without subprefixes takes
+    just the one delimited listing.
+    """
+    entries = iter(shards(backend, prefix))
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+    stopped = threading.Event()
+
+    def list_shard(name):
+        objects = []
+        for obj in backend.list(name):
+            if stopped.is_set():
+                break
+            objects.append(obj)
+        return objects
+
+    # Subprefixes listed or being listed ahead of the entry being yielded;
+    # each is held in memory until its turn.
+    window = deque()
+    try:
+        while True:
+            while len(window) < max(workers, 1):
+                entry = next(entries, None)
+                if entry is None:
+                    break
+                if is_shard(entry):
+                    entry = executor.submit(list_shard, entry.name)
+                window.append(entry)
+            if not window:
+                return
+            entry = window.popleft()
+            if isinstance(entry, Object):
+                yield entry
+                continue
+            for obj in entry.result():
+                yield obj
+    finally:
+        # If the caller stops early, stop listing, and wait for listings
+        # already under way to stop before the Backend can be closed.
+        stopped.set()
+        for entry in window:
+            if not isinstance(entry, Object):
+                entry.cancel()
+        executor.shutdown()
+
+
+def is_shard(obj):
+    return obj.size is None and obj.name.endswith('/')
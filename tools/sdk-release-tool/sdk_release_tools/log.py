@@ -1,24 +1,112 @@
-from clint.textui import colored
+from contextlib import contextmanager
 
+import json
 import sys
+import threading
+
+_local = threading.local()
+
+
+def colored(color, message):
+    # clint is only imported once something is actually printed in color, so
+    # that e.g. --help does not pay for it.
+    from clint.textui import colored
+    return getattr(colored, color)(message)
+
+
+class JsonLines(object):
+    """
+    A stream that log messages and events are written to as JSON objects, one
+    per line, for tools to consume instead of scraping text. Redirect to one
+    to switch a thread (and the workers it starts) to structured output.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        line = json.dumps(event, sort_keys=True) + '\n'
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+    def write(self, text):
+        if text.strip():
+            self.emit({'event': 'output', 'message': text.rstrip('\n')})
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def output():
+    """
+    Get the stream this thread logs to: stdout, unless redirected.
+    """
+    return getattr(_local, 'stream', None) or sys.stdout
+
+
+def json_output():
+    """
+    Check whether this thread logs JSON lines.
+    """
+    return isinstance(output(), JsonLines)
+
+
+@contextmanager
+def redirect(stream):
+    """
+    Send this thread's log messages to another stream, e.g. a client socket.
+    """
+    previous = getattr(_local, 'stream', None)
+    _local.stream = stream
+    try:
+        yield stream
+    finally:
+        _local.stream = previous
+
+
+def _print(level, color, message):
+    stream = output()
+    if isinstance(stream, JsonLines):
+        stream.emit({'event': 'log', 'level': level, 'message': message})
+    else:
+        print(colored(color, message) if color else message, file=stream)
+
+
+def event(name, **fields):
+    """
+    Emit a structured event, e.g. an object transferred or a phase's timing.
+    Events are only written as JSON lines; text output has its own messages.
+    """
+    stream = output()
+    if isinstance(stream, JsonLines):
+        fields['event'] = name
+        stream.emit(fields)
 
 
 def debug(message):
-    print(colored.green(message))
+    _print('debug', 'green', message)
 
 
 def error(message):
-    print(colored.red(message))
+    """
+    Log an error and exit. Only the entry point should call this; everything
+    else raises errors.ReleaseError, so that concurrent work can wind down.
+    """
+    _print('error', 'red', message)
     sys.exit(1)
 
 
 def info(message):
-    print(colored.blue(message))
+    _print('info', 'blue', message)
 
 
 def log(message):
-    print(message)
+    _print('log', None, message)
 
 
 def warn(message):
-    print(colored.yellow(message))
+    _print('warn', 'yellow', message)
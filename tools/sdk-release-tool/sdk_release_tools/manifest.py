@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from sdk_release_tools.backend import Object
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+__all__ = ['MANIFEST_HEADERS', 'MANIFEST_NAME', 'Manifest', 'manifest_key',
+           'release_prefix']
+
+MANIFEST_NAME = '.manifest.json.gz'
+
+# The manifest changes if a release is re-uploaded with --force, so it must
+# not be cached like the artifacts themselves.
+MANIFEST_HEADERS = {
+    'Cache-Control': 'max-age=0, no-cache, no-store',
+    'Content-Type': 'application/gzip'
+}
+
+
+def release_prefix(schema, variables):
+    """
+    Get the prefix under which a version's artifacts are uploaded, e.g.
+    "sdk/js/video/releases/1.2.3/".
+    """
+    return os.path.join(schema.get('versions').format(**variables),
+                        variables['version'], '')
+
+
+def manifest_key(schema, variables):
+    return release_prefix(schema, variables) + MANIFEST_NAME
+
+
+class Manifest(object):
+    """
+    The path, size, ETag and Content-Type of every object uploaded for a
+    release, stored next to it as gzipped JSON. Ops that need a release's
+    contents read this one object instead of paging through listings; paths
+    are relative to the release's prefix.
+    """
+    def __init__(self, prefix, objects=None):
+        self.prefix = prefix
+        self.objects = OrderedDict((obj.name, obj) for obj in objects or [])
+
+    def __len__(self):
+        return len(self.objects)
+
+    def add(self, obj):
+        self.objects[obj.name] = obj
+
+    def remove(self, name):
+        self.objects.pop(name, None)
+
+    def covers(self, prefix):
+        """
+        Check whether every object under a prefix is in this Manifest.
+        """
+        return prefix.startswith(self.prefix)
+
+    def get(self, name):
+        return self.objects.get(name)
+
+    def list(self, prefix):
+        for name in sorted(self.objects):
+            if name.startswith(prefix):
+                yield self.objects[name]
+
+    def dumps(self):
+        objects = []
+        for obj in self.list(''):
+            path = (obj.name[len(self.prefix):]
+                    if obj.name.startswith(self.prefix) else '/' + obj.name)
+            objects.append({
+                'path': path,
+                'size': obj.size,
+                'etag': obj.etag,
+                'content_type': obj.content_type
+            })
+        data = json.dumps({'prefix': self.prefix, 'objects': objects},
+                          separators=(',', ':'), sort_keys=True)
+        return gzip.compress(data.encode('utf-8'), mtime=0)
+
+    @classmethod
+    def loads(cls, data):
+        manifest = json.loads(gzip.decompress(data).decode('utf-8'))
+        prefix = manifest['prefix']
+        return cls(prefix, [
+            Object(obj['path'][1:] if obj['path'].startswith('/') else
+                   prefix + obj['path'], obj['size'], obj['etag'],
+                   obj.get('content_type'))
+            for obj in manifest['objects']])
+
+    @classmethod
+    def load(cls, backend, key):
+        """
+        Fetch a Manifest through a Backend, or return None if there is none.
+        """
+        # One GET, which answers 404 if there is none.
+        result = backend.get_bytes(key)
+        if result is None:
+            return None
+        data, _ = result
+        return cls.loads(data)
+
+    def save(self, backend, key):
+        scratch = tempfile.mkdtemp(prefix='sdk-release-tool-')
+        try:
+            filename = os.path.join(scratch, MANIFEST_NAME)
+            with open(filename, 'wb') as f:
+                f.write(self.dumps())
+            backend.put_file(key, filename, MANIFEST_HEADERS)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
@@ -1,11 +1,34 @@
-from boto.s3.key import Key
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from sdk_release_tools import log
+from sdk_release_tools.backend import DELETE_BATCH_SIZE, Object
+from sdk_release_tools.bundle import BUNDLE_FILES
+from sdk_release_tools.errors import ReleaseError
+from sdk_release_tools.headers import content_type
+from sdk_release_tools.listing import list_sharded
+from sdk_release_tools.manifest import MANIFEST_NAME
+from sdk_release_tools.parallel import DEFAULT_WORKERS
+from sdk_release_tools.pipeline import pipeline
+from sdk_release_tools.rules import RoutingRuleIndex
+from sdk_release_tools.verify import Report, matches, md5
 from sdk_release_tools.versions import parse_major_minor
 
 import os
+import time
 
-__all__ = ['Delete', 'Download', 'Pin', 'Unpin', 'Upload', 'delete',
-           'download', 'pin', 'unpin', 'upload']
+__all__ = ['Delete', 'Download', 'Migrate', 'Pin', 'Transfer', 'Transfers',
+           'Sync', 'Unpin', 'Upload', 'Verify', 'WebsiteConfiguration',
+           'delete', 'download', 'migrate', 'pin', 'sync', 'unpin', 'upload',
+           'verify', 'walk', 'website_session']
+
+REDIRECT_HEADERS = {
+    'Cache-Control': 'max-age=0, no-cache, no-store'
+}
+
+UPLOAD_HEADERS = {
+    'Cache-Control': 'max-age=315360000',
+    'Expires': 'Thu, 31 Dec 2037 23:55:55 GMT'
+}
 
 
 def absolute(root):
@@ -14,17 +37,145 @@ def absolute(root):
     return root
 
 
+class WebsiteConfiguration(object):
+    """
+    A transactional view of a bucket's website configuration. The
+    configuration is fetched once; RoutingRules may then be removed by any
+    number of ops, and the configuration is written back at most once, on
+    commit, and only if something changed.
+    """
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.config = bucket.get_website_configuration_obj()
+        self.rules = self.config.routing_rules
+        self.index = RoutingRuleIndex(self.rules)
+        self.dirty = False
+
+    def remove_rule(self, rule):
+        """
+        Remove a RoutingRule, returning whether it was still present.
+        """
+        if not self.index.remove(rule):
+            return False
+        self.rules.remove(rule)
+        self.dirty = True
+        return True
+
+    def commit(self, dry_run=True):
+        if not self.dirty or dry_run:
+            return False
+        self.bucket.configure_website(suffix=self.config.suffix,
+                                      error_key=self.config.error_key,
+                                      routing_rules=self.rules)
+        self.dirty = False
+        return True
+
+
+@contextmanager
+def website_session(bucket, dry_run=True):
+    """
+    Share one WebsiteConfiguration between several ops, e.g. a pin and a
+    pin-latest, and commit it once they have all run.
+    """
+    website = WebsiteConfiguration(bucket)
+    yield website
+    website.commit(dry_run)
+
+
 class Context(object):
     def __init__(self, root=None, variables=None, bucket=None, dry_run=True, silent=False,
-                 copy_on_pin=False):
+                 copy_on_pin=False, website=None, backend=None,
+                 compression=None, header_rules=None, report=None,
+                 manifest=None, limits=None, progress=None,
+                 major_minor=None, hashes=None, bundle=None):
         self.root = root
+        # Variables to interpolate into the tree's keys. A tree rendered by
+        # schema.Schema needs none.
         self.variables = variables or {}
+        # The major/minor pair being (un)pinned, if not in the variables.
+        self.major_minor = major_minor
         self.bucket = bucket
-        self.rules = (bucket.get_website_configuration_obj().routing_rules if
-                      bucket else None)
+        # Objects are read and written through the Backend; the bucket itself
+        # is only needed for its website configuration.
+        if backend is None and bucket is not None:
+            from sdk_release_tools.backend import BotoBackend
+            backend = BotoBackend(bucket)
+        self.backend = backend
+        # A Context that creates its own WebsiteConfiguration also commits it;
+        # one passed in is committed by whoever opened the session. Either
+        # way, it is only fetched once an op needs it.
+        self.owns_website = website is None and bucket is not None
+        self._website = website
+        # RoutingRules matched by key, for ops that look them up in a batch.
+        self.matched_rules = {}
         self.dry_run = dry_run
         self.silent = silent
         self.copy_on_pin = copy_on_pin
+        # How Upload pre-compresses text artifacts, if at all; see
+        # sdk_release_tools.compress.
+        self.compression = compression
+        # Per-glob headers for uploaded objects; see
+        # sdk_release_tools.headers.
+        self.header_rules = header_rules
+        # What Verify found.
+        self.report = report
+        # The release's Manifest, which Upload adds to and other ops list
+        # from; see sdk_release_tools.manifest.
+        self.manifest = manifest
+        # The ratelimit.RateLimits that transfers wait on, if any.
+        self.limits = limits
+        # The progress.Progress display, if any.
+        self.progress = progress
+        # The hashcache.HashCache that local files' ETags are looked up in,
+        # if any.
+        self.hashes = hashes
+        # The bundle.Writer that Upload and Sync add every local artifact to
+        # as they read it, if any.
+        self.bundle = bundle
+
+    @property
+    def website(self):
+        if self._website is None and self.bucket is not None:
+            self._website = WebsiteConfiguration(self.bucket)
+        return self._website
+
+    @property
+    def rules(self):
+        return self.website.rules if self.website else None
+
+    def log(self, message, warn=False):
+        """
+        Log a message about a single object. With a Progress display, only
+        warnings are shown, unless it is verbose.
+        """
+        if self.progress is not None:
+            self.progress.log(message, warn)
+        elif warn:
+            log.warn(message)
+        else:
+            log.log(message)
+
+    def list(self, prefix):
+        """
+        List the Objects under a prefix: from the Manifest if it covers the
+        prefix, and otherwise from the Backend, a subprefix per worker.
+        """
+        if self.manifest is not None and self.manifest.covers(prefix):
+            return self.manifest.list(prefix)
+        return list_sharded(self.backend, prefix)
+
+    def head(self, name):
+        if self.manifest is not None and self.manifest.covers(name):
+            return self.manifest.get(name)
+        return self.backend.head(name)
+
+    def commit_website(self):
+        """
+        Write back this Context's own WebsiteConfiguration, if it was fetched.
+        """
+        if self.owns_website and self._website is not None:
+            self._website.commit(self.dry_run)
+        return self
 
     def absolute(self, key):
         """
@@ -40,6 +191,8 @@ class Context(object):
         """
         Get the relative path to a key, and interpolate any variables.
         """
+        if not self.variables:
+            return key
         return key.format(**self.variables)
 
 
@@ -65,214 +218,689 @@ class Ops(object):
         return context
 
     def run(self, context):
-        return self._fold(context)
+        start = time.time()
+        context = self._fold(context)
+        log.event('op', op=type(self).__name__.lower(),
+                  seconds=round(time.time() - start, 3))
+        return context
 
 
-class Delete(Ops):
-    def _op_dir(self, key, value, context):
-        src = context.relative(value)
-        for sub_key in context.bucket.list(src):
-            context = self._op_file(sub_key.name, sub_key.name, context)
+class Transfer(object):
+    """
+    One object moved by a Transfers op, from src to dst; either may be an S3
+    key or a local path. obj is the Object a listing returned, if any,
+    headers any headers specific to this object, and size how many bytes it
+    counts for in progress reports.
+    """
+    __slots__ = ['src', 'dst', 'obj', 'headers', 'size']
+
+    def __init__(self, src, dst=None, obj=None, headers=None):
+        self.src = src
+        self.dst = dst
+        self.obj = obj
+        self.headers = headers
+        self.size = None
+
+
+class Transfers(Ops):
+    """
+    Ops that move any number of objects per key of the tree. Each key is
+    streamed through a pipeline of stages: _enumerate the objects, _filter
+    them (and log what will happen), _submit each transfer to the Backend
+    without waiting, and _verify the results as they complete. Stages overlap
+    and are connected by bounded queues, so memory stays flat no matter how
+    many objects there are.
+    """
+    def _op(self, key, value, context):
+        self._stream(key, value, context)
         return context
 
-    def _op_file(self, key, value, context):
-        src = context.relative(value)
-        
-        if not context.silent:
-            response =  raw_input("Confirm deletion of " + src + " [y/n]: ").lower()
-            if response == "yes" or response == "y":
-                log.log("  Continuing deletion of: " + src + "\n")
-                self._delete_file(src, context)
-            else:
-                log.log("  Skipping, " + src + " will be protected.\n")
-        else:
-            log.log(src)
-            self._delete_file(src,context)
-        return context
+    def _stream(self, key, value, context, transfers=None):
+        """
+        Run the stages for one key of the tree, on the transfers it
+        enumerates unless they are given, and return how many objects went
+        through them.
+        """
+        if transfers is None:
+            transfers = self._enumerate(key, value, context)
+        if context.progress is not None:
+            transfers = context.progress.track(self._measure(transfer)
+                                               for transfer in transfers)
+        start = time.time()
+        count = 0
+        for _ in pipeline(transfers, self._stages(key, value, context)):
+            count += 1
+        log.event('phase', op=type(self).__name__.lower(), key=key,
+                  objects=count, seconds=round(time.time() - start, 3))
+        return count
+
+    def _measure(self, transfer):
+        transfer.size = self._size(transfer)
+        return transfer
+
+    def _stages(self, key, value, context):
+        return [
+            lambda transfers: self._filter(transfers, key, value, context),
+            lambda transfers: self._transfer(transfers, context),
+            lambda results: self._verify(results, context)
+        ]
+
+    def _enumerate(self, key, value, context):
+        return iter([])
+
+    def _filter(self, transfers, key, value, context):
+        return transfers
+
+    def _transfer(self, transfers, context):
+        for transfer in transfers:
+            future = None
+            if not context.dry_run:
+                if context.limits:
+                    context.limits.acquire(self._size(transfer))
+                future = self._submit(transfer, context)
+            yield transfer, future
 
-    def _delete_file(self, src, context):
-        src_key = context.bucket.get_key(src)
-        if not src_key:
-            log.warn('  Key {} does not exist'.format(src))
+    def _size(self, transfer):
+        """
+        Get how many bytes a transfer moves, as far as we know.
+        """
+        return (transfer.obj.size or 0) if transfer.obj else 0
+
+    def _submit(self, transfer, context):
+        raise NotImplementedError
+
+    def _verify(self, results, context):
+        # Keep draining after a failure so that every transfer already started
+        # is accounted for; then raise the first error.
+        error = None
+        for transfer, future in results:
+            if future is not None:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self._event(transfer, context, error=str(e))
+                    error = error or e
+                    continue
+                self._done(transfer, context, result)
+            self._event(transfer, context)
+            if context.progress is not None:
+                context.progress.update(1, transfer.size)
+            yield transfer
+        if error:
+            raise error
+
+    def _done(self, transfer, context, result=None):
+        """
+        Account for a transfer that completed, given what the Backend
+        returned for it.
+        """
+        pass
 
-        if not context.dry_run and src_key:
-            context.bucket.delete_key(src)
-            log.log("   " + src + " deleted")
-        return context
+    def _event(self, transfer, context, **fields):
+        log.event('object', op=type(self).__name__.lower(), src=transfer.src,
+                  dst=transfer.dst, size=transfer.size,
+                  dry_run=context.dry_run, **fields)
 
 
-class Download(Ops):
-    def _op_dir(self, key, value, context):
-        src = context.relative(value)
-        for sub_key in context.bucket.list(src):
-            context = self._op_file(
-                os.path.join(key, sub_key.name[len(src):]), sub_key.name,
-                context)
+class Delete(Transfers):
+    """
+    Delete the objects of a release. Unless silent, every key to delete is
+    listed first and the deletion is confirmed once, on the calling thread,
+    since the stages run on threads of their own.
+    """
+    def _fold(self, context, tree=None):
+        if context.silent:
+            return super(Delete, self)._fold(context, tree)
+        tree = tree or self.tree
+        transfers = OrderedDict(
+            (key, list(self._enumerate(key, value, context)))
+            for key, value in tree.items())
+        count = sum(len(found) for found in transfers.values())
+        if not count:
+            return context
+        for found in transfers.values():
+            for transfer in found:
+                log.log('  ' + transfer.src)
+        response = input('Confirm deletion of {} keys [y/n]: '.format(count))
+        if response.strip().lower() not in ('y', 'yes'):
+            log.log('  Skipping; nothing will be deleted')
+            return context
+        for key, value in tree.items():
+            self._stream(key, value, context, transfers[key])
         return context
 
-    def _op_file(self, key, value, context):
+    def _enumerate(self, key, value, context):
         src = context.relative(value)
-        dst = context.absolute(key)
-        log.log('{} -> {}'.format(src, dst))
+        if not key.endswith('/'):
+            if not context.head(src):
+                log.warn('  Key {} does not exist'.format(src))
+            else:
+                yield Transfer(src)
+            return
+        for obj in context.list(src):
+            yield Transfer(obj.name, obj=obj)
 
-        src_key = context.bucket.get_key(src)
-        if not src_key:
-            log.error('  Key {} does not exist'.format(src))
+    def _filter(self, transfers, key, value, context):
+        for transfer in transfers:
+            if context.silent:
+                context.log(transfer.src)
+            yield transfer
 
-        if not context.dry_run and src_key:
-            dst_dir = os.path.dirname(dst)
-            try:
-                os.makedirs(dst_dir)
-            except:
-                pass
-            src_key.get_contents_to_filename(dst)
+    def _size(self, transfer):
+        # A delete moves no bytes, whatever the object's size.
+        return 0
 
-        return context
+    def _submit(self, transfer, context):
+        return context.backend.submit('delete', transfer.src)
 
+    def _done(self, transfer, context, result=None):
+        context.log("   " + transfer.src + " deleted")
 
-def reconfigure_website(bucket, rules):
-    config = bucket.get_website_configuration_obj()
-    bucket.configure_website(suffix=config.suffix, error_key=config.error_key,
-                             routing_rules=rules)
+
+class Download(Transfers):
+    def _enumerate(self, key, value, context):
+        src = context.relative(value)
+        dst = context.absolute(key)
+        if not key.endswith('/'):
+            obj = context.head(src)
+            if not obj:
+                raise ReleaseError('Key {} does not exist'.format(src))
+            yield Transfer(src, dst, obj)
+            return
+        for obj in context.list(src):
+            yield Transfer(obj.name, os.path.join(dst, obj.name[len(src):]),
+                           obj)
+
+    def _filter(self, transfers, key, value, context):
+        for transfer in transfers:
+            context.log('{} -> {}'.format(transfer.src, transfer.dst))
+            if not context.dry_run:
+                dst_dir = os.path.dirname(transfer.dst)
+                try:
+                    os.makedirs(dst_dir)
+                except:
+                    pass
+            yield transfer
+
+    def _submit(self, transfer, context):
+        return context.backend.submit('get_file', transfer.src, transfer.dst)
+
+
+def remove_pinning_rules(src, context):
+    """
+    Remove any legacy RoutingRules redirecting a prefix of src for the
+    major/minor pair being (un)pinned, and return them.
+    """
+    major_minor = context.major_minor or parse_major_minor(
+        '{major}.{minor}'.format(**context.variables))
+    matches = context.matched_rules.get(src)
+    if matches is None:
+        matches = context.website.index.match(src)
+    removed = []
+    for entry in matches:
+        if entry.major_minor is None or entry.major_minor != major_minor:
+            continue
+        if context.website.remove_rule(entry.rule):
+            removed.append(entry)
+    return removed
+
+
+def match_pinning_rules(tree, context):
+    """
+    Look up the RoutingRules matching every key in a pin map at once.
+    """
+    context.matched_rules = context.website.index.match_all(
+        [context.relative(key) for key in tree])
+    return context
 
 
 class Pin(Ops):
+    """
+    Point S3 Key redirects at a release. Every key's current redirect is read
+    in one concurrent batch, and only those pointing elsewhere are written,
+    also concurrently, so that pinning again changes nothing, and nothing the
+    CDN has cached needs revalidating.
+    """
     def _op(self, key, value, context):
         src = context.relative(key)
         dst = context.relative(value)
-        log.log('{} -> {}'.format(src, dst))
+        target = '/' + dst.lstrip('/')
+        context.log('{} -> {}'.format(src, dst))
 
         # Delete any previous RoutingRules. We have to use S3 Key redirects.
-        for rule in list(context.rules):
-            key_prefix = rule.condition.key_prefix
-            if not src.startswith(key_prefix):
-                continue
-
-            replace_key_prefix = rule.redirect.replace_key_prefix
-
-            try:
-                major_minor = parse_major_minor(
-                    os.path.split(key_prefix.rstrip('/'))[1])
-            except:
-                continue
-
-            if (major_minor != parse_major_minor(
-                    '{major}.{minor}'.format(**context.variables))):
-                continue
-
-            context.rules.remove(rule)
-
-            log.warn('  Deleting RoutingRule that pointed to {}'.format(
-                replace_key_prefix))
+        for entry in remove_pinning_rules(src, context):
+            context.log('  Deleting RoutingRule that pointed to {}'.format(
+                entry.replace_key_prefix), warn=True)
 
         # Create S3 Key redirect.
-        src_key = context.bucket.get_key(src)
-        if not src_key:
-            log.log('  Creating S3 Key redirect')
+        existing_redirect = self._redirects.get(src)
+        if existing_redirect == target:
+            context.log('  Already pinned')
+            if context.progress is not None:
+                context.progress.update()
+            return context
+        elif not existing_redirect:
+            context.log('  Creating S3 Key redirect')
         else:
-            existing_redirect = src_key.get_redirect()
-            log.warn('  Updating S3 Key redirect that pointed to {}'.format(
-                existing_redirect))
+            context.log('  Updating S3 Key redirect {} that pointed to {}'
+                        .format(src, existing_redirect), warn=True)
 
         if not context.dry_run:
-            if not src_key:
-                src_key = Key(context.bucket)
-                src_key.key = src
-            src_key.set_redirect('/' + dst.lstrip('/'), headers={
-                'Cache-Control': 'max-age=0, no-cache, no-store'
-            })
+            if context.limits:
+                context.limits.acquire()
+            self._writes.append(context.backend.submit(
+                'set_redirect', src, target, REDIRECT_HEADERS))
+        elif context.progress is not None:
+            context.progress.update()
+        self._changed += 1
+        return context
+
+    def _read_redirects(self, context):
+        srcs = [context.relative(key) for key in self.tree]
+        futures = [context.backend.submit('get_redirect', src)
+                   for src in srcs]
+        return dict(zip(srcs, [future.result() for future in futures]))
+
+    def _wait(self, context):
+        """
+        Wait for every redirect write, re-raising the first error once all of
+        them have finished.
+        """
+        error = None
+        for future in self._writes:
+            try:
+                future.result()
+            except Exception as e:
+                error = error or e
+            if context.progress is not None:
+                context.progress.update()
+        if error is not None:
+            raise error
 
+    def _fold(self, context, tree=None):
+        self._redirects = self._read_redirects(context)
+        self._writes = []
+        self._changed = 0
+        context = super(Pin, self)._fold(context, tree)
+        self._wait(context)
         return context
 
     def run(self, context):
+        context = match_pinning_rules(self.tree, context)
+        if context.progress is not None:
+            context.progress.add(len(self.tree))
         context = super(Pin, self).run(context)
-        if not context.dry_run:
-            reconfigure_website(context.bucket, context.rules)
-        return context
+        if not self._changed and not context.website.dirty:
+            log.info('  Already pinned; nothing to update')
+        return context.commit_website()
 
 
 class Unpin(Ops):
     def _op(self, key, value, context):
         src = context.relative(key)
         dst = context.relative(value)
-        log.log('{} -> {}'.format(src, dst))
+        context.log('{} -> {}'.format(src, dst))
 
         found = False
 
         # Delete any RoutingRules.
-        for rule in list(context.rules):
-            key_prefix = rule.condition.key_prefix
-            if not src.startswith(key_prefix):
-                continue
-
-            replace_key_prefix = rule.redirect.replace_key_prefix
-
-            try:
-                major_minor = parse_major_minor(
-                    os.path.split(key_prefix.rstrip('/'))[1])
-            except:
-                continue
-
-            if (major_minor != parse_major_minor(
-                    '{major}.{minor}'.format(**context.variables))):
-                continue
-
+        for entry in remove_pinning_rules(src, context):
             found = True
-            context.rules.remove(rule)
-            log.warn('  Deleting RoutingRule that pointed to {}'.format(
-                replace_key_prefix))
+            context.log('  Deleting RoutingRule that pointed to {}'.format(
+                entry.replace_key_prefix), warn=True)
 
         # Delete any S3 Key redirects.
-        src_key = context.bucket.get_key(src)
-        if src_key:
+        if context.limits:
+            context.limits.acquire()
+        if context.backend.head(src):
             found = True
             if not context.dry_run:
-                context.bucket.delete_key(src)
+                if context.limits:
+                    context.limits.acquire()
+                context.backend.delete(src)
 
         if not found:
-            log.warn('  Redirect {} does not exist'.format(src))
+            context.log('  Redirect {} does not exist'.format(src), warn=True)
 
         return context
 
     def run(self, context):
+        context = match_pinning_rules(self.tree, context)
         context = super(Unpin, self).run(context)
-        if not context.dry_run:
-            reconfigure_website(context.bucket, context.rules)
-        return context
+        return context.commit_website()
 
 
-class Upload(Ops):
-    def _op_dir(self, key, value, context):
-        srcdir = context.absolute(key)
+class Migrate(Transfers):
+    """
+    Replace legacy RoutingRules with S3 Key redirects. The tree maps each
+    RoutingRule's key prefix to its replacement key prefix; every Key under the
+    replacement prefix gets an equivalent redirect under the rule's prefix,
+    and only then is the RoutingRule removed. A rule for a prefix without a
+    trailing "/" becomes a single Key redirect, as Pin writes for such keys.
+    """
+    def _op(self, key, value, context):
+        log.log('- RoutingRule {} -> {}'.format(key, value))
+
+        if not self._stream(key, value, context):
+            log.warn('  No Keys under {}; keeping RoutingRule'.format(value))
+            return context
 
-        for path, _, srcs in os.walk(srcdir):
-            for src in srcs:
-                sub_path = path[len(context.absolute(key)):]
-                sub_key = os.path.join(key, sub_path, src)
-                sub_value = os.path.join(value, sub_path, src)
-                context = self._op_file(sub_key, sub_value, context)
+        # Only remove the RoutingRule once all of its redirects exist.
+        for entry in context.website.index.match(key):
+            if entry.key_prefix == key:
+                context.website.remove_rule(entry.rule)
 
         return context
 
-    def _op_file(self, key, value, context):
-        src = context.absolute(key)
-        dst = context.relative(value)
-        log.log('{} -> {}'.format(src, dst))
+    def _enumerate(self, key, value, context):
+        if not key.endswith('/'):
+            yield Transfer(key, '/' + value.lstrip('/'))
+            return
+        for obj in list_sharded(context.backend, value):
+            # Only artifacts get redirects, not the release's manifest and
+            # bundle.
+            if describes_release(obj.name):
+                continue
+            yield Transfer(key + obj.name[len(value):],
+                           '/' + obj.name.lstrip('/'), obj)
 
-        dst_key = context.bucket.get_key(dst)
-        if dst_key:
-            log.warn('  Updating Key')
+    def _filter(self, transfers, key, value, context):
+        if key.endswith('/'):
+            existing = set(obj.name for obj in list_sharded(context.backend,
+                                                                key))
+        else:
+            existing = set([key] if context.backend.head(key) else [])
+        for transfer in transfers:
+            context.log('{} {} -> {}'.format(
+                '~' if transfer.src in existing else '+', transfer.src,
+                transfer.dst))
+            yield transfer
 
-        if not context.dry_run:
-            if not dst_key:
-                dst_key = Key(context.bucket)
-                dst_key.key = dst
-            dst_key.set_contents_from_filename(src, headers={
-                'Cache-Control': 'max-age=315360000',
-                'Expires': 'Thu, 31 Dec 2037 23:55:55 GMT'
-            })
+    def _size(self, transfer):
+        # A redirect is an empty object, whatever the size of its target.
+        return 0
 
-        return context
+    def _submit(self, transfer, context):
+        return context.backend.submit('set_redirect', transfer.src,
+                                      transfer.dst, REDIRECT_HEADERS)
+
+    def run(self, context):
+        context = super(Migrate, self).run(context)
+        return context.commit_website()
+
+
+def describes_release(name):
+    """
+    Check whether a Key is a release's manifest or bundle rather than one of
+    its artifacts.
+    """
+    return os.path.basename(name) in (MANIFEST_NAME,) + BUNDLE_FILES
+
+
+def walk(key, value, context):
+    """
+    Yield a Transfer from each local file under the key of a tree to the S3
+    key it is uploaded to.
+    """
+    src = context.absolute(key)
+    dst = context.relative(value)
+    if not key.endswith('/'):
+        yield Transfer(src, dst)
+        return
+    for path, _, names in os.walk(src):
+        sub_path = path[len(src):]
+        for name in names:
+            yield Transfer(os.path.join(path, name),
+                           os.path.join(dst, sub_path, name))
+
+
+class Upload(Transfers):
+    def _enumerate(self, key, value, context):
+        return walk(key, value, context)
+
+    def _filter(self, transfers, key, value, context):
+        # One listing of the destination tells us which Keys already exist;
+        # for a single file, it lists just that Key.
+        existing = set(obj.name for obj in
+                       context.list(context.relative(value)))
+        for transfer in transfers:
+            self._bundle(transfer, context)
+            context.log('{} -> {}'.format(transfer.src, transfer.dst))
+            if transfer.dst in existing:
+                context.log('  Updating Key {}'.format(transfer.dst),
+                            warn=True)
+            transfer.headers = self._headers(transfer, context)
+            yield transfer
+
+    def _bundle(self, transfer, context):
+        # Bundle the file as it is on disk, while it is about to be read for
+        # the upload anyway.
+        if context.bundle is not None:
+            context.bundle.add(transfer.src, transfer.dst)
+
+    def _headers(self, transfer, context):
+        headers = dict(UPLOAD_HEADERS)
+        headers['Content-Type'] = content_type(transfer.src)
+        if context.header_rules:
+            headers.update(context.header_rules.match(transfer.dst))
+        return headers
+
+    def _stages(self, key, value, context):
+        stages = super(Upload, self)._stages(key, value, context)
+        if context.compression and not context.dry_run:
+            stages.insert(1, lambda transfers: self._compress(transfers,
+                                                              context))
+        return stages
+
+    def _compress(self, transfers, context):
+        # Keep a window of files compressing on the process pool, and yield
+        # them in order as they finish.
+        compression = context.compression
+        pending = deque()
+        for transfer in transfers:
+            future = None
+            # Leave alone files whose encoding the schema already declares.
+            if (compression.matches(transfer.src) and
+                    'Content-Encoding' not in transfer.headers):
+                future = compression.submit(transfer.src)
+            pending.append((transfer, future))
+            if len(pending) > compression.workers * 2:
+                yield self._compressed(*pending.popleft(), context=context)
+        while pending:
+            yield self._compressed(*pending.popleft(), context=context)
+
+    def _compressed(self, transfer, future, context):
+        if future is None:
+            return transfer
+        compressed = future.result()
+        # Only store the compressed file if it is actually smaller.
+        if os.path.getsize(compressed) < os.path.getsize(transfer.src):
+            transfer.headers = dict(transfer.headers)
+            transfer.headers['Content-Encoding'] = context.compression.encoding
+            transfer.src = compressed
+        return transfer
+
+    def _size(self, transfer):
+        return os.path.getsize(transfer.src)
+
+    def _submit(self, transfer, context):
+        return context.backend.submit('put_file', transfer.dst, transfer.src,
+                                      transfer.headers or UPLOAD_HEADERS)
+
+    def _done(self, transfer, context, result=None):
+        if context.manifest is None:
+            return
+        # The Backend hashed the file as it sent it; only hash it again if
+        # it did not say what it sent.
+        if result is not None and result.etag:
+            etag = result.etag
+        else:
+            # A compressed copy is gone after this upload; don't cache it.
+            compressed = (context.compression and
+                          context.compression.owns(transfer.src))
+            etag = md5(transfer.src, None if compressed else context.hashes)
+        context.manifest.add(Object(
+            transfer.dst, os.path.getsize(transfer.src), etag,
+            transfer.headers.get('Content-Type')))
+
+    def run(self, context):
+        if context.compression and not context.dry_run:
+            with context.compression.session():
+                return super(Upload, self).run(context)
+        return super(Upload, self).run(context)
+
+
+class Sync(Upload):
+    """
+    Upload only the local files whose objects are missing or differ, by size
+    and ETag, from a single listing of the destination; hashing runs on a
+    pool of threads. With delete, also delete the objects under a directory
+    that no local file maps to, in batches.
+    """
+    def __init__(self, tree, delete=False):
+        super(Sync, self).__init__(tree)
+        self.delete = delete
+
+    def _stream(self, key, value, context):
+        self._orphans = []
+        count = super(Sync, self)._stream(key, value, context)
+        self._prune(key, self._orphans, context)
+        return count
+
+    def _filter(self, transfers, key, value, context):
+        remote = dict((obj.name, obj) for obj in
+                      context.list(context.relative(value)))
+        # Keep a window of files hashing, and yield the changed ones in order.
+        pending = deque()
+        for transfer in transfers:
+            # The bundle has every artifact, changed or not.
+            self._bundle(transfer, context)
+            transfer.obj = remote.pop(transfer.dst, None)
+            future = None
+            if transfer.obj is not None:
+                future = self._pool.submit(matches, transfer.src,
+                                           transfer.obj, context.compression,
+                                           context.hashes)
+            pending.append((transfer, future))
+            while len(pending) > DEFAULT_WORKERS * 2:
+                changed = self._changed(*pending.popleft(), context=context)
+                if changed:
+                    yield changed
+        while pending:
+            changed = self._changed(*pending.popleft(), context=context)
+            if changed:
+                yield changed
+        # A single file's listing also includes Keys it is a prefix of.
+        if key.endswith('/'):
+            self._orphans.extend(name for name in sorted(remote)
+                                 if not describes_release(name))
+
+    def _changed(self, transfer, future, context):
+        if future is not None and future.result():
+            context.log('  Unchanged {}'.format(transfer.dst))
+            self._event(transfer, context, unchanged=True)
+            if context.progress is not None:
+                context.progress.update(1, transfer.size)
+            return None
+        context.log('{} -> {}'.format(transfer.src, transfer.dst))
+        if transfer.obj is not None:
+            context.log('  Updating Key {}'.format(transfer.dst), warn=True)
+        transfer.headers = self._headers(transfer, context)
+        return transfer
+
+    def _prune(self, key, orphans, context):
+        if not orphans:
+            return
+        if not self.delete:
+            context.log('  {} Keys under {} have no local file; pass --delete '
+                        'to delete them'.format(len(orphans),
+                                                context.relative(
+                                                    self.tree[key])),
+                        warn=True)
+            return
+        for name in orphans:
+            context.log('  Deleting Key {}'.format(name), warn=True)
+        if context.dry_run:
+            return
+        if context.progress is not None:
+            context.progress.add(len(orphans))
+        batches = []
+        for i in range(0, len(orphans), DELETE_BATCH_SIZE):
+            batch = orphans[i:i + DELETE_BATCH_SIZE]
+            if context.limits:
+                context.limits.acquire()
+            batches.append((batch, context.backend.submit('delete_many',
+                                                          batch)))
+        for batch, future in batches:
+            future.result()
+            for name in batch:
+                if context.manifest is not None:
+                    context.manifest.remove(name)
+                log.event('object', op='sync', src=name, dst=None,
+                          deleted=True, dry_run=context.dry_run)
+            if context.progress is not None:
+                context.progress.update(len(batch))
+
+    def run(self, context):
+        from concurrent.futures import ThreadPoolExecutor
+        # hashlib releases the GIL, so threads hash in parallel.
+        with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as self._pool:
+            return super(Sync, self).run(context)
+
+
+class Verify(Transfers):
+    """
+    Compare uploaded objects with the local files they were uploaded from, by
+    size and ETag, hashing the files on a pool of threads. Missing, extra and
+    mismatched keys are logged and recorded in the Context's Report.
+    """
+    def _enumerate(self, key, value, context):
+        return walk(key, value, context)
+
+    def _filter(self, transfers, key, value, context):
+        # The release's Manifest, or else one listing of the destination, has
+        # the size and ETag of every Key.
+        dst = context.relative(value)
+        remote = dict((obj.name, obj) for obj in context.list(dst))
+        for transfer in transfers:
+            transfer.obj = remote.pop(transfer.dst, None)
+            if transfer.obj is None:
+                log.warn('  Missing {}'.format(transfer.dst))
+                context.report.missing.append(transfer.dst)
+                continue
+            yield transfer
+        # A single file's listing also includes Keys it is a prefix of.
+        if key.endswith('/'):
+            for name in sorted(remote):
+                if describes_release(name):
+                    continue
+                log.warn('  Extra {}'.format(name))
+                context.report.extra.append(name)
+
+    def _transfer(self, transfers, context):
+        # Verifying is read-only, so it runs even on a dry run.
+        for transfer in transfers:
+            yield transfer, self._pool.submit(matches, transfer.src,
+                                              transfer.obj,
+                                              context.compression,
+                                              context.hashes)
+
+    def _verify(self, results, context):
+        for transfer, future in results:
+            if future.result():
+                context.report.verified.append(transfer.dst)
+            else:
+                log.warn('  Mismatched {}'.format(transfer.dst))
+                context.report.mismatched.append(transfer.dst)
+            yield transfer
+
+    def run(self, context):
+        from concurrent.futures import ThreadPoolExecutor
+        if context.report is None:
+            context.report = Report()
+        # hashlib releases the GIL, so threads hash in parallel.
+        with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as self._pool:
+            return super(Verify, self).run(context)
 
 
 def delete(tree, **kwargs):
@@ -283,13 +911,25 @@ def download(tree, **kwargs):
     return Download(tree).run(Context(**kwargs))
 
 
+def migrate(tree, **kwargs):
+    return Migrate(tree).run(Context(**kwargs))
+
+
 def pin(tree, **kwargs):
     return Pin(tree).run(Context(**kwargs))
 
 
+def sync(tree, delete=False, **kwargs):
+    return Sync(tree, delete).run(Context(**kwargs))
+
+
 def unpin(tree, **kwargs):
     return Unpin(tree).run(Context(**kwargs))
 
 
 def upload(tree, **kwargs):
     return Upload(tree).run(Context(**kwargs))
+
+
+def verify(tree, **kwargs):
+    return Verify(tree).run(Context(**kwargs))
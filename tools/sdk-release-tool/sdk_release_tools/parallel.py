@@ -0,0 +1,29 @@
+from sdk_release_tools import log
+
+__all__ = ['DEFAULT_WORKERS', 'concurrently']
+
+# S3 requests spend nearly all of their time waiting on the network, so we can
+# afford many more threads than cores.
+DEFAULT_WORKERS = 16
+
+
+def concurrently(function, items, workers=DEFAULT_WORKERS):
+    """
+    Apply a function to each item on a pool of threads and return the results
+    in the order of the items. The first exception raised, if any, is
+    re-raised once every item has been attempted.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    from concurrent.futures import ThreadPoolExecutor
+    stream = log.output()
+
+    def call(item):
+        # Workers log wherever the calling thread does.
+        with log.redirect(stream):
+            return function(item)
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        futures = [executor.submit(call, item) for item in items]
+    return [future.result() for future in futures]
@@ -0,0 +1,20 @@
+"""
+Where the tool keeps its local state: the server's socket and the hash cache
+live in a tmp directory in the checkout, readable by its owner only.
+"""
+import os
+
+__all__ = ['ROOT', 'TMP', 'private_dir']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+TMP = os.path.join(ROOT, 'tmp')
+
+
+def private_dir(path):
+    """
+    Create a directory, and any missing parents, accessible by the current
+    user only. An existing directory is left as it is.
+    """
+    if path and not os.path.isdir(path):
+        os.makedirs(path, 0o700)
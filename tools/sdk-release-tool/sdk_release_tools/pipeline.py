@@ -0,0 +1,95 @@
+from sdk_release_tools import log
+
+import queue
+import threading
+
+__all__ = ['DEFAULT_QUEUE_SIZE', 'pipeline']
+
+# How many items may wait between two stages. This bounds memory regardless
+# of how many objects a tree holds.
+DEFAULT_QUEUE_SIZE = 1000
+
+DONE = object()
+
+
+class Failure(object):
+    def __init__(self, error):
+        self.error = error
+
+
+class Stopped(Exception):
+    """
+    Raised into a stage whose consumer has gone away, so that it stops
+    rather than taking the end of its input for the end of the stream.
+    """
+
+
+def put(output, item, stop):
+    while not stop.is_set():
+        try:
+            output.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def drain(source, stop):
+    while True:
+        try:
+            item = source.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                raise Stopped()
+            continue
+        if item is DONE:
+            return
+        if isinstance(item, Failure):
+            raise item.error
+        yield item
+
+
+def pump(iterable, output, stop, stream):
+    with log.redirect(stream):
+        try:
+            for item in iterable:
+                if not put(output, item, stop):
+                    return
+        except BaseException as e:
+            # Whatever stopped the stage, e.g. SystemExit, the consumer must
+            # hear of it rather than wait for more.
+            put(output, Failure(e), stop)
+            return
+    put(output, DONE, stop)
+
+
+def pipeline(items, stages, maxsize=DEFAULT_QUEUE_SIZE):
+    """
+    Stream items through stages, each a function from an iterable to an
+    iterable (typically a generator). Iterating the items and every stage but
+    the last runs in its own thread, connected to the next by a bounded queue,
+    so that e.g. listing the next page of objects overlaps with transferring
+    the current one. Returns an iterator over the last stage's output; an
+    exception raised by any stage is re-raised from it. Once the iterator is
+    closed, or raises, every stage's thread stops.
+    """
+    stop = threading.Event()
+    stream = log.output()
+    iterable = items
+    for i, stage in enumerate([None] + list(stages[:-1])):
+        if stage:
+            iterable = stage(drain(source, stop))
+        source = queue.Queue(maxsize)
+        thread = threading.Thread(target=pump,
+                                  args=(iterable, source, stop, stream),
+                                  name='pipeline-{}'.format(i))
+        thread.daemon = True
+        thread.start()
+
+    def run():
+        try:
+            for item in stages[-1](drain(source, stop)):
+                yield item
+        finally:
+            stop.set()
+    return run()
@@ -0,0 +1,165 @@
+"""
+Fetching a release through the CDN right after it is pinned, so that the
+first customers after an announcement do not all miss the edge caches at once.
+Every pinned key is fetched without following its redirect, and every object
+of the release by its own URL, concurrently and within a request rate.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from sdk_release_tools import log
+from sdk_release_tools.parallel import DEFAULT_WORKERS
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import HTTPRedirectHandler, build_opener
+
+import os
+import time
+
+__all__ = ['CHUNK_SIZE', 'Fetch', 'REQUEST_RATE', 'Report', 'TIMEOUT', 'fetch',
+           'fetch_all', 'get_base_url', 'percentile', 'urls']
+
+# Requests per second made to the CDN, unless told otherwise.
+REQUEST_RATE = 50
+
+# Seconds to wait for a response before giving up on a URL.
+TIMEOUT = 30
+
+# Bytes of each response read at a time, and thrown away.
+CHUNK_SIZE = 64 * 1024
+
+
+def get_base_url(environment):
+    """
+    Get the URL the given realm's bucket is served from: $CDN_{REALM}_BASE_URL,
+    or the host the bucket is named after, e.g. https://media.twiliocdn.com.
+    """
+    from sdk_release_tools.aws import get_bucket_name
+    return (os.getenv('CDN_' + environment.upper() + '_BASE_URL') or
+            'https://' + get_bucket_name(environment))
+
+
+def urls(base_url, names):
+    """
+    Get the public URLs of keys.
+    """
+    base_url = base_url.rstrip('/')
+    return [base_url + '/' + quote(name.lstrip('/')) for name in names]
+
+
+class Fetch(object):
+    """
+    The outcome of fetching a URL: its HTTP status, or the error that kept it
+    from having one, and the seconds until the whole response was read.
+    """
+    __slots__ = ['url', 'status', 'seconds', 'error']
+
+    def __init__(self, url, status=None, seconds=None, error=None):
+        self.url = url
+        self.status = status
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self):
+        # A redirect is what a pinned key is supposed to return.
+        return (self.error is None and self.status is not None and
+                self.status < 400)
+
+
+class NoRedirects(HTTPRedirectHandler):
+    """
+    Return redirects instead of following them, so that the redirect itself
+    is what gets cached.
+    """
+    def redirect_request(self, *args):
+        return None
+
+
+def fetch(url, opener, timeout=TIMEOUT):
+    start = time.monotonic()
+    try:
+        response = opener.open(url, timeout=timeout)
+    except HTTPError as e:
+        response = e
+    except Exception as e:
+        return Fetch(url, error=str(e) or type(e).__name__,
+                     seconds=time.monotonic() - start)
+    try:
+        while response.read(CHUNK_SIZE):
+            pass
+    except Exception as e:
+        return Fetch(url, response.code, time.monotonic() - start, str(e))
+    finally:
+        response.close()
+    return Fetch(url, response.code, time.monotonic() - start)
+
+
+def percentile(values, p):
+    """
+    Get the pth percentile of sorted values, by the nearest rank.
+    """
+    if not values:
+        return None
+    rank = max(int(-(-p * len(values) // 100)), 1)
+    return values[rank - 1]
+
+
+class Report(object):
+    def __init__(self, fetches):
+        self.fetches = fetches
+        self.failed = [fetch for fetch in fetches if not fetch.ok]
+        self.statuses = {}
+        for fetch in fetches:
+            status = fetch.status or 'error'
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latencies = sorted(fetch.seconds for fetch in fetches
+                                if fetch.seconds is not None)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def percentiles(self):
+        return dict(('p{}'.format(p), percentile(self.latencies, p))
+                    for p in [50, 90, 99])
+
+    def summary(self):
+        statuses = ', '.join('{} {}'.format(count, status) for status, count
+                             in sorted(self.statuses.items(), key=str))
+        latencies = ', '.join(
+            '{} {:.0f} ms'.format(name, seconds * 1000) for name, seconds
+            in sorted(self.percentiles().items()) if seconds is not None)
+        return '{} fetched ({}){}'.format(
+            len(self.fetches), statuses or 'none',
+            '; ' + latencies if latencies else '')
+
+
+def fetch_all(urls, limits=None, workers=DEFAULT_WORKERS, timeout=TIMEOUT,
+              progress=None):
+    """
+    Fetch URLs concurrently, waiting on the RateLimits before each request,
+    and return a Report.
+    """
+    opener = build_opener(NoRedirects())
+    if progress is not None:
+        progress.add(len(urls))
+    stream = log.output()
+
+    def call(url):
+        if limits:
+            limits.acquire()
+        result = fetch(url, opener, timeout)
+        # Workers log wherever the calling thread does.
+        with log.redirect(stream):
+            if not result.ok:
+                message = '  {} {}'.format(result.status or result.error, url)
+                if progress is not None:
+                    progress.log(message, warn=True)
+                else:
+                    log.warn(message)
+            if progress is not None:
+                progress.update()
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        fetches = list(executor.map(call, urls))
+    return Report(fetches)
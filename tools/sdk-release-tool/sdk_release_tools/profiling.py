@@ -0,0 +1,165 @@
+"""
+Profile an action: a cProfile dump of the main thread, a collapsed-stack file
+of all threads for flamegraph.pl or speedscope, and a wall-clock breakdown of
+where threads spend their time: blocked on S3 I/O, waiting on other threads,
+throttled by rate limits, idle, or running Python.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from sdk_release_tools import log
+
+import os
+import sys
+import threading
+import time
+
+__all__ = ['InFlight', 'Sampler', 'classify', 'in_flight', 'profiled']
+
+# How often the Sampler records every thread's stack, in seconds.
+DEFAULT_INTERVAL = 0.005
+
+# Where a thread's innermost Python frame is, by path fragment, when it is
+# blocked rather than running.
+CATEGORIES = [
+    ('throttled', ['sdk_release_tools/ratelimit.py']),
+    ('s3 i/o', ['/socket.py', '/ssl.py', '/http/client.py', '/asyncio/',
+                '/boto/', 'sdk_release_tools/asyncs3.py']),
+    ('waiting', ['/threading.py', '/queue.py', '/concurrent/futures/']),
+]
+
+# Where an event loop waits for any of its sockets; that is S3 I/O only while
+# a request is in flight, and idling otherwise.
+SELECT = '/selectors.py'
+
+
+class InFlight(object):
+    """
+    A count of the requests in flight, entered by a backend around each one.
+    """
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.count += 1
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.count -= 1
+
+    def __bool__(self):
+        return self.count > 0
+
+
+in_flight = InFlight()
+
+
+def classify(frame):
+    filename = frame.f_code.co_filename.replace(os.sep, '/')
+    if SELECT in filename:
+        return 's3 i/o' if in_flight else 'idle'
+    for category, fragments in CATEGORIES:
+        if any(fragment in filename for fragment in fragments):
+            return category
+    return 'cpu'
+
+
+def label(frame):
+    # Collapsed stacks separate frames with ";" and counts with " ".
+    return '{} ({}:{})'.format(
+        frame.f_code.co_name, os.path.basename(frame.f_code.co_filename),
+        frame.f_code.co_firstlineno).replace(';', ':').replace(' ', '_')
+
+
+class Sampler(object):
+    """
+    Periodically record the stack of every thread, counting collapsed stacks
+    and the seconds each thread spends in each category.
+    """
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.seconds = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='sdk-release-tool-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def sample(self, elapsed):
+        names = dict((thread.ident, thread.name)
+                     for thread in threading.enumerate())
+        for ident, frame in sys._current_frames().items():
+            if ident == threading.get_ident():
+                continue
+            self.seconds[classify(frame)] += elapsed
+            stack = []
+            while frame is not None:
+                stack.append(label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)).replace(' ', '_'))
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            self.sample(now - last)
+            last = now
+
+    def collapsed(self):
+        return ''.join('{} {}\n'.format(stack, count)
+                       for stack, count in sorted(self.stacks.items()))
+
+
+def breakdown(wall, cpu, seconds):
+    lines = ['wall clock      {:8.3f}s'.format(wall),
+             'process cpu     {:8.3f}s'.format(cpu),
+             'thread time by category:']
+    total = sum(seconds.values()) or 1
+    for category, value in seconds.most_common():
+        lines.append('  {:<14}{:8.3f}s {:5.1f}%'.format(
+            category, value, 100.0 * value / total))
+    return lines
+
+
+@contextmanager
+def profiled(prefix):
+    """
+    Profile the body, writing prefix.prof, prefix.collapsed and prefix.txt.
+    """
+    import cProfile
+    sampler = Sampler().start()
+    profile = cProfile.Profile()
+    start = time.monotonic()
+    cpu = sum(os.times()[:2])
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        wall = time.monotonic() - start
+        cpu = sum(os.times()[:2]) - cpu
+        sampler.stop()
+        profile.dump_stats(prefix + '.prof')
+        with open(prefix + '.collapsed', 'w') as f:
+            f.write(sampler.collapsed())
+        lines = breakdown(wall, cpu, sampler.seconds)
+        with open(prefix + '.txt', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        for line in lines:
+            log.info(line)
+        log.info('Wrote {0}.prof, {0}.collapsed and {0}.txt'.format(prefix))
+        log.event('profile', prefix=prefix, wall=round(wall, 3),
+                  cpu=round(cpu, 3),
+                  seconds=dict((category, round(value, 3)) for
+                               category, value in sampler.seconds.items()))
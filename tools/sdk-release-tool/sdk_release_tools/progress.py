@@ -0,0 +1,176 @@
+from sdk_release_tools import log
+import shutil
+import threading
+import time
+
+__all__ = ['Progress', 'format_size']
+
+# How often to redraw the single-line display on a terminal, and how often to
+# print a summary line otherwise, in seconds.
+TTY_INTERVAL = 0.1
+PLAIN_INTERVAL = 10.0
+
+# Throughput is smoothed over roughly this many seconds.
+RATE_WINDOW = 5.0
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024 or unit == 'GB':
+            return ('{:.0f} {}' if unit == 'B' else '{:.1f} {}').format(
+                size, unit)
+        size /= 1024.0
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return '{}h{:02}m'.format(seconds // 3600, seconds % 3600 // 60)
+    if seconds >= 60:
+        return '{}m{:02}s'.format(seconds // 60, seconds % 60)
+    return '{}s'.format(seconds)
+
+
+class Progress(object):
+    """
+    Report how many files and bytes an op has done out of how many, with the
+    current throughput and an ETA. On a terminal this is a single line,
+    redrawn at most every TTY_INTERVAL; otherwise, e.g. in CI, it is a plain
+    summary line every PLAIN_INTERVAL. Per-file messages are only shown when
+    verbose, and warnings always. Totals grow as objects are enumerated, so
+    they are marked with "+" until enumeration is finished.
+    """
+    def __init__(self, stream=None, verbose=False, tty=None):
+        self.stream = stream or log.output()
+        self.verbose = verbose
+        if tty is None:
+            tty = getattr(self.stream, 'isatty', lambda: False)()
+        self.tty = tty
+        # With JSON output, summaries are progress events instead.
+        self.json = isinstance(self.stream, log.JsonLines)
+        self.files = self.files_done = 0
+        self.size = self.size_done = 0
+        self.enumerating = 0
+        self.rate = None
+        self.start = self.last_sample = time.monotonic()
+        # Draw the first change right away, but only summarize once there has
+        # been some progress to summarize.
+        self.last_report = float('-inf') if tty else self.start
+        self.last_size = 0
+        self.drawn = False
+        self._lock = threading.RLock()
+
+    def add(self, files=1, size=0):
+        """
+        Count files and bytes to be done.
+        """
+        with self._lock:
+            self.files += files
+            self.size += size or 0
+            self._report()
+
+    def update(self, files=1, size=0):
+        """
+        Count files and bytes done.
+        """
+        with self._lock:
+            self.files_done += files
+            self.size_done += size or 0
+            self._report()
+
+    def track(self, items):
+        """
+        Count each item of an iterable, e.g. a stream of Transfers, as it is
+        enumerated; items have a size attribute.
+        """
+        with self._lock:
+            self.enumerating += 1
+        try:
+            for item in items:
+                self.add(1, getattr(item, 'size', 0))
+                yield item
+        finally:
+            with self._lock:
+                self.enumerating -= 1
+                self._report()
+
+    def log(self, message, warn=False):
+        if not (warn or self.verbose):
+            return
+        with self._lock:
+            self._clear()
+            with log.redirect(self.stream):
+                (log.warn if warn else log.log)(message)
+            self._report(force=True)
+
+    def close(self):
+        with self._lock:
+            self._clear()
+            if self.json:
+                self.stream.emit(self._event('summary'))
+                return
+            self.stream.write(self._line(final=True) + '\n')
+            self.stream.flush()
+
+    def _sample(self, now):
+        elapsed = now - self.last_sample
+        if elapsed <= 0:
+            return
+        rate = (self.size_done - self.last_size) / elapsed
+        weight = min(1.0, elapsed / RATE_WINDOW)
+        self.rate = rate if self.rate is None else (
+            self.rate + (rate - self.rate) * weight)
+        self.last_sample = now
+        self.last_size = self.size_done
+
+    def _line(self, final=False):
+        more = '' if final or not self.enumerating else '+'
+        line = '{}/{}{} files, {}/{}{}'.format(
+            self.files_done, self.files, more, format_size(self.size_done),
+            format_size(self.size), more)
+        if final:
+            elapsed = time.monotonic() - self.start
+            return line + ' in {}'.format(format_duration(elapsed))
+        if self.rate:
+            line += ', {}/s'.format(format_size(self.rate))
+            if not self.enumerating and self.size > self.size_done:
+                line += ', ETA {}'.format(format_duration(
+                    (self.size - self.size_done) / self.rate))
+        return line
+
+    def _event(self, name):
+        return {
+            'event': name,
+            'files_done': self.files_done,
+            'files': self.files,
+            'bytes_done': self.size_done,
+            'bytes': self.size,
+            'enumerating': bool(self.enumerating),
+            'bytes_per_second': self.rate,
+            'seconds': round(time.monotonic() - self.start, 3)
+        }
+
+    def _report(self, force=False):
+        now = time.monotonic()
+        interval = TTY_INTERVAL if self.tty else PLAIN_INTERVAL
+        if not force and now - self.last_report < interval:
+            return
+        self._sample(now)
+        self.last_report = now
+        if self.tty:
+            width = shutil.get_terminal_size().columns - 1
+            self.stream.write('\r' + self._line()[:width].ljust(width))
+            self.drawn = True
+        elif self.json:
+            if not force:
+                self.stream.emit(self._event('progress'))
+            return
+        elif not force:
+            self.stream.write(self._line() + '\n')
+        self.stream.flush()
+
+    def _clear(self):
+        if self.drawn:
+            width = shutil.get_terminal_size().columns - 1
+            self.stream.write('\r' + ' ' * width + '\r')
+            self.drawn = False
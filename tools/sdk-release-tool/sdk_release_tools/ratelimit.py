@@ -0,0 +1,91 @@
+from sdk_release_tools import cache
+import os
+import re
+import threading
+import time
+
+__all__ = ['RateLimits', 'TokenBucket', 'get_limits', 'parse_rate']
+
+SUFFIXES = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(value):
+    """
+    Parse a rate such as "500", "512K" or "10M" (per second).
+    """
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)\s*$', str(value),
+                     re.IGNORECASE)
+    if not match:
+        raise ValueError('Invalid rate {}'.format(value))
+    return float(match.group(1)) * SUFFIXES[match.group(2).upper()]
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket refilled at rate tokens per second, holding up
+    to burst. Acquiring more tokens than are available puts the bucket in
+    debt, and the caller sleeps until the debt is repaid; concurrent callers
+    queue up behind each other, so the long-run rate never exceeds the limit,
+    even for acquisitions larger than the burst.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens, sleeping as long as necessary; return how long we slept.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= tokens
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class RateLimits(object):
+    """
+    Limits on the bytes and requests per second that transfers make. Every
+    worker of every op using the same RateLimits shares them.
+    """
+    def __init__(self, bandwidth=None, request_rate=None):
+        self.bandwidth = TokenBucket(bandwidth) if bandwidth else None
+        self.request_rate = TokenBucket(request_rate) if request_rate else None
+
+    def __bool__(self):
+        return bool(self.bandwidth or self.request_rate)
+
+    __nonzero__ = __bool__
+
+    def acquire(self, size=0):
+        """
+        Wait until one request transferring size bytes is allowed.
+        """
+        if self.request_rate:
+            self.request_rate.acquire()
+        if self.bandwidth and size:
+            self.bandwidth.acquire(size)
+
+
+def get_limits(environment, bandwidth=None, request_rate=None):
+    """
+    Get the RateLimits for the given realm. Limits not passed explicitly come
+    from AWS_{REALM}_MAX_BANDWIDTH (bytes per second, e.g. "10M") and
+    AWS_{REALM}_MAX_REQUEST_RATE (requests per second), if set. A server
+    shares the same RateLimits among all requests with the same limits.
+    """
+    prefix = 'AWS_' + environment.upper()
+    if bandwidth is None and os.getenv(prefix + '_MAX_BANDWIDTH'):
+        bandwidth = parse_rate(os.getenv(prefix + '_MAX_BANDWIDTH'))
+    if request_rate is None and os.getenv(prefix + '_MAX_REQUEST_RATE'):
+        request_rate = parse_rate(os.getenv(prefix + '_MAX_REQUEST_RATE'))
+    return cache.limits.get((environment, bandwidth, request_rate),
+                            lambda: RateLimits(bandwidth, request_rate))
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+from sdk_release_tools.versions import parse_major_minor, parse_version
+
+import os
+
+__all__ = ['IndexedRule', 'RoutingRuleIndex']
+
+
+def last_path_component(prefix):
+    return os.path.split(prefix.rstrip('/'))[1]
+
+
+def try_parse(parse, string):
+    try:
+        return parse(string)
+    except Exception:
+        return None
+
+
+class IndexedRule(object):
+    """
+    A RoutingRule together with its key prefix, and the major/minor pair and
+    version number parsed out of its prefixes (or None, if unparseable).
+    """
+    def __init__(self, rule):
+        self.rule = rule
+        self.key_prefix = rule.condition.key_prefix
+        self.replace_key_prefix = (rule.redirect.replace_key_prefix
+                                   if rule.redirect else None)
+        self.major_minor = try_parse(parse_major_minor,
+                                     last_path_component(self.key_prefix))
+        self.version = (try_parse(parse_version,
+                                  last_path_component(self.replace_key_prefix))
+                        if self.replace_key_prefix else None)
+
+
+class Node(object):
+    __slots__ = ['children', 'entries']
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []
+
+
+class RoutingRuleIndex(object):
+    """
+    A character trie over the key prefixes of a bucket's RoutingRules. Looking
+    up the rules that apply to a key only visits the nodes along that key,
+    rather than every rule in the bucket.
+    """
+    def __init__(self, rules=None):
+        self._root = Node()
+        self._size = 0
+        for rule in rules or []:
+            self.add(rule)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, rule):
+        """
+        Index a RoutingRule. Rules without a key prefix condition (e.g., those
+        conditioned on an HTTP error code) are ignored.
+        """
+        if not rule.condition or not rule.condition.key_prefix:
+            return None
+        entry = IndexedRule(rule)
+        node = self._root
+        for char in entry.key_prefix:
+            node = node.children.setdefault(char, Node())
+        node.entries.append(entry)
+        self._size += 1
+        return entry
+
+    def remove(self, rule):
+        """
+        Remove a RoutingRule from the index, returning whether it was indexed.
+        """
+        if not rule.condition or not rule.condition.key_prefix:
+            return False
+        node = self._find(rule.condition.key_prefix)
+        if not node:
+            return False
+        for entry in node.entries:
+            if entry.rule is rule:
+                node.entries.remove(entry)
+                self._size -= 1
+                return True
+        return False
+
+    def match(self, key):
+        """
+        Get the rules whose key prefix is a prefix of the given key.
+        """
+        matches = list(self._root.entries)
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if not node:
+                break
+            matches.extend(node.entries)
+        return matches
+
+    def match_all(self, keys):
+        """
+        Get the rules matching each of the given keys. Keys are visited in
+        sorted order so that the walk down any prefix they share is only done
+        once.
+        """
+        results = {}
+        # The path walked for the previous key: path[i] is the node reached
+        # after i characters, and found[i] the rules matched along the way.
+        previous = ''
+        path = [self._root]
+        found = [list(self._root.entries)]
+        for key in sorted(set(keys)):
+            common = 0
+            for a, b in zip(previous, key):
+                if a != b:
+                    break
+                common += 1
+            del path[common + 1:]
+            del found[common + 1:]
+            for char in key[len(path) - 1:]:
+                node = path[-1].children.get(char) if path[-1] else None
+                path.append(node)
+                found.append(found[-1] + node.entries if node else found[-1])
+            results[key] = list(found[-1])
+            previous = key
+        return OrderedDict((key, results[key]) for key in keys)
+
+    def under(self, prefix):
+        """
+        Get the rules whose key prefix starts with the given prefix.
+        """
+        node = self._find(prefix)
+        if not node:
+            return []
+        entries = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            entries.extend(node.entries)
+            stack.extend(node.children[char] for char in
+                         sorted(node.children, reverse=True))
+        return entries
+
+    def _find(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if not node:
+                return None
+        return node
@@ -0,0 +1,281 @@
+"""
+A product's schema: the JSON file naming where its versions live, which local
+artifacts are uploaded where, and how major/minor pairs and "latest" are
+pinned. A Schema is validated once, when it is loaded, so that a malformed one
+fails before any request is made; its templates are compiled once, and the
+mappings rendered for a version are memoized and shared by every op.
+"""
+from collections import OrderedDict
+from sdk_release_tools import cache
+from sdk_release_tools.errors import ReleaseError
+from types import MappingProxyType
+
+import json
+import os
+import string
+import threading
+
+__all__ = ['COMPRESS_SETTINGS', 'MAPPINGS', 'REQUIRED', 'Schema', 'Template',
+           'VERSION_VARIABLES', 'load_schema']
+
+# Sections every schema must define.
+REQUIRED = ['versions', 'major_minor_versions', 'artifacts']
+
+# Sections mapping keys to keys, rendered for each version.
+MAPPINGS = ['artifacts', 'pin', 'latest']
+
+# The settings a "compress" object may have, and the type of each; see
+# sdk_release_tools.compress.
+COMPRESS_SETTINGS = OrderedDict([('content_types', list),
+                                 ('encoding', str),
+                                 ('extensions', list),
+                                 ('min_size', int)])
+
+# Variables a version contributes to templates; which of them are defined
+# depends on the version's class (e.g., only TwilioVersions have a
+# "build_number").
+VERSION_VARIABLES = set(['version', 'major', 'minor', 'patch', 'pre_release',
+                         'build_metadata', 'git_commit', 'build_number'])
+
+
+class Template(object):
+    """
+    A str.format template parsed once into its literal text and the variables
+    between them, so rendering just joins strings. A template without
+    variables is rendered once.
+    """
+    def __init__(self, template):
+        self.template = template
+        self.parts = []
+        self.variables = set()
+        try:
+            parsed = list(string.Formatter().parse(template))
+        except ValueError as e:
+            raise ReleaseError('Invalid template "{}": {}'.format(template, e))
+        for literal, name, spec, conversion in parsed:
+            if literal:
+                self.parts.append((literal, None))
+            if name is None:
+                continue
+            if not name or not name.isidentifier() or spec or conversion:
+                raise ReleaseError(
+                    'Invalid template "{}": only plain variables such as '
+                    '{{version}} are supported'.format(template))
+            self.parts.append((None, name))
+            self.variables.add(name)
+        self.constant = None if self.variables else ''.join(
+            literal for literal, _ in self.parts)
+
+    def partial(self, variables):
+        """
+        Render the variables that are given, leaving the others in place, so
+        that templates may be compared before versions are known.
+        """
+        return ''.join(literal if name is None else
+                       str(variables[name]) if name in variables else
+                       '{' + name + '}'
+                       for literal, name in self.parts)
+
+    def render(self, variables):
+        if self.constant is not None:
+            return self.constant
+        try:
+            return ''.join(literal if name is None else str(variables[name])
+                           for literal, name in self.parts)
+        except KeyError as e:
+            raise ReleaseError('Template "{}" uses {}, which is not defined '
+                               'for this version'.format(self.template, e))
+
+
+class Schema(object):
+    """
+    A validated schema. Sections are still available by name through get, for
+    settings like "compress" and "headers"; the templated ones are rendered
+    through versions_dir, major_minor_versions_dir, variables and render.
+    """
+    def __init__(self, data, name='schema'):
+        self.name = name
+        self.data = data
+        self._validate()
+        self.templates = {}
+        variables = data.get('variables', {})
+        self.defaults = MappingProxyType(dict(variables))
+        self._check_variables()
+        self._check_overlaps(OrderedDict(
+            (key, self._template(value).partial(self.defaults))
+            for key, value in data['artifacts'].items()))
+        self.versions_dir = self._template(data['versions']).render(variables)
+        self.major_minor_versions_dir = self._template(
+            data['major_minor_versions']).render(variables)
+        self._rendered = {}
+        self._lock = threading.Lock()
+
+    def _error(self, message):
+        return ReleaseError('{}: {}'.format(self.name, message))
+
+    def _template(self, template):
+        compiled = self.templates.get(template)
+        if compiled is None:
+            try:
+                compiled = Template(template)
+            except ReleaseError as e:
+                raise self._error(e)
+            self.templates[template] = compiled
+        return compiled
+
+    def _validate(self):
+        if not isinstance(self.data, dict):
+            raise self._error('expected a JSON object')
+        for section in REQUIRED:
+            if section not in self.data:
+                raise self._error('missing "{}"'.format(section))
+        for section in ['versions', 'major_minor_versions']:
+            if not isinstance(self.data[section], str):
+                raise self._error('"{}" must be a string'.format(section))
+        for section in ['variables'] + MAPPINGS:
+            mapping = self.data.get(section, {})
+            if not isinstance(mapping, dict) or not all(
+                    isinstance(value, str) for value in mapping.values()):
+                raise self._error('"{}" must map strings to strings'.format(
+                    section))
+        self._validate_compress()
+        headers = self.data.get('headers', {})
+        if not isinstance(headers, dict) or not all(
+                isinstance(rule, dict) and all(
+                    isinstance(value, str) for value in rule.values())
+                for rule in headers.values()):
+            raise self._error('"headers" must map globs to objects mapping '
+                              'header names to strings')
+
+    def _validate_compress(self):
+        setting = self.data.get('compress')
+        if not setting or isinstance(setting, str):
+            return
+        if not isinstance(setting, dict):
+            raise self._error('"compress" must be an encoding or an object')
+        for name, value in setting.items():
+            kind = COMPRESS_SETTINGS.get(name)
+            if kind is None:
+                raise self._error('unknown "compress" setting "{}"'.format(
+                    name))
+            if not isinstance(value, kind) or isinstance(value, bool) or (
+                    kind is list and not all(isinstance(item, str)
+                                             for item in value)):
+                raise self._error('"compress" setting "{}" must be {}'.format(
+                    name, {list: 'a list of strings', str: 'a string',
+                           int: 'an integer'}[kind]))
+
+    def _check_variables(self):
+        """
+        Check that every template only uses variables that the schema or a
+        version defines. Versions are not known yet in "versions" and
+        "major_minor_versions".
+        """
+        defined = set(self.defaults)
+        for section in ['versions', 'major_minor_versions']:
+            undefined = (self._template(self.data[section]).variables -
+                         defined)
+            if undefined:
+                raise self._error('"{}" uses undefined {}'.format(
+                    section, ', '.join(sorted(undefined))))
+        templates = [(section, template) for section in MAPPINGS
+                     for key, value in self.data.get(section, {}).items()
+                     for template in [key, value]]
+        # Header globs are formatted with the same variables on upload.
+        templates.extend(('headers', pattern)
+                         for pattern in self.data.get('headers', {}))
+        for section, template in templates:
+            undefined = (self._template(template).variables - defined -
+                         VERSION_VARIABLES)
+            if undefined:
+                raise self._error('"{}" in "{}" uses undefined {}'.format(
+                    template, section, ', '.join(sorted(undefined))))
+
+    def _check_overlaps(self, artifacts):
+        """
+        Check that no two rendered artifacts are uploaded to the same key, or
+        one into a directory that another is uploaded to; deleting or
+        downloading the release would then visit those keys twice. This is
+        checked once with only the schema's variables rendered, which catches
+        overlaps whatever the version, and again per version, since templates
+        that differ may still render the same for some versions.
+        """
+        destinations = sorted(artifacts.values())
+        for i, dst in enumerate(destinations):
+            for other in destinations[i + 1:]:
+                if other == dst or (dst.endswith('/') and
+                                    other.startswith(dst)):
+                    raise self._error(
+                        'artifacts uploaded to "{}" and "{}" overlap'.format(
+                            dst, other))
+
+    def get(self, section, default=None):
+        return self.data.get(section, default)
+
+    def variables(self, version):
+        """
+        Get the schema's variables merged with a version's (e.g., "major",
+        "minor", "patch", etc.), as a read-only mapping.
+        """
+        return self._memoize(('variables', version),
+                             lambda: self._variables(version))
+
+    def _variables(self, version):
+        variables = dict(self.defaults)
+        variables.update(version.__dict__)
+        variables.update(version=str(version))
+        return MappingProxyType(variables)
+
+    def render(self, section, version):
+        """
+        Render a mapping section ("artifacts", "pin" or "latest") for a
+        version, as a read-only mapping from keys to keys.
+        """
+        return self._memoize((section, version),
+                             lambda: self._render(section, version))
+
+    def _render(self, section, version):
+        variables = self.variables(version)
+        rendered = OrderedDict(
+            (self._template(key).render(variables),
+             self._template(value).render(variables))
+            for key, value in self.data.get(section, {}).items())
+        if section == 'artifacts':
+            self._check_overlaps(rendered)
+        return MappingProxyType(rendered)
+
+    def _memoize(self, key, compute):
+        # Versions of different classes may print the same.
+        key = key[:-1] + (type(key[-1]), str(key[-1]))
+        with self._lock:
+            if key in self._rendered:
+                return self._rendered[key]
+        value = compute()
+        with self._lock:
+            return self._rendered.setdefault(key, value)
+
+
+def load_schema(schema_name):
+    """
+    Load and validate a schema by its product name or path. A server keeps
+    each Schema until its file changes.
+    """
+    filepath = os.path.abspath(schema_name if schema_name.endswith('.json')
+                               else '{}.json'.format(schema_name))
+    try:
+        mtime = os.path.getmtime(filepath)
+    except OSError as e:
+        raise ReleaseError('Cannot read {}: {}'.format(filepath, e))
+    return cache.schemas.get((filepath, mtime), lambda: parse(filepath))
+
+
+def parse(filepath):
+    try:
+        with open(filepath) as schema_file:
+            data = json.loads(schema_file.read(),
+                              object_pairs_hook=OrderedDict)
+    except (IOError, OSError) as e:
+        raise ReleaseError('Cannot read {}: {}'.format(filepath, e))
+    except ValueError as e:
+        raise ReleaseError('{}: invalid JSON: {}'.format(filepath, e))
+    return Schema(data, os.path.basename(filepath))
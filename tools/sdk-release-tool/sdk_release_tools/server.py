@@ -0,0 +1,165 @@
+"""
+A long-running sdk-release-tool process serving actions on a Unix socket, so
+that repeated invocations (see sdk_release_tools.client) share one
+interpreter, S3 connections per realm, and version catalogs per product.
+
+Each request is a single JSON line, {"args": {...}, "tty": ...}, holding the
+parsed command-line arguments and whether the client's output is a
+terminal. The response is a stream of JSON lines: {"output": ...} for
+everything the action logs, then {"exit": code} (and "error", if any).
+"""
+from argparse import Namespace
+from sdk_release_tools import cache
+from sdk_release_tools import log
+from sdk_release_tools.client import connect, socket_path
+from sdk_release_tools.paths import private_dir
+
+import json
+import os
+import socketserver
+import threading
+import traceback
+
+__all__ = ['serve']
+
+# Actions that modify a product, and those that modify the bucket's website
+# configuration, which is shared by every product in a realm.
+PRODUCT_WRITES = ['delete', 'migrate-routing-rules', 'pin', 'pin-latest',
+                  'rebuild-index', 'sync', 'unpin', 'unpin-latest', 'upload']
+WEBSITE_WRITES = ['migrate-routing-rules', 'pin', 'pin-latest', 'unpin',
+                  'unpin-latest', 'update-routing-rules']
+
+
+class Locks(object):
+    """
+    Locks by key, created on demand.
+    """
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.RLock())
+
+
+class ClientStream(object):
+    """
+    A file-like object forwarding log output to a client as JSON lines.
+    """
+    def __init__(self, wfile, tty=False):
+        self.wfile = wfile
+        self.tty = tty
+        self._lock = threading.Lock()
+
+    def isatty(self):
+        return self.tty
+
+    def send(self, message):
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        with self._lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def write(self, text):
+        if text:
+            self.send({'output': str(text)})
+
+    def flush(self):
+        pass
+
+
+def lock_keys(args):
+    """
+    Get the keys of the locks to hold while running an action, in the order
+    they must be acquired.
+    """
+    keys = []
+    if args.action in PRODUCT_WRITES:
+        # The same product may be named by different paths to its schema.
+        from sdk_release_tools.schema import load_schema
+        from sdk_release_tools.util import catalog_key
+        keys.append(catalog_key(args.realm, load_schema(args.product)))
+    if args.action in WEBSITE_WRITES:
+        keys.append((args.realm, None))
+    return keys
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        stream = ClientStream(self.wfile)
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            stream.tty = request.get('tty', False)
+            args = Namespace(**request['args'])
+            code = self.run(args, stream)
+            stream.send({'exit': code})
+        except Exception as e:
+            traceback.print_exc()
+            stream.send({'exit': 1, 'error': str(e)})
+        except SystemExit as e:
+            stream.send({'exit': e.code if isinstance(e.code, int) else 1})
+
+    def run(self, args, stream):
+        if args.action == 'serve':
+            raise Exception('Already serving')
+        if args.action == 'delete' and not args.silent:
+            raise Exception('Deleting through the server requires -s or '
+                            '--silent')
+
+        from sdk_release_tools.__main__ import run
+        locks = [self.server.locks[key] for key in lock_keys(args)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with log.redirect(stream):
+                run(args)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        return 0
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        socketserver.UnixStreamServer.__init__(self, path, Handler)
+        self.locks = Locks()
+
+    def server_bind(self):
+        # Anyone who can connect runs actions with our credentials. Nobody
+        # can connect before server_activate listens, so restricting the
+        # socket here leaves no window.
+        socketserver.UnixStreamServer.server_bind(self)
+        os.chmod(self.server_address, 0o600)
+
+
+def serve(path=None):
+    """
+    Serve actions on a Unix socket until interrupted.
+    """
+    path = socket_path(path)
+    sock = connect(path)
+    if sock:
+        sock.close()
+        raise Exception('A server is already listening on ' + path)
+    if os.path.exists(path):
+        os.remove(path)
+    private_dir(os.path.dirname(path))
+
+    cache.buckets.enable()
+    cache.catalogs.enable()
+    cache.inventories.enable()
+    cache.limits.enable()
+    cache.schemas.enable()
+
+    server = Server(path)
+    log.info('Serving on ' + path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
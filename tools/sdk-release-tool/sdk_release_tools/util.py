@@ -1,98 +1,714 @@
 from collections import OrderedDict
+from sdk_release_tools import cache
+from sdk_release_tools import catalog
+from sdk_release_tools import log
 from sdk_release_tools import ops
-from sdk_release_tools import rpm
-from sdk_release_tools.aws import get_bucket
-from sdk_release_tools.versions import parse_major_minor, parse_version
-import json
+from sdk_release_tools.aws import get_backend, get_bucket, get_bucket_name
+from sdk_release_tools.errors import ReleaseError
+from sdk_release_tools.hashcache import open_cache
+from sdk_release_tools.headers import HeaderRules
+from sdk_release_tools.listing import list_sharded
+from sdk_release_tools.manifest import Manifest, manifest_key, release_prefix
+from sdk_release_tools.progress import Progress
+from sdk_release_tools.ratelimit import get_limits
+from sdk_release_tools.rules import RoutingRuleIndex
+from sdk_release_tools.schema import load_schema
+from sdk_release_tools.verify import compare
+from sdk_release_tools.versions import (MajorMinor, parse_major_minor,
+                                        parse_version)
 import os
+import time
 
 
 
-def load_schema(schema_name):
-    filepath = (schema_name if schema_name.endswith('.json') else
-                '{}.json'.format(schema_name))
-    with open(filepath) as schema_file:
-        return json.loads(schema_file.read())
+def reporting(verbose=False, dry_run=False):
+    """
+    Create the Progress display for an op. A dry run exists to show what would
+    be done, so it lists every object.
+    """
+    return Progress(verbose=verbose or dry_run)
+
+
+def delete(realm, schema, version, dry_run=True, silent=False,
+           backend='boto', bandwidth=None, request_rate=None, verbose=False):
+    artifacts = schema.render('artifacts', version)
+    variables = schema.variables(version)
+    backend = get_backend(realm, backend)
+    try:
+        key = manifest_key(schema, variables)
+        manifest = Manifest.load(backend, key)
+        # Confirming each deletion shows every object anyway.
+        progress = reporting(verbose, dry_run) if silent else None
+        try:
+            context = ops.delete(artifacts, backend=backend, dry_run=dry_run,
+                                 silent=silent, manifest=manifest,
+                                 limits=get_limits(realm, bandwidth,
+                                                   request_rate),
+                                 progress=progress)
+        finally:
+            if progress is not None:
+                progress.close()
+        # Whatever was kept, the Manifest no longer describes the release.
+        if manifest is not None:
+            log.log(key)
+            if not dry_run:
+                backend.delete(key)
+        delete_bundle(backend, schema, variables, dry_run)
+        update_catalog(backend, schema, lambda index: index.remove(version),
+                       dry_run)
+        return context
+    finally:
+        backend.close()
+        invalidate_versions(realm, schema, dry_run)
+
+
+def download(realm, schema, version, root, dry_run=True, backend='boto',
+             bandwidth=None, request_rate=None, verbose=False, bundle=True,
+             paths=None):
+    """
+    Download a version's artifacts: from its bundle, if it has one and bundle
+    is set, or else object by object. Paths, relative to the release, select
+    which artifacts to extract from the bundle.
+    """
+    artifacts = schema.render('artifacts', version)
+    variables = schema.variables(version)
+    backend = get_backend(realm, backend)
+    try:
+        if bundle or paths:
+            from sdk_release_tools.bundle import Index, index_key
+            index = Index.load(backend, index_key(schema, variables))
+            if index is not None:
+                return download_bundle(backend, schema, variables, artifacts,
+                                       root, index, paths, dry_run,
+                                       get_limits(realm, bandwidth,
+                                                  request_rate),
+                                       reporting(verbose, dry_run))
+            if paths:
+                raise ReleaseError('Version {} has no bundle to extract paths '
+                                   'from'.format(version))
+        manifest = Manifest.load(backend, manifest_key(schema, variables))
+        progress = reporting(verbose, dry_run)
+        try:
+            return ops.download(artifacts, root=root, backend=backend,
+                                dry_run=dry_run, manifest=manifest,
+                                limits=get_limits(realm, bandwidth,
+                                                  request_rate),
+                                progress=progress)
+        finally:
+            progress.close()
+    finally:
+        backend.close()
+
+
+def download_bundle(backend, schema, variables, artifacts, root, index,
+                    paths=None, dry_run=True, limits=None, progress=None):
+    """
+    Fetch a release's bundle with a few concurrent ranged GETs and extract
+    it or, with paths, fetch and extract just their Entries, one ranged GET
+    each.
+    """
+    import shutil
+    import tempfile
+    from sdk_release_tools.bundle import bundle_key, extract, fetch, targets
+    from sdk_release_tools.parallel import concurrently
+    key = bundle_key(schema, variables)
+    prefix = release_prefix(schema, variables)
+    scratch = None
+    try:
+        pairs = targets(artifacts, ops.absolute(root), index,
+                        None if paths is None else
+                        [prefix + path.lstrip('/') for path in paths])
+        if paths is not None and not pairs:
+            raise ReleaseError('No artifacts under {} in {}'.format(
+                ', '.join(paths), key))
+        for entry, path in pairs:
+            progress.log('{} -> {}'.format(entry.name, path))
+        if dry_run:
+            return pairs
+        scratch = tempfile.mkdtemp(prefix='sdk-release-tool-')
+        if paths is None:
+            filename = os.path.join(scratch, os.path.basename(key))
+            progress.add(len(pairs), index.size)
+            fetch(backend, key, filename, 0, index.size - 1, limits,
+                  progress=progress)
+            with open(filename, 'rb') as f:
+                for entry, path in pairs:
+                    extract(f, entry, path)
+                    progress.update(1)
+        else:
+            progress.add(len(pairs), sum(entry.compressed_size
+                                         for entry, _ in pairs))
+
+            def fetch_entry(pair):
+                entry, path = pair
+                filename = os.path.join(scratch, str(id(entry)))
+                if entry.compressed_size:
+                    fetch(backend, key, filename, entry.offset, entry.end - 1,
+                          limits, progress=progress)
+                else:
+                    open(filename, 'wb').close()
+                with open(filename, 'rb') as f:
+                    extract(f, entry, path, entry.offset)
+                os.remove(filename)
+                progress.update(1)
+
+            concurrently(fetch_entry, pairs)
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+        progress.close()
+    return pairs
+
+
+def pin(realm, schema, version, dry_run=False, verbose=False,
+        backend='boto', bandwidth=None, request_rate=None):
+    return pin_sections(realm, schema, version, ['pin'], dry_run, verbose,
+                        backend, bandwidth, request_rate)
+
+
+def pin_latest(realm, schema, version, dry_run=False, verbose=False,
+               backend='boto', bandwidth=None, request_rate=None):
+    return pin_sections(realm, schema, version, ['latest'], dry_run, verbose,
+                        backend, bandwidth, request_rate)
+
+
+def pin_release(realm, schema, version, latest=False, dry_run=False,
+                verbose=False, backend='boto', bandwidth=None,
+                request_rate=None):
+    """
+    Pin a major/minor pair and, optionally, "latest" to a version number.
+    """
+    return pin_sections(realm, schema, version,
+                        ['pin', 'latest'] if latest else ['pin'], dry_run,
+                        verbose, backend, bandwidth, request_rate)
 
 
-def get_variables(schema, version):
+def pin_sections(realm, schema, version, sections, dry_run=False,
+                 verbose=False, backend='boto', bandwidth=None,
+                 request_rate=None):
+    """
+    Point the keys of the "pin" and "latest" sections among sections,
+    rendered for a version, at it. The sections share one Backend and one
+    website configuration session, so that the bucket's RoutingRules are
+    fetched once and written at most once, and the product's cached versions
+    are forgotten once at the end. Returns the last section's Context.
+    """
+    major_minor = MajorMinor(version.major, version.minor)
+    changes = {
+        'pin': lambda index: index.pin(major_minor, version),
+        'latest': lambda index: index.pin_latest(version),
+    }
+    copy_on_pin = schema.get('copy_on_pin', False)
+    bucket = get_bucket(realm)
+    backend = get_backend(realm, backend)
+    context = None
+    try:
+        with ops.website_session(bucket, dry_run) as website:
+            for section in sections:
+                progress = reporting(verbose, dry_run)
+                try:
+                    context = ops.pin(schema.render(section, version),
+                                      bucket=bucket, backend=backend,
+                                      dry_run=dry_run,
+                                      major_minor=major_minor,
+                                      copy_on_pin=copy_on_pin,
+                                      website=website,
+                                      limits=get_limits(realm, bandwidth,
+                                                        request_rate),
+                                      progress=progress)
+                finally:
+                    progress.close()
+                update_catalog(backend, schema, changes[section], dry_run)
+        return context
+    finally:
+        backend.close()
+        invalidate_versions(realm, schema, dry_run)
+
+
+def migrate_routing_rules(realm, schema, dry_run=True):
     """
-    Get the variables defined in the schema and merge them with any version
-    number variables (e.g., "major", "minor", "patch", etc.).
+    Convert the product's legacy RoutingRules into S3 Key redirects, then
+    remove the RoutingRules in a single website configuration update.
     """
-    variables = schema.get('variables', {})
-    variables.update(version.__dict__)
-    variables.update(version=str(version))
-    return variables
+    bucket = get_bucket(realm)
+    with ops.website_session(bucket, dry_run) as website:
+        rules = routing_rules_to_migrate(website, schema)
+        if not rules:
+            log.info('  No RoutingRules to migrate')
+            return
+        ops.migrate(rules, bucket=bucket, dry_run=dry_run, website=website,
+                    limits=get_limits(realm))
+    invalidate_versions(realm, schema, dry_run)
 
 
-def delete(realm, schema, version, dry_run=True, silent=False):
-    artifacts = schema.get('artifacts', {})
-    variables = get_variables(schema, version)
-    return ops.delete(artifacts, bucket=get_bucket(realm), variables=variables,
-                      dry_run=dry_run, silent=silent)
+def routing_rules_to_migrate(website, schema):
+    """
+    Map the key prefix of each of a product's RoutingRules that redirects
+    within its releases to the prefix it is replaced with. Rules to another
+    host, or outside the product's releases, are left alone.
+    """
+    rules = OrderedDict()
+    for entry in website.index.under(schema.major_minor_versions_dir):
+        redirect = entry.rule.redirect
+        if (not entry.replace_key_prefix or redirect.hostname or
+                not entry.replace_key_prefix.startswith(
+                    schema.versions_dir)):
+            log.warn('  Skipping RoutingRule for {}'.format(entry.key_prefix))
+            continue
+        rules[entry.key_prefix] = entry.replace_key_prefix
+    return rules
+
+
+def unpin(realm, schema, version, dry_run=False, website=None,
+          backend='boto', bandwidth=None, request_rate=None):
+    rules = schema.render('pin', version)
+    bucket = website.bucket if website else get_bucket(realm)
+    backend = get_backend(realm, backend)
+    try:
+        context = ops.unpin(rules, bucket=bucket, backend=backend,
+                            dry_run=dry_run,
+                            major_minor=MajorMinor(version.major,
+                                                   version.minor),
+                            website=website,
+                            limits=get_limits(realm, bandwidth,
+                                              request_rate))
+        update_realm_catalog(realm, schema, lambda index: index.unpin(
+            MajorMinor(version.major, version.minor)), dry_run)
+        return context
+    finally:
+        backend.close()
+        invalidate_versions(realm, schema, dry_run)
+
+
+def unpin_latest(realm, schema, version, dry_run=False, website=None,
+                 backend='boto', bandwidth=None, request_rate=None):
+    rules = schema.render('latest', version)
+    bucket = website.bucket if website else get_bucket(realm)
+    backend = get_backend(realm, backend)
+    try:
+        context = ops.unpin(rules, bucket=bucket, backend=backend,
+                            dry_run=dry_run,
+                            major_minor=MajorMinor(version.major,
+                                                   version.minor),
+                            website=website,
+                            limits=get_limits(realm, bandwidth,
+                                              request_rate))
+        update_realm_catalog(realm, schema,
+                             lambda index: index.pin_latest(None), dry_run)
+        return context
+    finally:
+        backend.close()
+        invalidate_versions(realm, schema, dry_run)
+
+
+def upload(realm, schema, version, root, dry_run=True, backend='boto',
+           bandwidth=None, request_rate=None, verbose=False,
+           hash_cache=True, bundle=False):
+    """
+    Upload a version's artifacts and, with bundle, a bundle of them for
+    download.
+    """
+    artifacts = schema.render('artifacts', version)
+    variables = schema.variables(version)
+    if not os.path.isdir(root):
+        from sdk_release_tools import rpm
+        root = rpm.unpack(root)
+        # Hashes of files in a scratch directory are never looked up again.
+        hash_cache = False
+    from sdk_release_tools.compress import Compression
+    compression = Compression.from_schema(schema)
+    header_rules = HeaderRules.from_schema(schema, variables)
+    backend = get_backend(realm, backend)
+    hashes = open_cache(hash_cache)
+    writer = bundle_writer(bundle, dry_run)
+    try:
+        key = manifest_key(schema, variables)
+        manifest = None if dry_run else upload_manifest(backend, schema,
+                                                         variables)
+        progress = reporting(verbose, dry_run)
+        try:
+            context = ops.upload(artifacts, root=root, backend=backend,
+                                 dry_run=dry_run,
+                                 compression=compression,
+                                 header_rules=header_rules, manifest=manifest,
+                                 limits=get_limits(realm, bandwidth,
+                                                   request_rate),
+                                 progress=progress, hashes=hashes,
+                                 bundle=writer)
+        finally:
+            progress.close()
+        if manifest is not None:
+            log.log('Writing manifest {}'.format(key))
+            manifest.save(backend, key)
+        if bundle:
+            publish_bundle(backend, schema, variables, writer, dry_run)
+        else:
+            # A release uploaded again with --force may have one already.
+            delete_bundle(backend, schema, variables, dry_run, stale=True)
+        update_catalog(backend, schema, lambda index: index.add(version),
+                       dry_run)
+        return context
+    finally:
+        backend.close()
+        if hashes is not None:
+            hashes.close()
+        if writer is not None:
+            writer.remove()
+        invalidate_versions(realm, schema, dry_run)
+
+
+def sync(realm, schema, version, root, delete=False, dry_run=True,
+         backend='boto', bandwidth=None, request_rate=None, verbose=False,
+         hash_cache=True, bundle=False):
+    """
+    Upload the artifacts that changed since a version was uploaded and, with
+    delete, delete those that no longer exist locally. If anything changed,
+    the version's bundle is republished with bundle, or else deleted, since
+    it no longer matches the release.
+    """
+    artifacts = schema.render('artifacts', version)
+    variables = schema.variables(version)
+    if not os.path.isdir(root):
+        from sdk_release_tools import rpm
+        root = rpm.unpack(root)
+        # Hashes of files in a scratch directory are never looked up again.
+        hash_cache = False
+    from sdk_release_tools.compress import Compression
+    compression = Compression.from_schema(schema)
+    header_rules = HeaderRules.from_schema(schema, variables)
+    backend = get_backend(realm, backend)
+    hashes = open_cache(hash_cache)
+    writer = bundle_writer(bundle, dry_run)
+    try:
+        key = manifest_key(schema, variables)
+        manifest = upload_manifest(backend, schema, variables)
+        before = snapshot(manifest)
+        progress = reporting(verbose, dry_run)
+        try:
+            context = ops.sync(artifacts, delete=delete, root=root,
+                               backend=backend, dry_run=dry_run,
+                               compression=compression,
+                               header_rules=header_rules, manifest=manifest,
+                               limits=get_limits(realm, bandwidth,
+                                                 request_rate),
+                               progress=progress, hashes=hashes,
+                               bundle=writer)
+        finally:
+            progress.close()
+        if manifest is not None and not dry_run:
+            log.log('Writing manifest {}'.format(key))
+            manifest.save(backend, key)
+        # Without a manifest there is no telling what changed.
+        if manifest is None or snapshot(manifest) != before:
+            if bundle:
+                publish_bundle(backend, schema, variables, writer, dry_run)
+            else:
+                delete_bundle(backend, schema, variables, dry_run, stale=True)
+        # Syncing a version that was never uploaded uploads it.
+        update_catalog(backend, schema, lambda index: index.add(version),
+                       dry_run)
+        return context
+    finally:
+        backend.close()
+        if hashes is not None:
+            hashes.close()
+        if writer is not None:
+            writer.remove()
+        invalidate_versions(realm, schema, dry_run)
+
+
+def prewarm(realm, schema, version, sections=('pin',), base_url=None,
+            dry_run=True, backend='boto', request_rate=None, verbose=False):
+    """
+    Fetch the keys of the given pin maps ("pin" and/or "latest") and every
+    object of a version from the CDN, and return a prewarm.Report. Objects
+    are listed from the release's Manifest, if it has one.
+    """
+    from sdk_release_tools.prewarm import (REQUEST_RATE, fetch_all,
+                                           get_base_url, urls)
+    from sdk_release_tools.ratelimit import RateLimits
+    variables = schema.variables(version)
+    names = []
+    for section in sections:
+        names.extend(schema.render(section, version))
+    backend = get_backend(realm, backend)
+    try:
+        key = manifest_key(schema, variables)
+        manifest = Manifest.load(backend, key)
+        prefix = release_prefix(schema, variables)
+        objects = (manifest.list(prefix) if manifest is not None else
+                   list_sharded(backend, prefix))
+        names.extend(obj.name for obj in objects
+                     if not ops.describes_release(obj.name))
+    finally:
+        backend.close()
+    targets = urls(base_url or get_base_url(realm), names)
+    if dry_run:
+        for url in targets:
+            log.log(url)
+        return None
+    progress = reporting(verbose)
+    try:
+        report = fetch_all(targets, RateLimits(
+            request_rate=request_rate or REQUEST_RATE), progress=progress)
+    finally:
+        progress.close()
+    log.event('prewarm', fetched=len(report.fetches),
+              failed=[fetch.url for fetch in report.failed],
+              statuses=dict((str(status), count) for status, count
+                            in report.statuses.items()),
+              **report.percentiles())
+    if not report.ok:
+        raise ReleaseError(report.summary())
+    log.info(report.summary())
+    return report
+
+
+def snapshot(manifest):
+    if manifest is None:
+        return None
+    return [(obj.name, obj.etag) for obj in manifest.list('')]
+
+
+def bundle_writer(bundle, dry_run=True):
+    """
+    Get the bundle.Writer that an upload with bundle adds its artifacts to, or
+    None.
+    """
+    if not bundle or dry_run:
+        return None
+    from sdk_release_tools.bundle import Writer
+    return Writer()
 
 
-def download(realm, schema, version, root, dry_run=True):
-    artifacts = schema.get('artifacts', {})
-    variables = get_variables(schema, version)
-    return ops.download(artifacts, root=root, bucket=get_bucket(realm),
-                        variables=variables, dry_run=dry_run)
+def publish_bundle(backend, schema, variables, writer, dry_run=True):
+    """
+    Finish the bundle of a version's artifacts that an upload wrote, upload
+    it, and then its Index; a download only uses a bundle once its Index
+    exists.
+    """
+    from sdk_release_tools.bundle import BUNDLE_HEADERS, bundle_key, index_key
+    key = bundle_key(schema, variables)
+    log.log('Writing bundle {}'.format(key))
+    if dry_run:
+        return None
+    index = writer.close()
+    backend.put_file(key, writer.filename, BUNDLE_HEADERS)
+    index.save(backend, index_key(schema, variables))
+    return index
+
+
+def delete_bundle(backend, schema, variables, dry_run=True, stale=False):
+    """
+    Delete a version's bundle and its Index, if it has them; the Index goes
+    first, so that no download uses a bundle that is going away.
+    """
+    from sdk_release_tools.bundle import bundle_key, index_key
+    key = index_key(schema, variables)
+    if not backend.head(key):
+        return
+    if stale:
+        log.warn('  Deleting the bundle, which no longer matches the '
+                 'release; pass --bundle to republish it')
+    for name in [key, bundle_key(schema, variables)]:
+        log.log(name)
+        if not dry_run:
+            backend.delete(name)
+
+
+def upload_manifest(backend, schema, variables):
+    """
+    Get the Manifest that an upload adds to: the release's existing one, or a
+    new one if the release is new. A release uploaded before manifests
+    existed gets none, since it would not list what is already there.
+    """
+    manifest = Manifest.load(backend, manifest_key(schema, variables))
+    if manifest is not None:
+        return manifest
+    prefix = release_prefix(schema, variables)
+    if next(iter(backend.list(prefix)), None) is not None:
+        log.warn('  Not writing a manifest for a release without one')
+        return None
+    return Manifest(prefix)
+
+
+def verify(realm, schema, version, root=None, backend='boto',
+           hash_cache=True):
+    """
+    Compare a version's uploaded artifacts, as its Manifest records them if
+    it has one, with local ones, or, without a root, compare the bucket with
+    the release's Manifest, and return a verify.Report.
+    """
+    artifacts = schema.render('artifacts', version)
+    variables = schema.variables(version)
+    if root is None:
+        return verify_manifest(realm, schema, variables, backend)
+    if not os.path.isdir(root):
+        from sdk_release_tools import rpm
+        root = rpm.unpack(root)
+        # Hashes of files in a scratch directory are never looked up again.
+        hash_cache = False
+    from sdk_release_tools.compress import Compression
+    compression = Compression.from_schema(schema)
+    backend = get_backend(realm, backend)
+    hashes = open_cache(hash_cache)
+    try:
+        manifest = Manifest.load(backend, manifest_key(schema, variables))
+        return ops.verify(artifacts, root=root, backend=backend,
+                          compression=compression, manifest=manifest,
+                          hashes=hashes).report
+    finally:
+        backend.close()
+        if hashes is not None:
+            hashes.close()
+
+
+def verify_manifest(realm, schema, variables, backend='boto'):
+    backend = get_backend(realm, backend)
+    try:
+        key = manifest_key(schema, variables)
+        manifest = Manifest.load(backend, key)
+        if manifest is None:
+            raise ReleaseError('No manifest at {}; pass a source to verify '
+                               'against'.format(key))
+        # Checking that the bucket still holds what the manifest records is
+        # the point here, so this one listing stays.
+        actual = (obj for obj in list_sharded(backend, manifest.prefix)
+                  if not ops.describes_release(obj.name))
+        return compare(manifest.list(''), actual)
+    finally:
+        backend.close()
 
 
-def pin(realm, schema, version, dry_run=False):
-    rules = schema.get('pin', {})
-    variables = get_variables(schema, version)
-    copy_on_pin = schema.get('copy_on_pin', False)
-    return ops.pin(rules, bucket=get_bucket(realm), variables=variables,
-                   dry_run=dry_run, copy_on_pin=copy_on_pin)
+def get_cors(realm):
+    bucket = get_bucket(realm)
+    return bucket.get_cors()
 
 
-def pin_latest(realm, schema, version, dry_run=False):
-    rules = schema.get('latest', {})
-    variables = get_variables(schema, version)
-    copy_on_pin = schema.get('copy_on_pin', False)
-    return ops.pin(rules, bucket=get_bucket(realm), variables=variables,
-                   dry_run=dry_run, copy_on_pin=copy_on_pin)
+def catalog_key(realm, schema):
+    """
+    Identify a product by its realm, bucket and releases prefix, however its
+    schema was found.
+    """
+    return (realm, get_bucket_name(realm) if realm else None,
+            schema.versions_dir)
 
 
-def unpin(realm, schema, version, dry_run=False):
-    rules = schema.get('pin', {})
-    variables = get_variables(schema, version)
-    return ops.unpin(rules, bucket=get_bucket(realm), variables=variables,
-                     dry_run=dry_run)
+def invalidate_versions(realm, schema, dry_run=False):
+    """
+    Forget any cached result of get_versions after the product was modified.
+    """
+    if not dry_run:
+        cache.catalogs.discard(catalog_key(realm, schema))
 
 
-def unpin_latest(realm, schema, version, dry_run=False):
-    rules = schema.get('latest', {})
-    variables = get_variables(schema, version)
-    return ops.unpin(rules, bucket=get_bucket(realm), variables=variables,
-                     dry_run=dry_run)
+def get_versions(realm, schema, inventory=None):
+    return cache.catalogs.get(catalog_key(realm, schema),
+                              lambda: load_versions(realm, schema, inventory))
 
 
-def upload(realm, schema, version, root, dry_run=True):
-    artifacts = schema.get('artifacts', {})
-    variables = get_variables(schema, version)
-    if not os.path.isdir(root):
-        root = rpm.unpack(root)
-    return ops.upload(artifacts, root=root, bucket=get_bucket(realm),
-                      variables=variables, dry_run=dry_run)
+def load_versions(realm, schema, inventory=None):
+    """
+    Read a product's versions from its catalog.Catalog in one request, or scan
+    for them if it has none, with the help of an S3 Inventory report if one
+    is given or in AWS_{REALM}_INVENTORY.
+    """
+    backend = get_backend(realm)
+    try:
+        index, _ = catalog.Catalog.load(backend, catalog.index_key(schema))
+    finally:
+        backend.close()
+    if index is None:
+        return scan(realm, schema, inventory)
+    return index.to_versions()
 
 
-def get_cors(realm):
-    bucket = get_bucket(realm)
-    return bucket.get_cors()
+def scan(realm, schema, inventory=None):
+    """
+    Scan for a product's versions, with the help of the S3 Inventory report
+    whose manifest.json is at a local path, a key in the release bucket or an
+    "s3://bucket/key" location, if any.
+    """
+    inventory = inventory or os.getenv('AWS_' + realm.upper() + '_INVENTORY')
+    if not inventory:
+        return scan_versions(realm, schema)
+    from sdk_release_tools.inventory import Inventory, split_location
+    # Reports are usually delivered to a bucket of their own.
+    bucket_name, inventory = split_location(inventory)
+    backend = get_backend(realm, bucket_name=bucket_name)
+    try:
+        inventory = Inventory.load(inventory, backend)
+        log.info('Using the S3 Inventory report of {}'.format(
+            time.strftime('%Y-%m-%d %H:%M UTC', time.gmtime(
+                inventory.created))))
+        return scan_versions(realm, schema, inventory)
+    finally:
+        backend.close()
+
+
+def update_catalog(backend, schema, change, dry_run=False):
+    """
+    Apply a change to a product's catalog.Catalog, if it has one.
+    """
+    if dry_run:
+        return
+    key = catalog.index_key(schema)
+    if catalog.update(backend, key, change) is not None:
+        log.log('Updated catalog {}'.format(key))
+
+
+def update_realm_catalog(realm, schema, change, dry_run=False):
+    backend = get_backend(realm)
+    try:
+        update_catalog(backend, schema, change, dry_run)
+    finally:
+        backend.close()
+
+
+def rebuild_index(realm, schema, dry_run=True, inventory=None):
+    """
+    Write a product's catalog.Catalog from a scan of the bucket, replacing any
+    existing one.
+    """
+    index = catalog.Catalog.from_versions(*scan(realm, schema, inventory))
+    key = catalog.index_key(schema)
+    log.log('Writing catalog {} ({} versions)'.format(key,
+                                                      len(index.versions)))
+    if not dry_run:
+        backend = get_backend(realm)
+        try:
+            index.replace(backend, key)
+        finally:
+            backend.close()
+    invalidate_versions(realm, schema, dry_run)
+    return index
 
-def get_versions(realm, schema):
+
+def scan_versions(realm, schema, inventory=None):
+    """
+    Find a product's versions, major/minor pairs and latest version in the
+    bucket. With an inventory.Inventory, the keys under each major/minor
+    prefix come from the report, and only what changed since is looked up
+    live: the prefixes are found by listing their names alone, and only those
+    created since the report are listed in full. Every redirect is still read
+    live, since pins change in place.
+    """
     bucket = get_bucket(realm)
     config = bucket.get_website_configuration_obj()
 
-    unordered_versions = []
-    versions_dir = schema.get('versions').format(**schema.get('variables', {}))
+    versions_dir = schema.versions_dir
+    major_minor_versions_dir = schema.major_minor_versions_dir
+    reported = {}
+    if inventory is not None:
+        reported = cache.inventories.get(
+            (realm, inventory.location, inventory.created,
+             major_minor_versions_dir),
+            lambda: inventory.children(major_minor_versions_dir))
 
-    for key in bucket.list(versions_dir, '/'):
+    unordered_versions = []
+    for name in (key.name for key in bucket.list(versions_dir, '/')):
         try:
-            version = parse_version(os.path.split(key.name.rstrip('/'))[1])
+            version = parse_version(os.path.split(name.rstrip('/'))[1])
         except:
             continue
         unordered_versions.append(version)
@@ -101,42 +717,30 @@ def get_versions(realm, schema):
     for version in sorted(unordered_versions):
         ordered_versions[str(version)] = None
 
-    major_minor_versions_dir = schema.get('major_minor_versions').format(
-        **schema.get('variables', {}))
     ordered_major_minors = OrderedDict()
 
     latest = None
 
-    # First, try to identify any versions pinned by S3 Key redirects.
-    for key in bucket.list(major_minor_versions_dir, '/'):
+    # First, try to identify any versions pinned by S3 Key redirects. S3
+    # cannot list keys by the date they were written, so the prefixes created
+    # or deleted since the report are found by listing the prefixes' names
+    # alone, and only the new ones are listed in full.
+    for name in (key.name for key in
+                 bucket.list(major_minor_versions_dir, '/')):
         major_minor = None
         try:
             major_minor = parse_major_minor(
-                os.path.split(key.name.rstrip('/'))[1])
+                os.path.split(name.rstrip('/'))[1])
         except:
-            if os.path.split(key.name.rstrip('/'))[1] != "latest":
+            if os.path.split(name.rstrip('/'))[1] != "latest":
                 continue
 
-        # This is a little bit of a hack: we are going to iterate through the
-        # prefixes until we find one that matches a key. Once we have the key,
-        # we need to check if it has a redirect to a version number.
-        version = None
-        for key in bucket.list(key.name, '/'):
-            if key.name.endswith('/'):
-                continue
-            key = bucket.get_key(key.name)
-            if not key:
-                continue
-            redirect = key.get_redirect()
-            if not redirect:
-                continue
-            if redirect.startswith('/' + versions_dir.lstrip('/')):
-                redirect = redirect[len('/' + versions_dir.lstrip('/')):]
-                try:
-                    version = parse_version(redirect.split('/')[0])
-                except:
-                    continue
-                break
+        version = pinned_version(bucket, reported.get(name, []),
+                                 versions_dir)
+        if not version and name not in reported:
+            version = pinned_version(
+                bucket, (obj.name for obj in bucket.list(name, '/')),
+                versions_dir)
 
         if not version:
             continue
@@ -150,19 +754,11 @@ def get_versions(realm, schema):
         ordered_major_minors[str(major_minor)] = version
 
     # Then, try to identify any versions pinned by RoutingRules (legacy).
-    for rule in config.routing_rules:
-        key_prefix = rule.condition.key_prefix
-        if not key_prefix.startswith(major_minor_versions_dir):
-            continue
-
-        replace_key_prefix = rule.redirect.replace_key_prefix
-
-        try:
-            major_minor = parse_major_minor(
-                os.path.split(key_prefix.rstrip('/'))[1])
-            version = parse_version(
-                os.path.split(replace_key_prefix.rstrip('/'))[1])
-        except:
+    index = RoutingRuleIndex(config.routing_rules)
+    for entry in index.under(major_minor_versions_dir):
+        major_minor = entry.major_minor
+        version = entry.version
+        if major_minor is None or version is None:
             continue
 
         version_str = str(version)
@@ -173,6 +769,32 @@ def get_versions(realm, schema):
     return (ordered_versions, ordered_major_minors, latest)
 
 
+def pinned_version(bucket, names, versions_dir):
+    """
+    Get the version the first of some keys to redirect into a release
+    redirects to, if any.
+    """
+    # This is a little bit of a hack: we are going to iterate through the
+    # prefixes until we find one that matches a key. Once we have the key,
+    # we need to check if it has a redirect to a version number.
+    for name in names:
+        if name.endswith('/'):
+            continue
+        key = bucket.get_key(name)
+        if not key:
+            continue
+        redirect = key.get_redirect()
+        if not redirect:
+            continue
+        if redirect.startswith('/' + versions_dir.lstrip('/')):
+            redirect = redirect[len('/' + versions_dir.lstrip('/')):]
+            try:
+                return parse_version(redirect.split('/')[0])
+            except:
+                continue
+    return None
+
+
 def version_exists(realm, schema, version):
     ordered_versions, _, _ = get_versions(realm, schema)
     return str(version) in ordered_versions
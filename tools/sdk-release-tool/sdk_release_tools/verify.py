@@ -0,0 +1,197 @@
+from contextlib import contextmanager
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+
+__all__ = ['Report', 'compare', 'etag_kind', 'etag_matches', 'mapped',
+           'matches', 'md5', 'multipart_etag']
+
+MB = 1024 * 1024
+
+# Files at least this large are hashed through mmap rather than read into
+# memory.
+MMAP_THRESHOLD = MB
+
+# Part sizes that common S3 clients use for multipart uploads; a multipart
+# ETag does not record the part size, so we try these.
+PART_SIZES = [8 * MB, 5 * MB, 16 * MB, 15 * MB, 64 * MB, 100 * MB]
+
+
+class Report(object):
+    """
+    The results of comparing uploaded objects with local files: keys that are
+    missing from S3, extra in S3, or whose contents differ.
+    """
+    def __init__(self):
+        self.verified = []
+        self.missing = []
+        self.extra = []
+        self.mismatched = []
+
+    @property
+    def ok(self):
+        return not (self.missing or self.extra or self.mismatched)
+
+
+def read(filename):
+    """
+    Get a file's contents as a buffer, memory-mapping large files.
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            return f.read()
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@contextmanager
+def mapped(filename):
+    """
+    Read a file as a buffer for the duration of a with block, so that it may
+    be hashed and sent from memory with a single read from disk.
+    """
+    data = read(filename)
+    try:
+        yield data
+    finally:
+        if isinstance(data, mmap.mmap):
+            try:
+                data.close()
+            except BufferError:
+                # A transport still holds a view of it, e.g. after a failed
+                # request; it is unmapped once collected.
+                pass
+
+
+def md5(filename, hashes=None):
+    """
+    Get the hex MD5 of a file, i.e. the ETag of a single-part upload, from a
+    HashCache if it has it.
+    """
+    identity = hashes.identity(filename) if hashes else None
+    digest = hashes.get(identity, 'md5') if hashes else None
+    if digest is not None:
+        return digest
+    with mapped(filename) as data:
+        digest = hashlib.md5(data).hexdigest()
+    if hashes:
+        hashes.put(identity, 'md5', digest)
+    return digest
+
+
+def multipart_etag(data, part_size):
+    digests = b''.join(hashlib.md5(data[start:start + part_size]).digest()
+                       for start in range(0, len(data), part_size))
+    parts = (len(data) + part_size - 1) // part_size
+    return '{}-{}'.format(hashlib.md5(digests).hexdigest(), parts)
+
+
+def part_sizes(size, parts):
+    """
+    Get the part sizes that split size bytes into the given number of parts.
+    """
+    candidates = PART_SIZES + [((size + parts - 1) // parts + MB - 1) // MB * MB]
+    seen = set()
+    for part_size in candidates:
+        if (part_size not in seen and
+                (size + part_size - 1) // part_size == parts):
+            seen.add(part_size)
+            yield part_size
+
+
+def etag_kind(kind, part_size):
+    return kind if part_size is None else '{}-{}'.format(kind, part_size)
+
+
+def etag_matches(filename, etag, hashes=None, identity=None, kind='md5'):
+    """
+    Check whether a file's contents have the given ETag, reconstructing
+    multipart ETags (of the form "<md5>-<parts>") when necessary. With a
+    HashCache, the file is only read if it lacks one of the ETags to try;
+    they are cached by identity (by default, the file's) and kind.
+    """
+    if '-' not in etag:
+        sizes = [None]
+    else:
+        sizes = list(part_sizes(os.path.getsize(filename),
+                                int(etag.rsplit('-', 1)[1])))
+    if hashes and identity is None:
+        identity = hashes.identity(filename)
+    uncached = []
+    for part_size in sizes:
+        cached = (hashes.get(identity, etag_kind(kind, part_size))
+                  if hashes else None)
+        if cached is None:
+            uncached.append(part_size)
+        elif cached == etag:
+            return True
+    if not uncached:
+        return False
+    with mapped(filename) as data:
+        for part_size in uncached:
+            if part_size is None:
+                computed = hashlib.md5(data).hexdigest()
+            else:
+                computed = multipart_etag(data, part_size)
+            if hashes:
+                hashes.put(identity, etag_kind(kind, part_size), computed)
+            if computed == etag:
+                return True
+    return False
+
+
+def matches(filename, obj, compression=None, hashes=None):
+    """
+    Check whether an Object holds the contents of a local file, or, if
+    Upload would have pre-compressed the file, its compressed contents. With
+    a HashCache, the compressed size and ETag are cached under the local
+    file, so it is only compressed again once it changes.
+    """
+    if obj.size == os.path.getsize(filename) and etag_matches(
+            filename, obj.etag, hashes):
+        return True
+    if not compression or not compression.matches(filename):
+        return False
+    kind = compression.encoding + ':md5'
+    identity = hashes.identity(filename) if hashes else None
+    size = (hashes.get(identity, compression.encoding + ':size')
+            if hashes else None)
+    if size is not None:
+        if int(size) != obj.size:
+            return False
+        cached = hashes.get(identity, kind)
+        if cached is not None and '-' not in obj.etag:
+            return cached == obj.etag
+    from sdk_release_tools.compress import compress_file
+    scratch = tempfile.mkdtemp(prefix='sdk-release-tool-')
+    try:
+        compressed = compress_file(compression.encoding, filename,
+                                   os.path.join(scratch, 'compressed'))
+        size = os.path.getsize(compressed)
+        if not identity:
+            return size == obj.size and etag_matches(compressed, obj.etag)
+        hashes.put(identity, compression.encoding + ':size', str(size))
+        return size == obj.size and etag_matches(compressed, obj.etag, hashes,
+                                                 identity, kind)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def compare(expected, actual, report=None):
+    """
+    Compare the Objects a release should have, e.g. from its Manifest, with
+    the ones it actually has, by size and ETag, and return a Report.
+    """
+    report = report or Report()
+    actual = dict((obj.name, obj) for obj in actual)
+    for obj in expected:
+        found = actual.pop(obj.name, None)
+        if found is None:
+            report.missing.append(obj.name)
+        elif found.size != obj.size or found.etag != obj.etag:
+            report.mismatched.append(obj.name)
+        else:
+            report.verified.append(obj.name)
+    report.extra.extend(sorted(actual))
+    return report
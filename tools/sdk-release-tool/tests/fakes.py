@@ -0,0 +1,44 @@
+"""
+Helpers shared by the tests: writing local files, and stand-ins for just
+enough of a boto Bucket for a WebsiteConfiguration, and RoutingRules for it.
+"""
+from types import SimpleNamespace
+import os
+
+
+def write(root, path, body):
+    """
+    Write body, bytes or text, to a path under root, creating its directory,
+    and return the full path.
+    """
+    path = os.path.join(root, path)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(body.encode('utf-8') if isinstance(body, str) else body)
+    return path
+
+
+def routing_rule(key_prefix, replace_key_prefix=None, hostname=None):
+    return SimpleNamespace(
+        condition=SimpleNamespace(key_prefix=key_prefix),
+        redirect=SimpleNamespace(replace_key_prefix=replace_key_prefix,
+                                 hostname=hostname))
+
+
+class FakeBucket(object):
+    """
+    Just enough of a boto Bucket for a WebsiteConfiguration. Each call to
+    configure_website is recorded in configured.
+    """
+    def __init__(self, routing_rules=None):
+        self.routing_rules = list(routing_rules or [])
+        self.configured = []
+
+    def get_website_configuration_obj(self):
+        return SimpleNamespace(routing_rules=list(self.routing_rules),
+                               suffix='index.html', error_key=None)
+
+    def configure_website(self, **kwargs):
+        self.configured.append(kwargs)
+        self.routing_rules = list(kwargs['routing_rules'])
@@ -0,0 +1,177 @@
+"""
+A minimal in-memory S3 REST server for tests: path-style addressing,
+ListObjectsV2, GET (optionally of a byte range), HEAD, PUT (optionally
+conditional) and DELETE of objects, and multi-object deletes. Signatures are
+not checked.
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, unquote, urlparse
+from xml.sax.saxutils import escape
+
+import base64
+import hashlib
+import threading
+import xml.etree.ElementTree as ElementTree
+
+
+class FakeObject(object):
+    def __init__(self, body, headers):
+        self.body = body
+        self.headers = headers
+        self.etag = hashlib.md5(body).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _parse(self):
+        url = urlparse(self.path)
+        _, bucket, name = (unquote(url.path).split('/', 2) + [''])[:3]
+        self.server.requests.append((self.command, name))
+        return name, dict(parse_qsl(url.query, keep_blank_values=True))
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _object_headers(self, obj):
+        headers = dict(obj.headers)
+        headers['ETag'] = '"{}"'.format(obj.etag)
+        return headers
+
+    def do_GET(self):
+        name, query = self._parse()
+        if query.get('list-type') == '2':
+            return self._list(query)
+        obj = self.server.objects.get(name)
+        if not obj:
+            return self._reply(404, b'<Error><Code>NoSuchKey</Code></Error>')
+        if self.headers.get('Range') and self.server.ranges:
+            start, end = self.headers['Range'][len('bytes='):].split('-')
+            start, end = int(start), min(int(end), len(obj.body) - 1)
+            headers = self._object_headers(obj)
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(
+                start, end, len(obj.body))
+            return self._reply(206, obj.body[start:end + 1], headers)
+        self._reply(200, obj.body, self._object_headers(obj))
+
+    def do_HEAD(self):
+        name, _ = self._parse()
+        obj = self.server.objects.get(name)
+        if not obj:
+            return self._reply(404)
+        self.send_response(200)
+        for header, value in self._object_headers(obj).items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(obj.body)))
+        self.end_headers()
+
+    def do_PUT(self):
+        name, _ = self._parse()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        existing = self.server.objects.get(name)
+        if_match = self.headers.get('If-Match')
+        if (self.headers.get('If-None-Match') == '*' and existing or
+                if_match and (not existing or
+                              if_match.strip('"') != existing.etag)):
+            return self._reply(412, b'<Error><Code>PreconditionFailed'
+                                    b'</Code></Error>')
+        content_md5 = self.headers.get('Content-MD5')
+        if content_md5 and base64.b64decode(content_md5) != hashlib.md5(
+                body).digest():
+            return self._reply(400, b'<Error><Code>BadDigest</Code></Error>')
+        headers = dict((header, value) for header, value in
+                       self.headers.items()
+                       if header.lower() not in ('host', 'authorization',
+                                                 'content-length', 'if-match',
+                                                 'if-none-match') and
+                       not header.lower().startswith('x-amz-date') and
+                       not header.lower().startswith('x-amz-content'))
+        self.server.objects[name] = FakeObject(body, headers)
+        self._reply(200)
+
+    def do_DELETE(self):
+        name, _ = self._parse()
+        self.server.objects.pop(name, None)
+        self._reply(204)
+
+    def do_POST(self):
+        name, query = self._parse()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if 'delete' not in query:
+            return self._reply(501)
+        for key in ElementTree.fromstring(body).iter('Key'):
+            self.server.objects.pop(key.text, None)
+        self._reply(200, b'<DeleteResult xmlns='
+                    b'"http://s3.amazonaws.com/doc/2006-03-01/"/>')
+
+    def _list(self, query):
+        prefix = query.get('prefix', '')
+        delimiter = query.get('delimiter', '')
+        start = query.get('continuation-token', '')
+        names = sorted(name for name in self.server.objects
+                       if name.startswith(prefix) and name > start)
+        contents = []
+        prefixes = []
+        for name in names:
+            if delimiter and delimiter in name[len(prefix):]:
+                common = name[:name.index(delimiter, len(prefix)) + 1]
+                if common not in prefixes:
+                    prefixes.append(common)
+                continue
+            contents.append(name)
+        page = contents[:self.server.page_size]
+        truncated = len(contents) > self.server.page_size
+        xml = ['<ListBucketResult xmlns='
+               '"http://s3.amazonaws.com/doc/2006-03-01/">']
+        for name in page:
+            obj = self.server.objects[name]
+            xml.append('<Contents><Key>{}</Key><Size>{}</Size>'
+                       '<ETag>"{}"</ETag></Contents>'.format(
+                           escape(name), len(obj.body), obj.etag))
+        for common in ([] if truncated else prefixes):
+            xml.append('<CommonPrefixes><Prefix>{}</Prefix>'
+                       '</CommonPrefixes>'.format(escape(common)))
+        xml.append('<IsTruncated>{}</IsTruncated>'.format(
+            'true' if truncated else 'false'))
+        if truncated:
+            xml.append('<NextContinuationToken>{}</NextContinuationToken>'
+                       .format(escape(page[-1])))
+        xml.append('</ListBucketResult>')
+        self._reply(200, ''.join(xml).encode('utf-8'))
+
+
+class FakeS3(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, page_size=1000, ranges=True):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.objects = {}
+        self.requests = []
+        self.page_size = page_size
+        # Without ranges, a Range is ignored, as some S3 lookalikes do.
+        self.ranges = ranges
+        self.endpoint = 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def put(self, name, body=b'', **headers):
+        self.objects[name] = FakeObject(body, headers)
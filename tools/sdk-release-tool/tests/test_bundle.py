@@ -0,0 +1,193 @@
+from fakes import write
+from fakes3 import FakeS3
+from sdk_release_tools import log
+from sdk_release_tools import util
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+from sdk_release_tools.bundle import (BUNDLE_FILES, MIN_PART_SIZE, Entry,
+                                      Index, build, extract, fetch, parts,
+                                      targets)
+from sdk_release_tools.errors import ReleaseError
+from sdk_release_tools.schema import Schema
+from sdk_release_tools.versions import parse_version
+from unittest import mock
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+PREFIX = 'sdk/js/video/releases/1.0.0/'
+
+FILES = {
+    'twilio-video.js': b'var Video = {};\n' * 1000,
+    'docs/index.html': b'<html></html>',
+    'docs/empty.txt': b'',
+}
+
+
+def test_parts():
+    assert parts(0, 99) == [(0, 99)]
+    assert parts(10, 3 * MIN_PART_SIZE + 9) == [
+        (10, MIN_PART_SIZE + 9),
+        (MIN_PART_SIZE + 10, 2 * MIN_PART_SIZE + 9),
+        (2 * MIN_PART_SIZE + 10, 3 * MIN_PART_SIZE + 9)]
+    assert len(parts(0, 100 * MIN_PART_SIZE - 1, workers=4)) == 4
+
+
+class TestBundle(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        files = []
+        for path, body in sorted(FILES.items()):
+            filename = os.path.join(self.tmp, 'src', path)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'wb') as f:
+                f.write(body)
+            files.append((filename, PREFIX + path))
+        self.filename = os.path.join(self.tmp, '.bundle.zip')
+        self.index = build(files, self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_index(self):
+        assert self.index.size == os.path.getsize(self.filename)
+        index = Index.loads(self.index.dumps())
+        assert [entry.name for entry in index.list(PREFIX + 'docs/')] == [
+            PREFIX + 'docs/empty.txt', PREFIX + 'docs/index.html']
+        entry = index.get(PREFIX + 'twilio-video.js')
+        assert entry.size == len(FILES['twilio-video.js'])
+        assert entry.compressed_size < entry.size
+
+    def test_extract(self):
+        with open(self.filename, 'rb') as f:
+            for path, body in FILES.items():
+                out = os.path.join(self.tmp, 'out', path)
+                extract(f, self.index.get(PREFIX + path), out)
+                assert self.read(out) == body
+
+    def test_corrupt(self):
+        entry = self.index.get(PREFIX + 'twilio-video.js')
+        with open(self.filename, 'r+b') as f:
+            f.seek(entry.end - 1)
+            f.write(b'\0')
+        with open(self.filename, 'rb') as f:
+            with self.assertRaises(ReleaseError):
+                extract(f, entry, os.path.join(self.tmp, 'out.js'))
+
+    def test_targets(self):
+        artifacts = {'twilio-video.js': PREFIX + 'twilio-video.js',
+                     'docs/': PREFIX + 'docs/'}
+        pairs = targets(artifacts, '/out', self.index)
+        assert sorted((entry.name, path) for entry, path in pairs) == [
+            (PREFIX + 'docs/empty.txt', '/out/docs/empty.txt'),
+            (PREFIX + 'docs/index.html', '/out/docs/index.html'),
+            (PREFIX + 'twilio-video.js', '/out/twilio-video.js')]
+        pairs = targets(artifacts, '/out', self.index,
+                        [PREFIX + 'docs/index'])
+        assert [path for _, path in pairs] == ['/out/docs/index.html']
+
+    def test_targets_outside(self):
+        out = os.path.join(self.tmp, 'out')
+        os.makedirs(os.path.join(out, 'docs'))
+        os.symlink(self.tmp, os.path.join(out, 'docs', 'link'))
+        for name in ['docs/../../evil.js', '/etc/passwd', 'docs/link/evil.js']:
+            index = Index(0, [Entry(PREFIX + name, 0, 0, 0, 0, 0)])
+            with self.assertRaises(ReleaseError):
+                targets({'./': PREFIX}, out, index)
+
+    def test_fetch(self):
+        s3 = FakeS3().start()
+        backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                 endpoint=s3.endpoint)
+        try:
+            s3.put(PREFIX + '.bundle.zip', self.read(self.filename))
+            whole = os.path.join(self.tmp, 'whole.zip')
+            fetch(backend, PREFIX + '.bundle.zip', whole, 0,
+                  self.index.size - 1)
+            assert self.read(whole) == self.read(self.filename)
+            # One artifact is one ranged GET of its data.
+            entry = self.index.get(PREFIX + 'twilio-video.js')
+            part = os.path.join(self.tmp, 'part')
+            fetch(backend, PREFIX + '.bundle.zip', part, entry.offset,
+                  entry.end - 1)
+            assert os.path.getsize(part) == entry.compressed_size
+            out = os.path.join(self.tmp, 'twilio-video.js')
+            with open(part, 'rb') as f:
+                extract(f, entry, out, entry.offset)
+            assert self.read(out) == FILES['twilio-video.js']
+        finally:
+            backend.close()
+            s3.stop()
+
+
+class TestPublish(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3().start()
+        self.tmp = tempfile.mkdtemp()
+        self.schema = Schema({
+            'major_minor_versions': 'sdk/js/video/',
+            'versions': 'sdk/js/video/releases/',
+            'artifacts': {'dist/': 'sdk/js/video/releases/{version}/'},
+        }, 'test.json')
+        self.version = parse_version('1.0.0')
+        self.environ = mock.patch.dict(os.environ, {
+            'AWS_TEST_ACCESS_KEY_ID': 'key',
+            'AWS_TEST_SECRET_ACCESS_KEY': 'secret',
+            'AWS_TEST_S3_ENDPOINT': self.s3.endpoint,
+        })
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.s3.stop()
+        shutil.rmtree(self.tmp)
+
+    def upload(self, bundle):
+        with log.redirect(log.JsonLines(io.StringIO())):
+            util.upload('test', self.schema, self.version,
+                        os.path.join(self.tmp, 'upload'), dry_run=False,
+                        backend='asyncio', hash_cache=False, bundle=bundle)
+
+    def download(self):
+        root = os.path.join(self.tmp, 'download')
+        shutil.rmtree(root, ignore_errors=True)
+        with log.redirect(log.JsonLines(io.StringIO())):
+            util.download('test', self.schema, self.version, root,
+                          dry_run=False, backend='asyncio')
+        with open(os.path.join(root, 'dist/a.js'), 'rb') as f:
+            return f.read()
+
+    def bundled(self):
+        return sorted(name for name in self.s3.objects
+                      if os.path.basename(name) in BUNDLE_FILES)
+
+    def test_upload_again_without_bundle(self):
+        write(self.tmp, 'upload/dist/a.js', b'old')
+        self.upload(bundle=True)
+        assert len(self.bundled()) == 2
+        assert self.download() == b'old'
+
+        # As upload -f does; the old bundle must not be downloaded instead.
+        write(self.tmp, 'upload/dist/a.js', b'new')
+        self.upload(bundle=False)
+        assert self.bundled() == []
+        assert self.download() == b'new'
+
+    def test_sync(self):
+        write(self.tmp, 'upload/dist/a.js', b'old')
+        write(self.tmp, 'upload/dist/b.js', b'unchanged')
+        self.upload(bundle=True)
+        write(self.tmp, 'upload/dist/a.js', b'new')
+        with log.redirect(log.JsonLines(io.StringIO())):
+            util.sync('test', self.schema, self.version,
+                      os.path.join(self.tmp, 'upload'), dry_run=False,
+                      backend='asyncio', hash_cache=False, bundle=True)
+        assert self.download() == b'new'
+        # The unchanged artifact is still in the republished bundle.
+        assert os.path.exists(os.path.join(self.tmp, 'download/dist/b.js'))
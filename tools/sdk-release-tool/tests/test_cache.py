@@ -0,0 +1,30 @@
+from sdk_release_tools.cache import Cache
+
+
+def test_get():
+    cache = Cache()
+    cache.enable()
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('a', lambda: 2) == 1
+    cache.discard('a')
+    assert cache.get('a', lambda: 3) == 3
+
+
+def test_disabled():
+    cache = Cache()
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('a', lambda: 2) == 2
+
+
+def test_discard_while_computing():
+    cache = Cache()
+    cache.enable()
+
+    def compute():
+        # Invalidated by a write while it was being read.
+        cache.discard('a')
+        return 'stale'
+
+    assert cache.get('a', compute) == 'stale'
+    assert cache.get('a', lambda: 'fresh') == 'fresh'
+    assert cache.get('a', lambda: 'other') == 'fresh'
@@ -0,0 +1,103 @@
+from fakes3 import FakeS3
+from sdk_release_tools import catalog, log
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+from sdk_release_tools.catalog import Catalog
+from sdk_release_tools.errors import ConflictError
+from sdk_release_tools.versions import parse_major_minor, parse_version
+import io
+import unittest
+
+KEY = 'sdk/js/video/index.json'
+
+
+def test_to_versions():
+    index = Catalog(['1.0.0', '2.0.0', '1.0.1', '1.10.0'],
+                    {'1.0': '1.0.1', '2.0': '2.0.0'}, '2.0.0')
+    ordered_versions, ordered_major_minors, latest = index.to_versions()
+    assert list(ordered_versions) == ['1.0.0', '1.0.1', '1.10.0', '2.0.0']
+    assert ordered_versions['1.0.1'] == parse_major_minor('v1.0')
+    assert ordered_versions['1.0.0'] is None
+    assert ordered_major_minors['2.0'] == parse_version('2.0.0')
+    assert ordered_major_minors['None'] == latest == parse_version('2.0.0')
+
+
+def test_round_trip():
+    index = Catalog(['1.0.0'], {'1.0': '1.0.0'})
+    index.add(parse_version('1.0.1'))
+    index.pin(parse_major_minor('v1.0'), parse_version('1.0.1'))
+    index.pin_latest(parse_version('1.0.1'))
+    index.remove(parse_version('1.0.0'))
+    loaded = Catalog.loads(index.dumps())
+    assert loaded.versions == set(['1.0.1'])
+    assert loaded.pins == {'1.0': '1.0.1'}
+    assert loaded.latest == '1.0.1'
+    loaded.unpin(parse_major_minor('v1.0'))
+    loaded.pin_latest(None)
+    assert Catalog.loads(loaded.dumps()).to_versions()[1:] == ({}, None)
+
+
+class TestUpdate(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3().start()
+        self.backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                      endpoint=self.s3.endpoint)
+
+    def tearDown(self):
+        self.backend.close()
+        self.s3.stop()
+
+    def test_without_index(self):
+        assert Catalog.load(self.backend, KEY) == (None, None)
+        assert catalog.update(self.backend, KEY,
+                              lambda index: index.add('1.0.0')) is None
+        assert KEY not in self.s3.objects
+
+    def test_conditional_save(self):
+        Catalog(['1.0.0']).save(self.backend, KEY)
+        with self.assertRaises(ConflictError):
+            Catalog(['2.0.0']).save(self.backend, KEY)
+        index, etag = Catalog.load(self.backend, KEY)
+        Catalog(['1.0.0', '1.0.1']).save(self.backend, KEY, etag)
+        with self.assertRaises(ConflictError):
+            index.save(self.backend, KEY, etag)
+        assert Catalog.load(self.backend, KEY)[0].versions == set(
+            ['1.0.0', '1.0.1'])
+
+    def test_replace(self):
+        # As rebuild-index writes, whether or not there is an index already.
+        Catalog(['1.0.0']).replace(self.backend, KEY)
+        Catalog(['2.0.0']).replace(self.backend, KEY)
+        assert Catalog.load(self.backend, KEY)[0].versions == set(['2.0.0'])
+
+    def test_retries_concurrent_update(self):
+        Catalog(['1.0.0']).save(self.backend, KEY)
+        calls = []
+
+        def change(index):
+            if not calls:
+                # Another release updates the index between this one's read
+                # and write.
+                Catalog(['1.0.0', '1.0.1']).save(
+                    self.backend, KEY, Catalog.load(self.backend, KEY)[1])
+            calls.append(index)
+            index.add('2.0.0')
+
+        catalog.update(self.backend, KEY, change)
+        assert len(calls) == 2
+        assert Catalog.load(self.backend, KEY)[0].versions == set(
+            ['1.0.0', '1.0.1', '2.0.0'])
+
+    def test_deletes_index_that_keeps_conflicting(self):
+        Catalog(['1.0.0']).save(self.backend, KEY)
+        calls = []
+
+        def change(index):
+            calls.append(index)
+            Catalog(['1.0.{}'.format(len(calls))]).save(
+                self.backend, KEY, Catalog.load(self.backend, KEY)[1])
+            index.add('2.0.0')
+
+        with log.redirect(log.JsonLines(io.StringIO())):
+            assert catalog.update(self.backend, KEY, change) is None
+        assert len(calls) == catalog.ATTEMPTS
+        assert KEY not in self.s3.objects
@@ -0,0 +1,86 @@
+from fakes import write
+from sdk_release_tools import ops
+from sdk_release_tools.backend import Backend
+from sdk_release_tools.compress import Compression
+from sdk_release_tools.errors import ReleaseError
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class MemoryBackend(Backend):
+    def __init__(self):
+        super(MemoryBackend, self).__init__()
+        self.objects = {}
+
+    def list(self, prefix, delimiter=''):
+        return iter([])
+
+    def put_file(self, name, filename, headers=None):
+        with open(filename, 'rb') as f:
+            self.objects[name] = (f.read(), dict(headers or {}))
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.backend = MemoryBackend()
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.tmp)
+
+    def test_from_schema(self):
+        self.assertIsNone(Compression.from_schema({}))
+        self.assertEqual(Compression.from_schema({'compress': 'gzip'}).encoding,
+                         'gzip')
+        compression = Compression.from_schema(
+            {'compress': {'extensions': ['.JS'], 'min_size': 0}})
+        self.assertEqual(compression.extensions, set(['.js']))
+        self.assertEqual(compression.min_size, 0)
+        with self.assertRaises(ReleaseError):
+            Compression.from_schema({'compress': {'extension': ['.js']}})
+
+    def test_matches(self):
+        for name in ['a.JS', 'a.mjs', 'a.xhtml', 'a.png']:
+            write(self.tmp, name, b'1;')
+
+        def matches(compression, name):
+            return compression.matches(os.path.join(self.tmp, name))
+
+        compression = Compression(min_size=0)
+        self.assertTrue(matches(compression, 'a.JS'))
+        # Not a default extension, but JavaScript by its Content-Type.
+        self.assertTrue(matches(compression, 'a.mjs'))
+        self.assertFalse(matches(compression, 'a.png'))
+        by_type = Compression(min_size=0,
+                              content_types=['application/xhtml+xml'])
+        self.assertTrue(matches(by_type, 'a.xhtml'))
+        self.assertFalse(matches(by_type, 'a.JS'))
+        self.assertTrue(compression.matches_content_type(
+            'text/html; charset=utf-8'))
+        self.assertFalse(compression.matches_content_type('image/png'))
+
+    def test_upload(self):
+        script = b'console.log("hello");\n' * 100
+        write(self.tmp, 'dist/a.js', script)
+        write(self.tmp, 'dist/tiny.js', b'1;')
+        write(self.tmp, 'dist/b.png', b'\x89PNG' * 1000)
+        tree = {'dist/': 'releases/{version}/'}
+
+        ops.upload(tree, root=self.tmp, backend=self.backend,
+                   variables={'version': '1.0.0'}, dry_run=False,
+                   compression=Compression(workers=2))
+
+        body, headers = self.backend.objects['releases/1.0.0/a.js']
+        self.assertEqual(gzip.decompress(body), script)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertIn('javascript', headers['Content-Type'])
+        self.assertIn('Cache-Control', headers)
+
+        for name, body in [('tiny.js', b'1;'), ('b.png', b'\x89PNG' * 1000)]:
+            stored, headers = self.backend.objects['releases/1.0.0/' + name]
+            self.assertEqual(stored, body)
+            self.assertNotIn('Content-Encoding', headers)
@@ -0,0 +1,81 @@
+from fakes import write
+from sdk_release_tools.backend import Object
+from sdk_release_tools.compress import Compression, compress_file
+from sdk_release_tools.hashcache import HashCache
+from sdk_release_tools.verify import matches, md5
+from unittest import mock
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class TestHashCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.hashes = HashCache(os.path.join(self.tmp, 'state', 'hashes.db'))
+
+    def tearDown(self):
+        self.hashes.close()
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, body, age=60):
+        path = write(self.tmp, name, body)
+        then = time.time() - age
+        os.utime(path, (then, then))
+        return path
+
+    def test_md5(self):
+        path = self.write('a.js', b'a')
+        assert md5(path, self.hashes) == hashlib.md5(b'a').hexdigest()
+        with mock.patch('sdk_release_tools.verify.read') as read:
+            assert md5(path, self.hashes) == hashlib.md5(b'a').hexdigest()
+            assert not read.called
+
+    def test_changed_file(self):
+        path = self.write('a.js', b'a')
+        md5(path, self.hashes)
+        self.write('a.js', b'b', age=30)
+        assert md5(path, self.hashes) == hashlib.md5(b'b').hexdigest()
+
+    def test_racy_file(self):
+        path = self.write('a.js', b'a', age=0)
+        assert self.hashes.identity(path) is None
+        md5(path, self.hashes)
+        assert self.hashes.evict() == 0
+        count = self.hashes._db.execute('SELECT COUNT(*) FROM hashes')
+        assert count.fetchone()[0] == 0
+
+    def test_matches(self):
+        path = self.write('a.js', b'a')
+        obj = Object('a.js', 1, hashlib.md5(b'a').hexdigest())
+        assert matches(path, obj, hashes=self.hashes)
+        with mock.patch('sdk_release_tools.verify.read') as read:
+            assert matches(path, obj, hashes=self.hashes)
+            assert not matches(path, Object('a.js', 1, 'x'),
+                               hashes=self.hashes)
+            assert not read.called
+
+    def test_matches_compressed(self):
+        path = self.write('a.js', b'a' * 4096)
+        compression = Compression('gzip')
+        uploaded = os.path.join(self.tmp, 'a.js.gz')
+        compress_file('gzip', path, uploaded)
+        obj = Object('a.js', os.path.getsize(uploaded), md5(uploaded))
+        assert matches(path, obj, compression, self.hashes)
+        with mock.patch('sdk_release_tools.compress.compress_file') as comp:
+            assert matches(path, obj, compression, self.hashes)
+            assert not comp.called
+
+    def test_evict(self):
+        self.hashes.max_entries = 2
+        paths = [self.write('{}.js'.format(i), b'x') for i in range(3)]
+        for path in paths:
+            md5(path, self.hashes)
+        # Using the first file makes the second the least recently used.
+        md5(paths[0], self.hashes)
+        assert self.hashes.evict() == 1
+        rows = self.hashes._db.execute('SELECT path FROM hashes')
+        assert sorted(row[0] for row in rows) == [paths[0], paths[2]]
@@ -0,0 +1,72 @@
+from sdk_release_tools.headers import (HeaderRules, canonical, content_type,
+                                       translate)
+import re
+import unittest
+
+
+def matches(pattern, key):
+    return bool(re.match(translate(pattern), key))
+
+
+def test_content_type():
+    assert content_type('a/b.js') == 'application/javascript'
+    assert content_type('b.js.map') == 'application/json'
+    assert content_type('font.WOFF2') == 'font/woff2'
+    assert content_type('data.json') == 'application/json'
+    assert content_type('index.html') == 'text/html'
+    assert content_type('LICENSE') == 'application/octet-stream'
+
+
+def test_canonical():
+    assert canonical('cache-control') == 'Cache-Control'
+    assert canonical('CONTENT-TYPE') == 'Content-Type'
+    assert canonical('X-Amz-Meta-Build') == 'x-amz-meta-build'
+
+
+def test_translate():
+    assert matches('*.html', 'index.html')
+    assert matches('*.html', 'docs/api/index.html')
+    assert not matches('docs/*.html', 'docs/api/index.html')
+    assert matches('docs/**/*.html', 'docs/index.html')
+    assert matches('docs/**/*.html', 'docs/api/index.html')
+    assert matches('docs/**', 'docs/api/index.html')
+    assert matches('app.[0-9a-f]*.js', 'app.3fa9.js')
+    assert not matches('app.?.js', 'app.10.js')
+    assert not matches('*.js', 'app.json')
+
+
+class TestHeaderRules(unittest.TestCase):
+    def setUp(self):
+        self.rules = HeaderRules.from_schema({'headers': {
+            '*.html': {'Cache-Control': 'max-age=300'},
+            '*.min.js': {'x-amz-meta-minified': 'true'},
+            '{product}/assets/**': {'Cache-Control': 'max-age=31536000'},
+            '*.gz': {'Content-Encoding': 'gzip'},
+        }}, {'product': 'video'})
+
+    def test_len(self):
+        self.assertEqual(len(self.rules), 4)
+
+    def test_match(self):
+        self.assertEqual(self.rules.match('video/docs/index.html'),
+                         {'Cache-Control': 'max-age=300'})
+        self.assertEqual(self.rules.match('video/app.min.js'),
+                         {'x-amz-meta-minified': 'true'})
+        self.assertEqual(self.rules.match('video/app.js'), {})
+
+    def test_later_rules_win(self):
+        self.assertEqual(self.rules.match('video/assets/index.html'),
+                         {'Cache-Control': 'max-age=31536000'})
+        self.assertEqual(self.rules.match('video/assets/app.js.gz'),
+                         {'Cache-Control': 'max-age=31536000',
+                          'Content-Encoding': 'gzip'})
+
+    def test_lowercase_names(self):
+        rules = HeaderRules({
+            '*.js': {'cache-control': 'max-age=60'},
+            'assets/**': {'CACHE-CONTROL': 'max-age=31536000',
+                          'content-encoding': 'gzip'},
+        })
+        self.assertEqual(rules.match('assets/app.js'),
+                         {'Cache-Control': 'max-age=31536000',
+                          'Content-Encoding': 'gzip'})
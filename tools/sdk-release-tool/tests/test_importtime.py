@@ -0,0 +1,16 @@
+from sdk_release_tools.importtime import (ACTIONS, DEFAULT_BUDGET_MS,
+                                          forbidden, measure)
+
+
+def test_no_eager_imports():
+    for action in ACTIONS:
+        modules = measure(action)
+        assert 'sdk_release_tools.cli' in modules
+        assert forbidden(modules) == [], action
+
+
+def test_budget():
+    for action in ACTIONS:
+        # The fastest of a few runs, so that a busy machine does not fail it.
+        total = min(sum(measure(action).values()) for _ in range(3)) / 1000.0
+        assert total <= DEFAULT_BUDGET_MS, (action, total)
@@ -0,0 +1,120 @@
+from fakes import write
+from fakes3 import FakeS3
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+from sdk_release_tools.errors import ReleaseError
+from sdk_release_tools.inventory import Inventory, split_location
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+SCHEMA = ('Bucket, Key, VersionId, IsLatest, IsDeleteMarker, Size, '
+          'LastModifiedDate')
+
+ROWS = [
+    ['media', 'sdk/js/video/releases/1.0.0/video.js', 'a', 'true', 'false'],
+    ['media', 'sdk/js/video/v1.0/video.js', 'b', 'true', 'false'],
+    ['media', 'sdk/js/video/v1.0/docs/index.html', 'c', 'true', 'false'],
+    ['media', 'sdk/js/video/v1.0/twilio%20video.js', 'd', 'true', 'false'],
+    ['media', 'sdk/js/video/v1.1/video.js', 'e', 'false', 'false'],
+    ['media', 'sdk/js/video/v1.1/video.js', 'f', 'true', 'true'],
+    ['media', 'sdk/js/video/latest/video.js', 'g', 'true', 'false'],
+    ['media', 'sdk/js/chat/v1.0/chat.js', 'h', 'true', 'false'],
+]
+
+
+def csv_gz(rows):
+    return gzip.compress(''.join(
+        ','.join('"{}"'.format(value) for value in row + ['1', '2023'])
+        + '\n' for row in rows).encode('utf-8'))
+
+
+def manifest(files, file_format='CSV'):
+    return json.dumps({
+        'sourceBucket': 'media',
+        'destinationBucket': 'arn:aws:s3:::inventory',
+        'version': '2016-11-30',
+        'creationTimestamp': '1514944800000',
+        'fileFormat': file_format,
+        'fileSchema': SCHEMA,
+        'files': [{'key': key, 'size': 1, 'MD5checksum': 'x'}
+                  for key in files],
+    }).encode('utf-8')
+
+
+class TestInventory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def local(self):
+        write(self.tmp, 'data/one.csv.gz', csv_gz(ROWS[:4]))
+        write(self.tmp, 'data/two.csv.gz', csv_gz(ROWS[4:]))
+        return Inventory.load(write(
+            self.tmp, '2018-01-03T02-00Z/manifest.json',
+            manifest(['inventory/data/one.csv.gz',
+                      'inventory/data/two.csv.gz'])))
+
+    def test_keys(self):
+        inventory = self.local()
+        assert inventory.created == 1514944800
+        assert sorted(inventory.keys(['sdk/js/video/'])) == [
+            'sdk/js/video/latest/video.js',
+            'sdk/js/video/releases/1.0.0/video.js',
+            'sdk/js/video/v1.0/docs/index.html',
+            'sdk/js/video/v1.0/twilio video.js',
+            'sdk/js/video/v1.0/video.js']
+
+    def test_children(self):
+        assert self.local().children('sdk/js/video/') == {
+            'sdk/js/video/latest/': ['sdk/js/video/latest/video.js'],
+            'sdk/js/video/releases/': [],
+            'sdk/js/video/v1.0/': ['sdk/js/video/v1.0/twilio video.js',
+                                   'sdk/js/video/v1.0/video.js'],
+        }
+
+    def test_missing_data_file(self):
+        inventory = Inventory.load(write(
+            self.tmp, 'manifest.json',
+            manifest(['inventory/data/missing.csv.gz'])))
+        with self.assertRaises(ReleaseError):
+            list(inventory.keys(['sdk/']))
+
+    def test_invalid_manifest(self):
+        with self.assertRaises(ReleaseError):
+            Inventory.load(write(self.tmp, 'manifest.json', b'{"files": []}'))
+        with self.assertRaises(ReleaseError):
+            Inventory.load(write(self.tmp, 'manifest.json',
+                                 manifest([], 'XML')))
+        with self.assertRaises(ReleaseError):
+            Inventory.load(os.path.join(self.tmp, 'missing.json'))
+
+    def test_split_location(self):
+        assert split_location('s3://inventory/media/manifest.json') == (
+            'inventory', 'media/manifest.json')
+        assert split_location('media/manifest.json') == (
+            None, 'media/manifest.json')
+        for location in ['s3://inventory', 's3:///manifest.json']:
+            with self.assertRaises(ReleaseError):
+                split_location(location)
+
+    def test_bucket_key(self):
+        s3 = FakeS3().start()
+        backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                 endpoint=s3.endpoint)
+        try:
+            s3.put('inventory/media/all/data/one.csv.gz', csv_gz(ROWS))
+            s3.put('inventory/media/all/2018-01-03T02-00Z/manifest.json',
+                   manifest(['inventory/media/all/data/one.csv.gz']))
+            inventory = Inventory.load(
+                'inventory/media/all/2018-01-03T02-00Z/manifest.json',
+                backend)
+            assert sorted(inventory.keys(['sdk/js/chat/'])) == [
+                'sdk/js/chat/v1.0/chat.js']
+        finally:
+            backend.close()
+            s3.stop()
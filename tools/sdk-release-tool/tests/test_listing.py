@@ -0,0 +1,67 @@
+from fakes3 import FakeS3
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+from sdk_release_tools.listing import list_sharded, shards
+import unittest
+
+NAMES = [
+    'sdk/js/video/index.json',
+    'sdk/js/video/releases/1.0.0/a.js',
+    'sdk/js/video/releases/1.0.0/docs/b.html',
+    'sdk/js/video/releases/1.0.0/docs/c.html',
+    'sdk/js/video/releases/1.0.0.js',
+    'sdk/js/video/releases/1.0.1/a.js',
+    'sdk/js/video/releases/1.0.10/a.js',
+    'sdk/js/video/releases/2.0.0/a.js',
+    'sdk/js/video/releases/2.0.0/b.js',
+    'sdk/js/video/releases/2.0.0/c.js',
+    'sdk/js/video/v1.0/a.js',
+]
+
+
+class TestListSharded(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3(page_size=2).start()
+        self.backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                      endpoint=self.s3.endpoint)
+        for name in NAMES:
+            self.s3.put(name, name.encode('utf-8'))
+
+    def tearDown(self):
+        self.backend.close()
+        self.s3.stop()
+
+    def names(self, prefix, workers=4):
+        return [obj.name for obj in list_sharded(self.backend, prefix,
+                                                 workers)]
+
+    def test_order(self):
+        expected = [obj.name for obj in self.backend.list('sdk/js/video/')]
+        assert expected == sorted(NAMES)
+        assert self.names('sdk/js/video/') == expected
+        assert self.names('sdk/js/video/', workers=1) == expected
+
+    def test_sizes(self):
+        objects = list(list_sharded(self.backend, 'sdk/js/video/releases/'))
+        assert all(obj.size == len(obj.name) for obj in objects)
+        assert all(obj.etag for obj in objects)
+
+    def test_prefix_without_subprefixes(self):
+        del self.s3.requests[:]
+        assert self.names('sdk/js/video/releases/2.0.0/') == NAMES[7:10]
+        # The delimited listing already found every Object.
+        assert [method for method, _ in self.s3.requests] == ['GET', 'GET']
+
+    def test_descends_lone_subprefixes(self):
+        entries = shards(self.backend, 'sdk/')
+        assert [entry.name for entry in entries] == [
+            'sdk/js/video/index.json', 'sdk/js/video/releases/',
+            'sdk/js/video/v1.0/']
+        assert self.names('sdk/') == sorted(NAMES)
+
+    def test_missing_prefix(self):
+        assert self.names('sdk/android/') == []
+
+    def test_stops_early(self):
+        listing = list_sharded(self.backend, 'sdk/js/video/releases/')
+        assert next(listing).name == 'sdk/js/video/releases/1.0.0.js'
+        listing.close()
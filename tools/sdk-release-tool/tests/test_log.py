@@ -0,0 +1,73 @@
+from sdk_release_tools import log, ops
+from sdk_release_tools.__main__ import run
+from sdk_release_tools.backend import Backend
+from sdk_release_tools.cli import parse_args
+from sdk_release_tools.errors import ReleaseError
+import io
+import json
+import shutil
+import tempfile
+import unittest
+
+
+class MissingBackend(Backend):
+    def head(self, name):
+        return None
+
+
+class TestJsonLines(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+
+    def events(self):
+        return [json.loads(line) for line in
+                self.stream.getvalue().splitlines()]
+
+    def test_messages_and_events(self):
+        with log.redirect(log.JsonLines(self.stream)):
+            self.assertTrue(log.json_output())
+            log.log('a -> b')
+            log.warn('  Updating Key b')
+            log.event('object', src='a', dst='b', size=1)
+        self.assertFalse(log.json_output())
+        self.assertEqual(self.events(), [
+            {'event': 'log', 'level': 'log', 'message': 'a -> b'},
+            {'event': 'log', 'level': 'warn', 'message': '  Updating Key b'},
+            {'event': 'object', 'src': 'a', 'dst': 'b', 'size': 1}])
+
+    def test_events_are_json_only(self):
+        with log.redirect(self.stream):
+            log.event('object', src='a')
+        self.assertEqual(self.stream.getvalue(), '')
+
+    def test_error(self):
+        with log.redirect(log.JsonLines(self.stream)):
+            with self.assertRaises(SystemExit):
+                log.error('Version 1.2.3 does not exist')
+        self.assertEqual(self.events()[0]['level'], 'error')
+
+    def test_run(self):
+        # Without a realm, and failing: every line is JSON, and the last one
+        # says how the action ended.
+        args = parse_args(['unpin', 'missing', '1.0', '--output', 'json'])
+        with log.redirect(self.stream):
+            with self.assertRaises(SystemExit):
+                run(args)
+        events = self.events()
+        self.assertEqual(events[0]['message'],
+                         '  No realm specified, assuming dev')
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertIn('missing', events[-1]['error'])
+
+
+def test_missing_key_raises():
+    tmp = tempfile.mkdtemp()
+    try:
+        ops.download({'a.js': 'releases/{version}/a.js'}, root=tmp,
+                     backend=MissingBackend(), variables={'version': '1.0.0'})
+    except ReleaseError as e:
+        assert str(e) == 'Key releases/1.0.0/a.js does not exist'
+    else:
+        assert False, 'expected a ReleaseError'
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,93 @@
+from fakes3 import FakeS3
+from sdk_release_tools import ops
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+from sdk_release_tools.backend import Object
+from sdk_release_tools.manifest import Manifest, manifest_key, release_prefix
+from sdk_release_tools.verify import compare
+import os
+import shutil
+import tempfile
+import unittest
+
+SCHEMA = {'versions': 'sdk/js/{product}/releases/'}
+VARIABLES = {'product': 'video', 'version': '1.0.0'}
+
+
+def test_manifest_key():
+    assert release_prefix(SCHEMA, VARIABLES) == 'sdk/js/video/releases/1.0.0/'
+    assert manifest_key(SCHEMA, VARIABLES) == (
+        'sdk/js/video/releases/1.0.0/.manifest.json.gz')
+
+
+def test_round_trip():
+    manifest = Manifest('r/1.0.0/', [
+        Object('r/1.0.0/b.js', 2, 'bb', 'application/javascript'),
+        Object('r/1.0.0/a/c.css', 3, 'cc', 'text/css'),
+        Object('elsewhere/d.txt', 4, 'dd')])
+    loaded = Manifest.loads(manifest.dumps())
+    assert loaded.prefix == 'r/1.0.0/'
+    assert [(obj.name, obj.size, obj.etag, obj.content_type)
+            for obj in loaded.list('')] == [
+        ('elsewhere/d.txt', 4, 'dd', None),
+        ('r/1.0.0/a/c.css', 3, 'cc', 'text/css'),
+        ('r/1.0.0/b.js', 2, 'bb', 'application/javascript')]
+    assert loaded.covers('r/1.0.0/a/')
+    assert not loaded.covers('r/')
+    assert [obj.name for obj in loaded.list('r/1.0.0/a/')] == [
+        'r/1.0.0/a/c.css']
+
+
+def test_compare():
+    expected = [Object('a', 1, 'x'), Object('b', 1, 'y'), Object('c', 1, 'z')]
+    actual = [Object('a', 1, 'x'), Object('b', 2, 'y'), Object('d', 1, 'w')]
+    report = compare(expected, actual)
+    assert report.verified == ['a']
+    assert report.mismatched == ['b']
+    assert report.missing == ['c']
+    assert report.extra == ['d']
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3(page_size=2).start()
+        self.backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                      endpoint=self.s3.endpoint)
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.backend.close()
+        self.s3.stop()
+        shutil.rmtree(self.tmp)
+
+    def test_upload_and_download(self):
+        for name in ['a.js', 'lib/b.css']:
+            path = os.path.join(self.tmp, 'dist', name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                f.write(name.encode('utf-8'))
+        tree = {'dist/': 'sdk/js/{product}/releases/{version}/'}
+        key = manifest_key(SCHEMA, VARIABLES)
+
+        manifest = Manifest(release_prefix(SCHEMA, VARIABLES))
+        ops.upload(tree, root=self.tmp, backend=self.backend,
+                   variables=VARIABLES, dry_run=False, manifest=manifest)
+        manifest.save(self.backend, key)
+
+        manifest = Manifest.load(self.backend, key)
+        self.assertEqual(len(manifest), 2)
+        actual = [obj for obj in self.backend.list(manifest.prefix)
+                  if obj.name != key]
+        self.assertTrue(compare(manifest.list(''), actual).ok)
+        self.assertEqual(
+            manifest.get('sdk/js/video/releases/1.0.0/lib/b.css').content_type,
+            'text/css')
+
+        # Downloading reads the Manifest instead of listing.
+        del self.s3.requests[:]
+        ops.download(tree, root=os.path.join(self.tmp, 'download'),
+                     backend=self.backend, variables=VARIABLES,
+                     dry_run=False, manifest=manifest)
+        self.assertEqual(sorted(self.s3.requests), [
+            ('GET', 'sdk/js/video/releases/1.0.0/a.js'),
+            ('GET', 'sdk/js/video/releases/1.0.0/lib/b.css')])
@@ -0,0 +1,95 @@
+from fakes import FakeBucket, routing_rule
+from fakes3 import FakeS3
+from sdk_release_tools import log
+from sdk_release_tools import ops
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+from sdk_release_tools.schema import Schema
+from sdk_release_tools.util import routing_rules_to_migrate
+import io
+import unittest
+
+SCHEMA = {
+    'variables': {'platform': 'js', 'product': 'video'},
+    'major_minor_versions': 'sdk/{platform}/{product}/',
+    'versions': 'sdk/{platform}/{product}/releases/',
+    'artifacts': {
+        'dist/': 'sdk/{platform}/{product}/releases/{version}/',
+    },
+}
+
+DIRECTORY = routing_rule('sdk/js/video/v1.0/',
+                         'sdk/js/video/releases/1.0.1/')
+SINGLE_KEY = routing_rule('sdk/js/video/v1.1/docs',
+                          'sdk/js/video/releases/1.1.0/docs/js')
+OTHER_HOST = routing_rule('sdk/js/video/v0.9/', 'sdk/js/video/v0.9/',
+                          hostname='example.com')
+OTHER_PRODUCT = routing_rule('sdk/js/chat/v1.0/',
+                             'sdk/js/chat/releases/1.0.0/')
+
+
+class TestMigrate(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3().start()
+        self.backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                      endpoint=self.s3.endpoint)
+        self.bucket = FakeBucket([DIRECTORY, SINGLE_KEY, OTHER_HOST,
+                                  OTHER_PRODUCT])
+        self.website = ops.WebsiteConfiguration(self.bucket)
+
+    def tearDown(self):
+        self.backend.close()
+        self.s3.stop()
+
+    def test_rules_to_migrate(self):
+        output = io.StringIO()
+        with log.redirect(log.JsonLines(output)):
+            rules = routing_rules_to_migrate(self.website,
+                                             Schema(SCHEMA, 'test.json'))
+        # Neither the rule to another host nor the other product's.
+        assert list(rules.items()) == [
+            ('sdk/js/video/v1.0/', 'sdk/js/video/releases/1.0.1/'),
+            ('sdk/js/video/v1.1/docs', 'sdk/js/video/releases/1.1.0/docs/js')]
+        assert 'Skipping RoutingRule for sdk/js/video/v0.9/' in \
+            output.getvalue()
+
+    def migrate(self, rules):
+        output = io.StringIO()
+        with log.redirect(log.JsonLines(output)):
+            ops.migrate(rules, backend=self.backend, website=self.website,
+                        dry_run=False)
+        self.website.commit(False)
+        return output.getvalue()
+
+    def test_directory(self):
+        self.s3.put('sdk/js/video/releases/1.0.1/video.js', b'a')
+        self.s3.put('sdk/js/video/releases/1.0.1/docs/index.html', b'b')
+        for name in ['.manifest.json.gz', '.bundle.zip', '.bundle.json']:
+            self.s3.put('sdk/js/video/releases/1.0.1/' + name, b'c')
+        self.migrate({DIRECTORY.condition.key_prefix:
+                      DIRECTORY.redirect.replace_key_prefix})
+        assert sorted(name for name in self.s3.objects
+                      if name.startswith('sdk/js/video/v1.0/')) == [
+            'sdk/js/video/v1.0/docs/index.html', 'sdk/js/video/v1.0/video.js']
+        assert self.backend.get_redirect('sdk/js/video/v1.0/video.js') == \
+            '/sdk/js/video/releases/1.0.1/video.js'
+        assert self.backend.get_redirect(
+            'sdk/js/video/v1.0/docs/index.html') == \
+            '/sdk/js/video/releases/1.0.1/docs/index.html'
+        assert DIRECTORY not in self.bucket.routing_rules
+        assert SINGLE_KEY in self.bucket.routing_rules
+
+    def test_single_key(self):
+        # The replacement is a directory, served by its index document, so
+        # there is no Key to list; the rule's own key is redirected.
+        self.migrate({SINGLE_KEY.condition.key_prefix:
+                      SINGLE_KEY.redirect.replace_key_prefix})
+        assert self.backend.get_redirect('sdk/js/video/v1.1/docs') == \
+            '/sdk/js/video/releases/1.1.0/docs/js'
+        assert SINGLE_KEY not in self.bucket.routing_rules
+
+    def test_no_keys(self):
+        output = self.migrate({DIRECTORY.condition.key_prefix:
+                               DIRECTORY.redirect.replace_key_prefix})
+        assert 'keeping RoutingRule' in output
+        assert DIRECTORY in self.bucket.routing_rules
+        assert not self.bucket.configured
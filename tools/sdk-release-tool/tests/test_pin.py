@@ -0,0 +1,112 @@
+from concurrent.futures import Future
+from fakes import FakeBucket
+from fakes3 import FakeS3
+from sdk_release_tools import log
+from sdk_release_tools import ops
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+from sdk_release_tools.versions import parse_major_minor
+from unittest import mock
+import io
+import json
+import threading
+import time
+import unittest
+
+TREE = {'v1.0/a.js': 'releases/1.0.1/a.js',
+        'v1.0/b.js': 'releases/1.0.1/b.js',
+        'v1.0/c.js': 'releases/1.0.1/c.js'}
+
+
+class FailingBackend(object):
+    """
+    Writes redirects after a delay, except that the one for fail raises at
+    once. written records the redirects written.
+    """
+    def __init__(self, backend, fail):
+        self.backend = backend
+        self.fail = fail
+        self.written = []
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def submit(self, method, *args):
+        if method != 'set_redirect':
+            return self.backend.submit(method, *args)
+        future = Future()
+        if args[0] == self.fail:
+            future.set_exception(IOError('Cannot write {}'.format(args[0])))
+            return future
+
+        def write():
+            time.sleep(0.2)
+            self.backend.set_redirect(*args)
+            self.written.append(args[0])
+            future.set_result(None)
+
+        threading.Thread(target=write).start()
+        return future
+
+
+class TestPin(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3().start()
+        self.backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                      endpoint=self.s3.endpoint)
+        self.website = ops.WebsiteConfiguration(FakeBucket())
+
+    def tearDown(self):
+        self.backend.close()
+        self.s3.stop()
+
+    def writes(self):
+        return sorted(request for request in self.s3.requests
+                      if request[0] != 'GET')
+
+    def pin(self, backend=None):
+        output = io.StringIO()
+        with log.redirect(log.JsonLines(output)):
+            ops.pin(TREE, backend=backend or self.backend,
+                    website=self.website,
+                    major_minor=parse_major_minor('1.0'), dry_run=False)
+        return output.getvalue()
+
+    def test_pin(self):
+        self.backend.set_redirect('v1.0/a.js', '/releases/1.0.0/a.js')
+        self.backend.set_redirect('v1.0/b.js', '/releases/1.0.1/b.js')
+        del self.s3.requests[:]
+        self.pin()
+        assert self.writes() == [('HEAD', 'v1.0/a.js'), ('HEAD', 'v1.0/b.js'),
+                                 ('HEAD', 'v1.0/c.js'), ('PUT', 'v1.0/a.js'),
+                                 ('PUT', 'v1.0/c.js')]
+        assert self.backend.get_redirect('v1.0/c.js') == '/releases/1.0.1/c.js'
+
+        del self.s3.requests[:]
+        assert 'Already pinned' in self.pin()
+        assert [method for method, _ in self.s3.requests] == ['HEAD'] * 3
+        assert not self.website.bucket.configured
+
+    def test_failed_write(self):
+        # The other writes still finish before the first error is raised.
+        backend = FailingBackend(self.backend, 'v1.0/b.js')
+        with self.assertRaises(IOError):
+            self.pin(backend)
+        assert sorted(backend.written) == ['v1.0/a.js', 'v1.0/c.js']
+        assert self.backend.get_redirect('v1.0/c.js') == '/releases/1.0.1/c.js'
+
+    def test_unpin(self):
+        self.pin()
+        limits = mock.Mock()
+        output = io.StringIO()
+        with log.redirect(log.JsonLines(output)):
+            ops.unpin({'v1.0/a.js': 'releases/1.0.1/a.js',
+                       'v1.0/d.js': 'releases/1.0.1/d.js'},
+                      backend=self.backend, website=self.website,
+                      major_minor=parse_major_minor('1.0'), dry_run=False,
+                      limits=limits)
+        assert 'v1.0/a.js' not in self.s3.objects
+        # A HEAD of each redirect, and the one DELETE.
+        assert limits.acquire.call_count == 3
+        assert {'event': 'log', 'level': 'warn',
+                'message': '  Redirect v1.0/d.js does not exist'} in [
+            json.loads(line) for line in output.getvalue().splitlines()]
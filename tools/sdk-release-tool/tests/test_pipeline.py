@@ -0,0 +1,110 @@
+from sdk_release_tools.pipeline import pipeline
+
+import threading
+import time
+import unittest
+
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate()
+            if thread.name.startswith('pipeline-')]
+
+
+def wait_for_threads(timeout=5):
+    deadline = time.time() + timeout
+    while pipeline_threads() and time.time() < deadline:
+        time.sleep(0.05)
+    return pipeline_threads()
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_stages(self):
+        def double(items):
+            for item in items:
+                yield item * 2
+
+        def increment(items):
+            for item in items:
+                yield item + 1
+
+        result = list(pipeline(iter(range(100)), [double, increment],
+                               maxsize=2))
+        self.assertEqual(result, [i * 2 + 1 for i in range(100)])
+
+    def test_bounded(self):
+        # A slow consumer holds back the source rather than letting it
+        # enumerate everything into memory.
+        produced = []
+        release = threading.Event()
+
+        def items():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        def last(items):
+            for item in items:
+                release.wait()
+                yield item
+
+        results = pipeline(items(), [lambda items: items, last], maxsize=2)
+        first = []
+        thread = threading.Thread(target=lambda: first.append(next(results)))
+        thread.start()
+        thread.join(0.5)
+        self.assertLess(len(produced), 10)
+        release.set()
+        thread.join()
+        self.assertEqual(first, [0])
+        self.assertEqual(list(results), list(range(1, 100)))
+
+    def test_error(self):
+        def fail(items):
+            for item in items:
+                if item == 5:
+                    raise ValueError('boom')
+                yield item
+
+        with self.assertRaises(ValueError):
+            list(pipeline(iter(range(10)), [fail, lambda items: items]))
+
+    def test_base_exception(self):
+        def exit(items):
+            for item in items:
+                if item == 5:
+                    raise SystemExit(1)
+                yield item
+
+        with self.assertRaises(SystemExit):
+            list(pipeline(iter(range(10)), [exit, lambda items: items]))
+        self.assertEqual(wait_for_threads(), [])
+
+    def test_abort(self):
+        # The consumer stops partway; stages blocked on their queues, in
+        # either direction, must still exit.
+        def identity(items):
+            for item in items:
+                yield item
+
+        results = pipeline(iter(range(10000)),
+                           [identity, identity, identity], maxsize=2)
+        self.assertEqual([next(results) for _ in range(3)], [0, 1, 2])
+        results.close()
+        self.assertEqual(wait_for_threads(), [])
+
+        # A stage waiting on a source that has nothing yet.
+        waiting = threading.Event()
+
+        def slow():
+            yield 0
+            waiting.wait()
+            yield 1
+
+        results = pipeline(slow(), [identity, identity], maxsize=2)
+        self.assertEqual(next(results), 0)
+        results.close()
+        threads = pipeline_threads()
+        waiting.set()
+        self.assertEqual(wait_for_threads(), [])
+        self.assertTrue(threads)
@@ -0,0 +1,92 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from sdk_release_tools import log
+from sdk_release_tools.prewarm import fetch_all, percentile, urls
+from socketserver import ThreadingMixIn
+import io
+import threading
+import unittest
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path.startswith('/sdk/js/video/v1.0/'):
+            self.send_response(301)
+            self.send_header('Location', self.path.replace(
+                'v1.0', 'releases/1.0.1'))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path.startswith('/sdk/js/video/releases/1.0.1/'):
+            body = b'x' * 100000
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+
+class CDN(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def test_urls():
+    assert urls('https://media.twiliocdn.com/', [
+        'sdk/js/video/v1.0/twilio video.js', '/sdk/js/video/latest/a.js'
+    ]) == ['https://media.twiliocdn.com/sdk/js/video/v1.0/twilio%20video.js',
+           'https://media.twiliocdn.com/sdk/js/video/latest/a.js']
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3], 90) == 3
+    assert percentile([], 50) is None
+
+
+class TestFetchAll(unittest.TestCase):
+    def setUp(self):
+        self.cdn = CDN(('127.0.0.1', 0), Handler)
+        self.cdn.requests = []
+        self.thread = threading.Thread(target=self.cdn.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base_url = 'http://127.0.0.1:{}'.format(self.cdn.server_port)
+
+    def tearDown(self):
+        self.cdn.shutdown()
+        self.cdn.server_close()
+
+    def test_fetch_all(self):
+        names = ['sdk/js/video/v1.0/a.js'] + [
+            'sdk/js/video/releases/1.0.1/{}.js'.format(i) for i in range(20)]
+        report = fetch_all(urls(self.base_url, names), workers=4)
+        assert report.ok
+        assert report.statuses == {301: 1, 200: 20}
+        # Redirects are fetched, not followed.
+        assert sorted(self.cdn.requests) == sorted('/' + name
+                                                   for name in names)
+        percentiles = report.percentiles()
+        assert 0 < percentiles['p50'] <= percentiles['p90'] <= \
+            percentiles['p99']
+        assert report.summary().startswith('21 fetched (20 200, 1 301); p50 ')
+
+    def test_failures(self):
+        names = ['sdk/js/video/releases/1.0.1/a.js',
+                 'sdk/js/video/releases/1.0.0/a.js']
+        output = io.StringIO()
+        with log.redirect(log.JsonLines(output)):
+            report = fetch_all(urls(self.base_url, names) +
+                               ['http://127.0.0.1:1/unreachable.js'])
+        assert not report.ok
+        assert [fetch.url for fetch in report.failed] == [
+            self.base_url + '/sdk/js/video/releases/1.0.0/a.js',
+            'http://127.0.0.1:1/unreachable.js']
+        assert report.statuses == {200: 1, 404: 1, 'error': 1}
+        assert '404 ' + self.base_url in output.getvalue()
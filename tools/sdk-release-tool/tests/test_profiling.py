@@ -0,0 +1,85 @@
+from sdk_release_tools import log
+from sdk_release_tools.profiling import classify, in_flight, profiled
+import io
+import json
+import os
+import queue
+import selectors
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+
+class TestSampler(unittest.TestCase):
+    def test_classify(self):
+        waiting = queue.Queue()
+        frames = []
+
+        def worker():
+            frames.append(sys._getframe())
+            waiting.get()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.05)
+        try:
+            frame = sys._current_frames()[thread.ident]
+            self.assertEqual(classify(frame), 'waiting')
+            self.assertEqual(classify(sys._getframe()), 'cpu')
+        finally:
+            waiting.put(None)
+            thread.join()
+
+    def test_classify_select(self):
+        # An event loop waiting in select is idle unless a request is in
+        # flight.
+        selector = selectors.DefaultSelector()
+        reader, writer = socket.socketpair()
+        selector.register(reader, selectors.EVENT_READ)
+        thread = threading.Thread(target=selector.select)
+        thread.start()
+        time.sleep(0.05)
+        try:
+            frame = sys._current_frames()[thread.ident]
+            self.assertEqual(classify(frame), 'idle')
+            with in_flight:
+                self.assertEqual(classify(frame), 's3 i/o')
+        finally:
+            writer.send(b'x')
+            thread.join()
+            selector.close()
+            reader.close()
+            writer.close()
+
+    def test_profiled(self):
+        tmp = tempfile.mkdtemp()
+        release = threading.Event()
+        thread = threading.Thread(target=release.wait, name='worker')
+        try:
+            prefix = os.path.join(tmp, 'profile')
+            output = io.StringIO()
+            with log.redirect(log.JsonLines(output)):
+                with profiled(prefix):
+                    thread.start()
+                    time.sleep(0.1)
+                    release.set()
+                    thread.join()
+            event = json.loads(output.getvalue().splitlines()[-1])
+            self.assertEqual(event['event'], 'profile')
+            self.assertGreater(event['wall'], 0.05)
+            for extension in ['.prof', '.collapsed', '.txt']:
+                self.assertTrue(os.path.exists(prefix + extension))
+            with open(prefix + '.collapsed') as f:
+                stacks = f.read().splitlines()
+            self.assertTrue(any(stack.startswith('worker;') for stack in stacks))
+            self.assertTrue(all(stack.rsplit(' ', 1)[1].isdigit()
+                                for stack in stacks))
+            with open(prefix + '.txt') as f:
+                self.assertIn('waiting', f.read())
+        finally:
+            release.set()
+            shutil.rmtree(tmp)
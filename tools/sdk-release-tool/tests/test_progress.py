@@ -0,0 +1,64 @@
+from sdk_release_tools import ops
+from sdk_release_tools.backend import Backend
+from sdk_release_tools.progress import Progress, format_size
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def test_format_size():
+    assert format_size(12) == '12 B'
+    assert format_size(1536) == '1.5 KB'
+    assert format_size(3 * 1024 ** 3) == '3.0 GB'
+
+
+class EmptyBackend(Backend):
+    def list(self, prefix, delimiter=''):
+        return iter([])
+
+
+class TestProgress(unittest.TestCase):
+    def test_tty(self):
+        stream = io.StringIO()
+        progress = Progress(stream, tty=True)
+        list(progress.track(iter([])))
+        progress.add(2, 2048)
+        progress.update(1, 1024)
+        progress.close()
+        output = stream.getvalue()
+        self.assertIn('\r', output)
+        self.assertTrue(output.endswith('1/2 files, 1.0 KB/2.0 KB in 0s\n'))
+
+    def test_quiet_unless_verbose(self):
+        stream = io.StringIO()
+        Progress(stream).log('a -> b')
+        self.assertEqual(stream.getvalue(), '')
+        Progress(stream, verbose=True).log('a -> b')
+        self.assertEqual(stream.getvalue(), 'a -> b\n')
+
+    def test_totals_grow_while_enumerating(self):
+        stream = io.StringIO()
+        progress = Progress(stream)
+        items = progress.track(iter([1, 2, 3]))
+        next(items)
+        self.assertEqual(progress._line(), '0/1+ files, 0 B/0 B+')
+        list(items)
+        self.assertEqual(progress._line(), '0/3 files, 0 B/0 B')
+
+    def test_dry_run(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            for name in ['a.js', 'b.js']:
+                with open(os.path.join(tmp, name), 'wb') as f:
+                    f.write(b'12345')
+            stream = io.StringIO()
+            progress = Progress(stream)
+            ops.upload({'./': 'releases/{version}/'}, root=tmp,
+                       backend=EmptyBackend(), variables={'version': '1.0.0'}, progress=progress)
+            progress.close()
+            self.assertEqual(stream.getvalue(),
+                             '2/2 files, 10 B/10 B in 0s\n')
+        finally:
+            shutil.rmtree(tmp)
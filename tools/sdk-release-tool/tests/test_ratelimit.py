@@ -0,0 +1,74 @@
+from sdk_release_tools import ops
+from sdk_release_tools.backend import Object
+from sdk_release_tools.ratelimit import RateLimits, TokenBucket, parse_rate
+import threading
+import time
+import unittest
+
+
+def test_parse_rate():
+    assert parse_rate('500') == 500
+    assert parse_rate('512k') == 512 * 1024
+    assert parse_rate('1.5M') == 1.5 * 1024 * 1024
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst(self):
+        bucket = TokenBucket(10)
+        start = time.monotonic()
+        for _ in range(10):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_rate_across_threads(self):
+        bucket = TokenBucket(100, burst=1)
+        bucket.acquire()
+        start = time.monotonic()
+        threads = [threading.Thread(target=lambda: [bucket.acquire()
+                                                    for _ in range(5)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 20 more tokens at 100 per second take about 0.2 seconds.
+        self.assertGreater(time.monotonic() - start, 0.18)
+
+    def test_debt(self):
+        bucket = TokenBucket(1000)
+        self.assertEqual(bucket.acquire(1000), 0)
+        self.assertAlmostEqual(bucket.acquire(100), 0.1, delta=0.02)
+
+    def test_limits(self):
+        self.assertFalse(RateLimits())
+        limits = RateLimits(bandwidth=1000, request_rate=1000)
+        self.assertTrue(limits)
+        limits.acquire(500)
+        self.assertLessEqual(limits.bandwidth.tokens, 500)
+
+
+class RecordingLimits(RateLimits):
+    def __init__(self):
+        super(RecordingLimits, self).__init__(request_rate=1000)
+        self.sizes = []
+
+    def acquire(self, size=0):
+        self.sizes.append(size)
+
+
+class SubmittingBackend(object):
+    def submit(self, method, *args):
+        return None
+
+
+def test_transfer_sizes():
+    # Only transfers that move an object's bytes count them against the
+    # bandwidth; deletes and redirects are single small requests.
+    obj = Object('sdk/js/video/releases/1.0.0/video.js', 1000)
+    for op, size in [(ops.Delete, 0), (ops.Migrate, 0), (ops.Download, 1000)]:
+        limits = RecordingLimits()
+        context = ops.Context(backend=SubmittingBackend(), dry_run=False,
+                              limits=limits)
+        transfers = [ops.Transfer(obj.name, 'dst', obj)]
+        list(op({})._transfer(transfers, context))
+        assert limits.sizes == [size], op
@@ -0,0 +1,76 @@
+from sdk_release_tools.rules import RoutingRuleIndex
+from sdk_release_tools.versions import parse_major_minor, parse_version
+import unittest
+
+
+class Condition(object):
+    def __init__(self, key_prefix):
+        self.key_prefix = key_prefix
+
+
+class Redirect(object):
+    def __init__(self, replace_key_prefix):
+        self.replace_key_prefix = replace_key_prefix
+
+
+class Rule(object):
+    def __init__(self, key_prefix, replace_key_prefix):
+        self.condition = Condition(key_prefix)
+        self.redirect = Redirect(replace_key_prefix)
+
+
+class TestRoutingRuleIndex(unittest.TestCase):
+    def setUp(self):
+        self.rules = [
+            Rule('sdk/js/video/v1.0/', 'sdk/js/video/releases/1.0.2/'),
+            Rule('sdk/js/video/v1.1/', 'sdk/js/video/releases/1.1.0/'),
+            Rule('sdk/js/video/latest/', 'sdk/js/video/releases/1.1.0/'),
+            Rule('sdk/js/chat/v1.0/', 'sdk/js/chat/releases/1.0.0/'),
+            Rule(None, 'errors/'),
+        ]
+        self.index = RoutingRuleIndex(self.rules)
+
+    def test_len(self):
+        assert len(self.index) == 4
+
+    def test_parsed(self):
+        entries = self.index.match('sdk/js/video/v1.0/video.js')
+        assert len(entries) == 1
+        assert entries[0].major_minor == parse_major_minor('1.0')
+        assert entries[0].version == parse_version('1.0.2')
+        latest = self.index.match('sdk/js/video/latest/video.js')[0]
+        assert latest.major_minor is None
+        assert latest.version == parse_version('1.1.0')
+
+    def test_match(self):
+        assert self.index.match('sdk/js/video/v1.2/video.js') == []
+        assert self.index.match('sdk/js/video/v1.0') == []
+        assert [entry.rule for entry in
+                self.index.match('sdk/js/chat/v1.0/chat.js')] == [
+                    self.rules[3]]
+
+    def test_match_all(self):
+        keys = [
+            'sdk/js/video/v1.1/video.min.js',
+            'sdk/js/video/v1.0/video.js',
+            'sdk/js/video/v1.0/',
+            'sdk/js/chat/v2.0/chat.js',
+            'sdk/js/video/v1.1/video.js',
+        ]
+        matches = self.index.match_all(keys)
+        assert list(matches.keys()) == keys
+        for key in keys:
+            assert ([entry.rule for entry in matches[key]] ==
+                    [entry.rule for entry in self.index.match(key)])
+
+    def test_under(self):
+        assert len(self.index.under('sdk/js/video/')) == 3
+        assert len(self.index.under('sdk/js/')) == 4
+        assert self.index.under('sdk/ios/') == []
+
+    def test_remove(self):
+        assert self.index.remove(self.rules[0])
+        assert not self.index.remove(self.rules[0])
+        assert not self.index.remove(self.rules[4])
+        assert len(self.index) == 3
+        assert self.index.match('sdk/js/video/v1.0/video.js') == []
@@ -0,0 +1,143 @@
+from fakes import write
+from sdk_release_tools.errors import ReleaseError
+from sdk_release_tools.schema import Schema, Template, load_schema
+from sdk_release_tools.versions import MajorMinor, parse_version
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+SCHEMA = {
+    'variables': {'platform': 'js', 'product': 'video'},
+    'major_minor_versions': 'sdk/{platform}/{product}/',
+    'versions': 'sdk/{platform}/{product}/releases/',
+    'artifacts': {
+        'dist/': 'sdk/{platform}/{product}/releases/{version}/',
+    },
+    'pin': {
+        'sdk/{platform}/{product}/v{major}.{minor}':
+            'sdk/{platform}/{product}/releases/{version}',
+    },
+}
+
+
+def schema(**sections):
+    data = dict(SCHEMA)
+    data.update(sections)
+    return Schema(data, 'test.json')
+
+
+class TestTemplate(unittest.TestCase):
+
+    def test_render(self):
+        template = Template('a/{major}.{minor}/b')
+        self.assertEqual(template.variables, set(['major', 'minor']))
+        self.assertEqual(template.render({'major': 1, 'minor': 2}), 'a/1.2/b')
+        self.assertEqual(Template('a/{{b}}').render({}), 'a/{b}')
+        self.assertEqual(Template('a/{{b}}/{c}').render({'c': 'd'}), 'a/{b}/d')
+
+    def test_invalid(self):
+        for template in ['a/{b', 'a/{b.c}', 'a/{b!r}', 'a/{b:>3}', 'a/{}']:
+            self.assertRaises(ReleaseError, Template, template)
+
+    def test_undefined(self):
+        self.assertRaises(ReleaseError, Template('{patch}').render,
+                          {'major': 1})
+
+
+class TestSchema(unittest.TestCase):
+
+    def test_dirs(self):
+        s = schema()
+        self.assertEqual(s.versions_dir, 'sdk/js/video/releases/')
+        self.assertEqual(s.major_minor_versions_dir, 'sdk/js/video/')
+
+    def test_render(self):
+        s = schema()
+        version = parse_version('1.2.3')
+        self.assertEqual(dict(s.render('artifacts', version)),
+                         {'dist/': 'sdk/js/video/releases/1.2.3/'})
+        self.assertEqual(dict(s.render('pin', version)),
+                         {'sdk/js/video/v1.2': 'sdk/js/video/releases/1.2.3'})
+        self.assertEqual(dict(s.render('latest', version)), {})
+        self.assertIs(s.render('pin', version),
+                      s.render('pin', parse_version('1.2.3')))
+        with self.assertRaises(TypeError):
+            s.render('pin', version)['a'] = 'b'
+
+    def test_variables_do_not_leak(self):
+        s = schema()
+        variables = s.variables(parse_version('1.2.3'))
+        self.assertEqual(variables['version'], '1.2.3')
+        self.assertEqual(variables['product'], 'video')
+        self.assertNotIn('version', s.get('variables'))
+        self.assertEqual(s.variables(MajorMinor(1, 2))['version'], '1.2')
+
+    def test_missing_section(self):
+        data = dict(SCHEMA)
+        del data['versions']
+        self.assertRaises(ReleaseError, Schema, data)
+
+    def test_malformed_section(self):
+        self.assertRaises(ReleaseError, schema, artifacts=['dist/'])
+        self.assertRaises(ReleaseError, schema, pin={'a': 1})
+
+    def test_compress_and_headers(self):
+        schema(compress='gzip', headers={'*.{product}.js': {'A': 'b'}})
+        schema(compress={'encoding': 'br', 'extensions': ['.js'],
+                         'min_size': 0})
+        for sections in [
+                {'compress': ['gzip']},
+                {'compress': {'extension': ['.js']}},
+                {'compress': {'min_size': '1024'}},
+                {'compress': {'content_types': 'text/*'}},
+                {'headers': ['*.js']},
+                {'headers': {'*.js': 'max-age=300'}},
+                {'headers': {'*.js': {'Cache-Control': 300}}},
+                {'headers': {'*.{prodcut}.js': {'A': 'b'}}}]:
+            self.assertRaises(ReleaseError, schema, **sections)
+
+    def test_undefined_variable(self):
+        self.assertRaises(ReleaseError, schema, versions='sdk/{platfrom}/')
+        self.assertRaises(ReleaseError, schema, versions='sdk/{version}/')
+        self.assertRaises(ReleaseError, schema,
+                          latest={'sdk/latest': 'sdk/{versoin}'})
+
+    def test_overlapping_artifacts(self):
+        version = parse_version('1.2.3')
+        # Overlapping for every version: the schema is rejected on loading.
+        for artifacts in [
+                {'a.js': 'r/{version}/a.js', 'b.js': 'r/{version}/a.js'},
+                {'dist/': 'r/{version}/', 'docs/': 'r/{version}/docs/'},
+                {'dist/': 'r/{platform}/', 'docs/': 'r/js/docs/'}]:
+            self.assertRaises(ReleaseError, schema, artifacts=artifacts)
+        # Different templates, the same keys once rendered.
+        self.assertRaises(ReleaseError, schema(artifacts={
+            'a.js': 'r/{version}/a.js',
+            'b.js': 'r/{major}.{minor}.{patch}/a.js'}).render,
+            'artifacts', version)
+        artifacts = schema(artifacts={'dist/': 'r/{version}/dist/',
+                                      'docs/': 'r/{version}/docs/'}).render(
+            'artifacts', version)
+        self.assertEqual(len(artifacts), 2)
+
+
+class TestLoadSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_load(self):
+        path = write(self.root, 'video.json', json.dumps(SCHEMA))
+        self.assertEqual(load_schema(path[:-len('.json')]).versions_dir,
+                         'sdk/js/video/releases/')
+
+    def test_invalid(self):
+        self.assertRaises(ReleaseError, load_schema,
+                          write(self.root, 'bad.json', '{'))
+        self.assertRaises(ReleaseError, load_schema,
+                          os.path.join(self.root, 'missing'))
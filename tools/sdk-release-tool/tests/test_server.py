@@ -0,0 +1,92 @@
+from argparse import Namespace
+from sdk_release_tools import client, log, server
+import sdk_release_tools.__main__ as main_module
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+SCHEMA = {
+    'variables': {'platform': 'js', 'product': 'video'},
+    'major_minor_versions': 'sdk/{platform}/{product}/',
+    'versions': 'sdk/{platform}/{product}/releases/',
+    'artifacts': {
+        'dist/': 'sdk/{platform}/{product}/releases/{version}/',
+    },
+}
+
+
+def write_schema(directory):
+    path = os.path.join(directory, 'twilio-video.json')
+    with open(path, 'w') as f:
+        json.dump(SCHEMA, f)
+    return path
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'test.sock')
+        self.server = server.Server(self.path)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.run_locally = main_module.run
+
+    def tearDown(self):
+        main_module.run = self.run_locally
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def request(self, **kwargs):
+        args = Namespace(action='list', realm='dev',
+                         product=write_schema(self.tmp))
+        vars(args).update(kwargs)
+        return client.request(args, self.path)
+
+    def test_output_and_exit(self):
+        def run(args):
+            log.log('{} {} {}'.format(args.action, args.realm, args.product))
+        main_module.run = run
+        assert self.request() == 0
+
+    def test_error(self):
+        def run(args):
+            raise Exception('Version 1.2.3 does not exist')
+        main_module.run = run
+        assert self.request() == 1
+
+    def test_rejects_interactive_delete(self):
+        main_module.run = lambda args: None
+        assert self.request(action='delete', silent=False) == 1
+        assert self.request(action='delete', silent=True) == 0
+
+    def test_socket_is_private(self):
+        assert os.stat(self.path).st_mode & 0o777 == 0o600
+
+    def test_no_server(self):
+        assert client.request(Namespace(action='list'),
+                              os.path.join(self.tmp, 'missing.sock')) is None
+
+
+def test_lock_keys():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = write_schema(tmp)
+        product = ('dev', 'dev.twiliocdn.com', 'sdk/js/video/releases/')
+        assert server.lock_keys(Namespace(action='list', realm='dev',
+                                          product=path)) == []
+        assert server.lock_keys(Namespace(action='upload', realm='dev',
+                                          product=path)) == [product]
+        # However the product is named, it is the same product.
+        assert server.lock_keys(Namespace(
+            action='upload', realm='dev',
+            product=os.path.relpath(path[:-len('.json')]))) == [product]
+        assert server.lock_keys(Namespace(action='pin', realm='dev',
+                                          product=path)) == [product,
+                                                             ('dev', None)]
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,58 @@
+from fakes import write
+from fakes3 import FakeS3
+from sdk_release_tools import log
+from sdk_release_tools import ops
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        self.s3 = FakeS3().start()
+        self.backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                      endpoint=self.s3.endpoint)
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.backend.close()
+        self.s3.stop()
+        shutil.rmtree(self.tmp)
+
+    def writes(self):
+        return sorted(request for request in self.s3.requests
+                      if request[0] != 'GET')
+
+    def test_sync(self):
+        write(self.tmp, 'dist/a.js', b'a')
+        write(self.tmp, 'dist/b.js', b'b')
+        write(self.tmp, 'dist/lib/c.js', b'c')
+        tree = {'dist/': 'releases/1.0.0/'}
+        ops.upload(tree, root=self.tmp, backend=self.backend, dry_run=False)
+
+        write(self.tmp, 'dist/b.js', b'changed')
+        write(self.tmp, 'dist/d.js', b'd')
+        os.remove(os.path.join(self.tmp, 'dist/lib/c.js'))
+        del self.s3.requests[:]
+        # Log as JSON lines, which does not need clint for warnings.
+        output = io.StringIO()
+        with log.redirect(log.JsonLines(output)):
+            ops.sync(tree, root=self.tmp, backend=self.backend,
+                     dry_run=False)
+        assert self.writes() == [('PUT', 'releases/1.0.0/b.js'),
+                                 ('PUT', 'releases/1.0.0/d.js')]
+        assert self.s3.objects['releases/1.0.0/b.js'].body == b'changed'
+        assert 'releases/1.0.0/lib/c.js' in self.s3.objects
+        assert 'pass --delete' in output.getvalue()
+
+        del self.s3.requests[:]
+        with log.redirect(log.JsonLines(io.StringIO())):
+            ops.sync(tree, delete=True, root=self.tmp, backend=self.backend,
+                     dry_run=False)
+        assert self.writes() == [('POST', '')]
+        assert sorted(self.s3.objects) == ['releases/1.0.0/a.js',
+                                           'releases/1.0.0/b.js',
+                                           'releases/1.0.0/d.js']
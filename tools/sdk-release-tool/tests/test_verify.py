@@ -0,0 +1,109 @@
+from fakes import write
+from fakes3 import FakeS3
+from sdk_release_tools import ops
+from sdk_release_tools.asyncs3 import AsyncS3Backend
+from sdk_release_tools.backend import Object
+from sdk_release_tools.compress import Compression
+from sdk_release_tools.manifest import Manifest
+from sdk_release_tools.verify import (MB, etag_matches, matches,
+                                      multipart_etag, part_sizes)
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import clint
+except ImportError:
+    clint = None
+
+
+def test_part_sizes():
+    assert list(part_sizes(20 * MB, 3)) == [8 * MB, 7 * MB]
+    assert list(part_sizes(12 * MB, 3)) == [5 * MB, 4 * MB]
+
+
+def test_multipart_etag():
+    data = b'a' * 10 + b'b' * 10 + b'c' * 5
+    digests = b''.join(hashlib.md5(part).digest()
+                       for part in [b'a' * 10, b'b' * 10, b'c' * 5])
+    assert multipart_etag(data, 10) == '{}-3'.format(
+        hashlib.md5(digests).hexdigest())
+
+
+class TestVerify(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_etag_matches(self):
+        # Large enough to be memory-mapped and uploaded in parts.
+        body = os.urandom(9 * MB)
+        path = write(self.tmp, 'big.bin', body)
+        self.assertTrue(etag_matches(path, hashlib.md5(body).hexdigest()))
+        self.assertTrue(etag_matches(path, multipart_etag(body, 8 * MB)))
+        self.assertFalse(etag_matches(path, multipart_etag(body[1:] + b'x',
+                                                           8 * MB)))
+
+    def test_matches_compressed(self):
+        body = b'console.log("hello");\n' * 100
+        path = write(self.tmp, 'a.js', body)
+        compressed = write(self.tmp, 'a.js.gz', b'')
+        compression = Compression(workers=1)
+        from sdk_release_tools.compress import compress_file
+        compress_file('gzip', path, compressed)
+        with open(compressed, 'rb') as f:
+            data = f.read()
+        obj = Object('a.js', len(data), hashlib.md5(data).hexdigest())
+        self.assertFalse(matches(path, obj))
+        self.assertTrue(matches(path, obj, compression))
+
+    @unittest.skipIf(clint is None, 'reporting problems requires clint')
+    def test_ops(self):
+        s3 = FakeS3(page_size=2).start()
+        backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                 endpoint=s3.endpoint)
+        try:
+            for name in ['a.js', 'b.js', 'lib/c.js']:
+                write(self.tmp, 'dist/' + name, name.encode('utf-8'))
+                s3.put('releases/1.0.0/' + name, name.encode('utf-8'))
+            write(self.tmp, 'dist/d.js', b'd')
+            s3.put('releases/1.0.0/b.js', b'changed')
+            s3.put('releases/1.0.0/e.js', b'e')
+
+            report = ops.verify({'dist/': 'releases/{version}/'},
+                                root=self.tmp, backend=backend,
+                                variables={'version': '1.0.0'}).report
+            self.assertEqual(sorted(report.verified),
+                             ['releases/1.0.0/a.js', 'releases/1.0.0/lib/c.js'])
+            self.assertEqual(report.missing, ['releases/1.0.0/d.js'])
+            self.assertEqual(report.extra, ['releases/1.0.0/e.js'])
+            self.assertEqual(report.mismatched, ['releases/1.0.0/b.js'])
+            self.assertFalse(report.ok)
+        finally:
+            backend.close()
+            s3.stop()
+
+    @unittest.skipIf(clint is None, 'reporting problems requires clint')
+    def test_ops_manifest(self):
+        # With the release's Manifest, verifying reads nothing from S3.
+        s3 = FakeS3().start()
+        backend = AsyncS3Backend('bucket', 'key', 'secret',
+                                 endpoint=s3.endpoint)
+        try:
+            write(self.tmp, 'dist/a.js', b'a')
+            etag = hashlib.md5(b'a').hexdigest()
+            manifest = Manifest('releases/1.0.0/',
+                                [Object('releases/1.0.0/a.js', 1, etag)])
+            report = ops.verify({'dist/': 'releases/{version}/'},
+                                root=self.tmp, backend=backend,
+                                manifest=manifest,
+                                variables={'version': '1.0.0'}).report
+            self.assertEqual(report.verified, ['releases/1.0.0/a.js'])
+            self.assertEqual(s3.requests, [])
+        finally:
+            backend.close()
+            s3.stop()